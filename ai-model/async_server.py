@@ -0,0 +1,328 @@
+"""
+Micro-batching ASGI server for the recommendation API
+POST /recommend requests are queued and coalesced: everything that arrives
+within RECOMMEND_BATCH_WINDOW_MS, or until RECOMMEND_BATCH_MAX_ROWS feature
+rows are waiting, is scored with one model call and fanned back out.
+GET /stats/stream subscribers wait on the event loop rather than a pool
+thread. Every other route is served by the Flask app in recommendation_api.py.
+
+Usage (from ai-model/): uvicorn async_server:app --port 5002
+                    or: python async_server.py
+"""
+
+import asyncio
+import contextvars
+import io
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import recommendation_api as api
+from stats_stream import Subscription
+
+BATCH_WINDOW_MS = float(os.environ.get('RECOMMEND_BATCH_WINDOW_MS', 2))
+BATCH_MAX_ROWS = int(os.environ.get('RECOMMEND_BATCH_MAX_ROWS', 256))
+
+class MicroBatcher:
+    """Coalesces concurrent profiles into one rank_rooms_batch call
+
+    Model calls run on a single worker thread, so the event loop keeps
+    accepting requests and the next batch fills up while one is scored.
+    """
+
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_rows=BATCH_MAX_ROWS, rows_per_profile=len(api.ROOM_TYPES)):
+        self.window = window_ms / 1000.0
+        self.max_profiles = max(1, max_rows // rows_per_profile)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recommend-batcher')
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        self.profiles = 0
+
+    async def submit(self, bundle, user_data):
+        """Ranked recommendations for one profile, scored together with its neighbours"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((bundle, user_data, future))
+        if len(self.pending) >= self.max_profiles:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._score(batch))
+
+    async def _score(self, batch):
+        loop = asyncio.get_running_loop()
+
+        # Requests keep the bundle they started with, so a hot reload splits the batch
+        groups = {}
+        for bundle, user_data, future in batch:
+            groups.setdefault(id(bundle), (bundle, []))[1].append((user_data, future))
+
+        for bundle, items in groups.values():
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, api.rank_rooms_batch, bundle, [user_data for user_data, _ in items])
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), recommendations in zip(items, results):
+                if not future.done():
+                    future.set_result(recommendations)
+
+        self.batches += 1
+        self.profiles += len(batch)
+
+    def info(self):
+        return {
+            'window_ms': self.window * 1000,
+            'max_profiles': self.max_profiles,
+            'batches': self.batches,
+            'profiles': self.profiles,
+            'avg_batch_size': round(self.profiles / self.batches, 2) if self.batches else 0.0
+        }
+
+batcher = MicroBatcher()
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+async def send_json(send, status, payload):
+    with api.metrics.stage('serialize'):
+        body = api.app.json.dumps(payload).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+        (b'access-control-allow-origin', b'*')
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def recommend(scope, receive, send):
+    """POST /recommend with the same request, response and analytics as the Flask route"""
+    if api.model_registry.active is None:
+        await send_json(send, 500, {'error': 'Models not loaded'})
+        return
+
+    try:
+        body = await read_body(receive)
+        with api.metrics.stage('parse'):
+            data = api.app.json.loads(body)
+            try:
+                user_type_raw, user_data = api.parse_recommendation_request(data)
+            except ValueError as e:
+                await send_json(send, 400, {'error': f'Invalid request: {e}'})
+                return
+        # A first request for a city loads its models; keep that off the event loop
+        bundle = api.city_models.bundle(data.get('city'), load=False)
+        if bundle is None:
+            bundle = await asyncio.get_running_loop().run_in_executor(None, api.city_models.bundle, data.get('city'))
+
+        # Serve repeated profiles from the result cache, then the lattice, then the batcher
+        with api.metrics.stage('cache'):
+            key = api.profile_key(bundle, user_data)
+            recommendations = api.recommendation_cache.get(key)
+        if recommendations is None:
+            generation = api.recommendation_cache.generation
+            scores = None
+            if api.score_lattice is not None:
+                with api.metrics.stage('lattice'):
+                    scores = api.lattice_scores(bundle, user_data, api.ROOM_TYPES)
+            if scores is not None:
+                recommendations = api.build_recommendations(*scores)
+            else:
+                queued = time.perf_counter()
+                recommendations = await batcher.submit(bundle, user_data)
+                api.metrics.observe_stage('batch_wait', time.perf_counter() - queued)
+            api.recommendation_cache.put(key, recommendations, generation)
+
+        headers = dict(scope.get('headers', []))
+        user_agent = headers.get(b'user-agent', b'').decode('latin-1')
+        # Recording appends to the event log under the stats lock, which can block
+        await asyncio.get_running_loop().run_in_executor(
+            None, api.record_recommendation, user_type_raw, user_data, recommendations, user_agent, data)
+        api.shadow_recommendation(bundle, user_data)
+
+        await send_json(send, 200, api.recommendation_payload(recommendations))
+
+    except Exception as e:
+        print(f"❌ Error in recommendation: {e}")
+        await send_json(send, 500, {'error': str(e)})
+
+class AsyncSubscription(Subscription):
+    """Subscription that wakes a coroutine; offer() runs on the broadcaster thread"""
+
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def offer(self, snapshot, delta):
+        super().offer(snapshot, delta)
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:  # event loop already closed
+            pass
+
+    async def messages(self, timeout):
+        """Messages queued so far, waiting up to `timeout` seconds for one"""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        messages = []
+        while True:
+            try:
+                messages.append(self.queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def stats_stream(scope, receive, send):
+    """GET /stats/stream with the same events as the Flask route"""
+    window = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('window', [None])[0]
+    if window is not None and window not in api.WINDOWS:
+        await call_flask(scope, receive, send)  # the Flask route's 400
+        return
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    broadcaster = api.stats_broadcaster(window)
+    subscription = broadcaster.subscribe(AsyncSubscription(asyncio.get_running_loop()))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]})
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while not disconnected.done():
+            messages = await subscription.messages(api.STATS_STREAM_KEEPALIVE)
+            body = ''.join(messages) if messages else ': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body.encode('utf-8'), 'more_body': True})
+    finally:
+        broadcaster.unsubscribe(subscription)
+        disconnected.cancel()
+
+async def call_flask(scope, receive, send):
+    """Serve a request with the Flask app on the default thread pool (WSGI bridge)"""
+    loop = asyncio.get_running_loop()
+    body = await read_body(receive)
+
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+
+    response = {}
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+    # One context for the call and every chunk: Flask's streamed responses keep their request context in it
+    context = contextvars.copy_context()
+    result = await loop.run_in_executor(None, context.run, api.app, environ, start_response)
+    chunks = iter(result)
+    try:
+        await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+        # Pull chunks on the pool so streamed responses (NDJSON) are forwarded as they are produced
+        while True:
+            chunk = await loop.run_in_executor(None, context.run, next, chunks, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(None, context.run, result.close)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if api.load_models():
+                api.load_room_catalog()
+                api.model_registry.start_watching()
+                if api.shadow is not None:
+                    api.shadow.registry.start_watching()
+                await send({'type': 'lifespan.startup.complete'})
+            else:
+                await send({'type': 'lifespan.startup.failed', 'message': 'Failed to load models'})
+        elif message['type'] == 'lifespan.shutdown':
+            api.model_registry.stop()
+            api.city_models.stop()
+            if api.shadow is not None:
+                api.shadow.stop()
+            batcher.executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http':
+        if scope['path'] == '/recommend' and scope['method'] == 'POST':
+            await recommend(scope, receive, send)
+        elif scope['path'] == '/stats/stream' and scope['method'] == 'GET':
+            await stats_stream(scope, receive, send)
+        elif scope['path'] == '/recommend/batcher' and scope['method'] == 'GET':
+            await send_json(send, 200, batcher.info())
+        else:
+            await call_flask(scope, receive, send)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("❌ The async server needs uvicorn: pip install uvicorn")
+
+    print("="*70)
+    print("🏨 AI Room Recommendation API (async, micro-batching)")
+    print("="*70)
+    print(f"⏱️  Batch window {BATCH_WINDOW_MS} ms, up to {BATCH_MAX_ROWS} rows per model call")
+    print("   - GET /recommend/batcher - Batching statistics")
+    print("\n🌐 Server running on http://localhost:5002")
+    uvicorn.run(app, host='0.0.0.0', port=5002)
@@ -0,0 +1,103 @@
+"""
+Cold-start benchmark: pickled models vs memory-mapped artifacts
+Starts N worker processes per format, each loads the models and scores a batch,
+then reports load time, RSS and PSS (proportional share of shared pages, Linux only).
+Pickle load time includes importing sklearn, which the artifact path never needs.
+
+Usage: python ai-model/benchmark_model_loading.py [model_dir] [--workers 4] [--rows 1000]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+
+from model_artifacts import current_artifacts_dir, load_model_artifacts
+
+def memory_kb():
+    """(rss, pss) of this process in KB; pss is None where /proc is unavailable"""
+    rss = pss = None
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    rss = int(line.split()[1])
+                elif line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            rss //= 1024
+    return rss, pss
+
+def worker(model_dir, fmt, rows, barrier, results):
+    baseline_rss, _ = memory_kb()
+    start = time.perf_counter()
+    if fmt == 'pickle':
+        with open(os.path.join(model_dir, 'compatibility_model.pkl'), 'rb') as f:
+            compatibility_model = pickle.load(f)
+        with open(os.path.join(model_dir, 'booking_model.pkl'), 'rb') as f:
+            booking_model = pickle.load(f)
+    else:
+        artifacts = load_model_artifacts(current_artifacts_dir(model_dir))
+        compatibility_model = artifacts['compatibility_model']
+        booking_model = artifacts['booking_model']
+    load_seconds = time.perf_counter() - start
+
+    # Score a batch so the pages a real request touches are resident
+    X = np.random.default_rng(0).normal(size=(rows, compatibility_model.n_features_in_))
+    start = time.perf_counter()
+    compatibility_model.predict_proba(X)
+    booking_model.predict(X)
+    first_batch_seconds = time.perf_counter() - start
+
+    # Measure while every worker is alive so shared pages are split between them
+    barrier.wait()
+    rss, pss = memory_kb()
+    results.put({'load': load_seconds, 'first_batch': first_batch_seconds,
+                 'rss': rss - baseline_rss, 'pss': pss})
+    barrier.wait()
+
+def run(model_dir, fmt, workers, rows):
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(model_dir, fmt, rows, barrier, results))
+                 for _ in range(workers)]
+    for p in processes:
+        p.start()
+    measured = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return measured
+
+def report(fmt, measured):
+    load_ms = np.mean([m['load'] for m in measured]) * 1000
+    batch_ms = np.mean([m['first_batch'] for m in measured]) * 1000
+    rss_mb = sum(m['rss'] for m in measured) / 1024
+    line = f"{fmt:<10} load {load_ms:9.1f} ms   first batch {batch_ms:8.1f} ms   RSS added {rss_mb:8.1f} MB"
+    if all(m['pss'] is not None for m in measured):
+        line += f"   total PSS {sum(m['pss'] for m in measured) / 1024:8.1f} MB"
+    print(line)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model_dir', nargs='?', default=os.path.join(script_dir, 'models'))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    if current_artifacts_dir(args.model_dir) is None:
+        sys.exit(f"❌ No artifacts in {args.model_dir} - run: python ai-model/model_artifacts.py {args.model_dir}")
+
+    print(f"📊 {args.workers} workers, {args.rows} rows scored per worker, models from {args.model_dir}")
+    for fmt in ('pickle', 'artifacts'):
+        report(fmt, run(args.model_dir, fmt, args.workers, args.rows))
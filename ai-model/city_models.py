@@ -0,0 +1,176 @@
+"""
+Per-city model registries for the recommendation API
+A market with its own models keeps them in CITY_MODEL_DIR/<city>/, laid out
+like MODEL_DIR (pickles and/or artifacts). A city's models are loaded on its
+first request and the least recently used city is evicted once the loaded
+models exceed the memory budget. Requests for a city without models are
+served by the default models, which are always resident and not counted
+against the budget.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from room_catalog import city_of
+
+CITY_KEY = re.compile(r'^[a-z0-9][a-z0-9_-]*$')
+
+def city_key(city):
+    """Directory key of a city such as "Lahore, Punjab" -> "lahore", or None"""
+    if not city:
+        return None
+    key = city_of(city).replace(' ', '_')
+    return key if CITY_KEY.match(key) else None
+
+def has_models(model_dir):
+    return (os.path.exists(os.path.join(model_dir, 'artifacts', 'CURRENT'))
+            or os.path.exists(os.path.join(model_dir, 'compatibility_model.pkl')))
+
+class CityModels:
+    """Lazily loaded, LRU-evicted ModelRegistry per city
+
+    `make_registry(model_dir)` builds the ModelRegistry for one city; it is
+    reloaded once on first use and then hot-reloads like the default one.
+    A city whose models fail to load is skipped (served by the default
+    models) until `refresh()`.
+    """
+
+    def __init__(self, default_registry, cities_dir, make_registry, memory_budget_mb=512):
+        self.default = default_registry
+        self.cities_dir = cities_dir
+        self.make_registry = make_registry
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._loaded = OrderedDict()  # city -> ModelRegistry, least recently used first
+        self.failed = {}
+        self.loads = 0
+        self.evictions = 0
+        self.available = self._scan()
+
+    def _scan(self):
+        if not os.path.isdir(self.cities_dir):
+            return frozenset()
+        return frozenset(
+            entry.name for entry in os.scandir(self.cities_dir)
+            if entry.is_dir() and CITY_KEY.match(entry.name) and has_models(entry.path)
+        )
+
+    def refresh(self):
+        """Rescan CITY_MODEL_DIR for new cities and retry failed ones"""
+        with self._lock:
+            self.failed = {}
+            self.available = self._scan()
+        return sorted(self.available)
+
+    def bundle(self, city=None, load=True):
+        """Active bundle for a city, falling back to the default models
+
+        With load=False a city that is not loaded yet returns None instead of
+        loading it in the calling thread.
+        """
+        key = city_key(city)
+        if key is None or key not in self.available or key in self.failed:
+            return self.default.active
+
+        with self._lock:
+            registry = self._loaded.get(key)
+            if registry is not None:
+                self._loaded.move_to_end(key)
+        if registry is None:
+            if not load:
+                return None
+            registry = self._load(key)
+        if registry is None or registry.active is None:
+            return self.default.active
+        return registry.active
+
+    def _load(self, key):
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # One load per city; concurrent first requests for it wait for that load
+        with load_lock:
+            with self._lock:
+                registry = self._loaded.get(key)
+                failed = key in self.failed
+            if registry is not None or failed:
+                return registry
+
+            registry = self.make_registry(os.path.join(self.cities_dir, key))
+            ok, result = registry.reload()
+            if not ok:
+                with self._lock:
+                    self.failed[key] = {'error': result, 'at': datetime.now().isoformat()}
+                print(f"❌ Could not load models for {key}, using the default models: {result}")
+                return None
+
+            registry.start_watching()
+            with self._lock:
+                self._loaded[key] = registry
+                self.loads += 1
+                evicted = self._evict(keep=key)
+            print(f"🏙️  Loaded {key} models (version {result.version}, {result.nbytes / (1024 * 1024):.1f} MB)")
+            for city, old in evicted:
+                old.stop()
+                print(f"♻️  Evicted {city} models to stay within the memory budget")
+            return registry
+
+    def _evict(self, keep):
+        """Drop least recently used cities until the budget holds (caller holds the lock)"""
+        evicted = []
+        while self._used_bytes() > self.memory_budget and len(self._loaded) > 1:
+            city = next(iter(self._loaded))
+            if city == keep:
+                break
+            evicted.append((city, self._loaded.pop(city)))
+            self.evictions += 1
+        return evicted
+
+    def _used_bytes(self):
+        return sum(r.active.nbytes for r in self._loaded.values() if r.active is not None)
+
+    def reload(self, city):
+        """Reload one city's models now; (ok, bundle or error) like ModelRegistry.reload"""
+        key = city_key(city)
+        if key is None:
+            return False, f'Invalid city {city!r}'
+        self.refresh()
+        if key not in self.available:
+            return False, f'No models for {key} in {self.cities_dir}'
+        with self._lock:
+            registry = self._loaded.get(key)
+        if registry is None:
+            registry = self._load(key)
+            if registry is None:
+                with self._lock:
+                    error = self.failed.get(key, {}).get('error', 'load failed')
+                return False, error
+            return True, registry.active
+        return registry.reload()
+
+    def stop(self):
+        with self._lock:
+            for registry in self._loaded.values():
+                registry.stop()
+
+    def info(self):
+        """Loaded cities in LRU order, memory use and eviction counters"""
+        with self._lock:
+            loaded = {city: r.info() for city, r in self._loaded.items()}
+            used = self._used_bytes()
+            failed = dict(self.failed)
+        return {
+            'cities_dir': self.cities_dir,
+            'available': sorted(self.available),
+            'loaded': loaded,
+            'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 2),
+            'memory_used_mb': round(used / (1024 * 1024), 2),
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'failed': failed
+        }
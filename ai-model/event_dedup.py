@@ -0,0 +1,120 @@
+"""
+Duplicate filter for tracked analytics events
+A rotating pair of Bloom filters remembers the event ids seen in the last
+window with a fixed memory cap: new ids go into the current filter, lookups
+check the current and previous one, and when the window (or the current
+filter's capacity) runs out the previous filter is dropped and a new one
+started. Each check or insert touches a fixed number of bits.
+The filter is per process: with several workers, a resent event that lands
+on another worker than the first copy is not recognized and counts twice.
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+class BloomFilter:
+    """Fixed-size bit array with `hashes` positions per key (double hashing)"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def contains(self, positions):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def add(self, positions):
+        bits = self.bits
+        for p in positions:
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+class RotatingBloomFilter:
+    """Event ids seen within the last `window` seconds, in bounded memory
+
+    An id is remembered for between one and two windows; a filter that
+    reaches `capacity` ids rotates early to keep the false-positive rate at
+    about `error_rate` (a false positive drops a genuinely new event).
+    """
+
+    def __init__(self, window=3600, capacity=1000000, error_rate=0.001):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.rotated_at = time.time()
+        self.checked = 0
+        self.duplicates = 0
+        self.rotations = 0
+        self.early_rotations = 0
+
+    def _rotate(self, now):
+        if self.current.count >= self.capacity:
+            self.early_rotations += 1
+        self.previous = self.current
+        self.current = BloomFilter(self.capacity, self.error_rate)
+        self.rotated_at = now
+        self.rotations += 1
+
+    def store_new(self, keys, store, now=None):
+        """Hand the new keys to `store` and remember them only if it succeeds
+
+        `keys` may contain None (no id: always new, never remembered). Calls
+        `store(indexes)` with the positions of keys not seen in the window nor
+        earlier in `keys`, under the filter lock so concurrent batches cannot
+        both pass; the keys are marked as seen only when it returns True, so
+        a batch that could not be stored is not taken for a duplicate when it
+        is resent. Returns (store result, indexes passed to it).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self.rotated_at >= self.window or self.current.count >= self.capacity:
+                self._rotate(now)
+            batch = set()
+            fresh = []
+            new_positions = []
+            for i, key in enumerate(keys):
+                if key is None:
+                    fresh.append(i)
+                    continue
+                positions = self.current.positions(key)  # both filters have the same size
+                if key in batch or self.current.contains(positions) or self.previous.contains(positions):
+                    continue
+                batch.add(key)
+                fresh.append(i)
+                new_positions.append(positions)
+
+            stored = store(fresh)
+            if stored:
+                checked = sum(key is not None for key in keys)
+                self.checked += checked
+                self.duplicates += checked - len(new_positions)
+                for positions in new_positions:
+                    self.current.add(positions)
+            return stored, fresh
+
+    def info(self):
+        with self._lock:
+            return {
+                'window_seconds': self.window,
+                'capacity': self.capacity,
+                'error_rate': self.error_rate,
+                'memory_kb': round(2 * len(self.current.bits) / 1024, 1),
+                'checked': self.checked,
+                'duplicates': self.duplicates,
+                'current_ids': self.current.count,
+                'rotations': self.rotations,
+                'early_rotations': self.early_rotations
+            }
@@ -0,0 +1,120 @@
+"""
+Precomputed feature encoding tables for the recommendation API
+Compiles the pickled LabelEncoders and StandardScaler into plain lookups
+so building a feature matrix needs no sklearn calls
+"""
+
+import numpy as np
+
+# Column order used by the Pakistan model (10 features)
+CATEGORICAL_COLUMNS = ['user_type', 'room_type', 'season', 'day_type']
+NUMERIC_COLUMNS = ['booking_advance', 'stay_duration', 'group_size', 'view_time',
+                   'previous_bookings', 'budget']
+N_FEATURES = len(CATEGORICAL_COLUMNS) + len(NUMERIC_COLUMNS)
+
+# Defaults applied when a field is missing from the request
+CATEGORICAL_DEFAULTS = {
+    'user_type': 'solo',
+    'room_type': 'Standard Room',
+    'season': 'summer',
+    'day_type': 'weekday'
+}
+NUMERIC_DEFAULTS = {
+    'booking_advance': 7,
+    'stay_duration': 2,
+    'group_size': 2,
+    'view_time': 120,
+    'previous_bookings': 0,
+    'budget': 15000  # PKR default
+}
+
+class FeatureTables:
+    """Dict lookups of already-scaled categorical columns plus scaler constants
+
+    Unknown categorical values map to a fallback code instead of raising.
+    `fallback_codes` maps a column to either a known label or an integer code;
+    columns not listed fall back to the code of CATEGORICAL_DEFAULTS.
+    """
+
+    def __init__(self, label_encoders, scaler, fallback_codes=None):
+        fallback_codes = fallback_codes or {}
+
+        mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(N_FEATURES)
+        scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(N_FEATURES)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+        self.codes = {}
+        self.scaled = {}
+        self.fallback = {}
+
+        for i, column in enumerate(CATEGORICAL_COLUMNS):
+            classes = [str(c) for c in label_encoders[column].classes_]
+            codes = {label: code for code, label in enumerate(classes)}
+
+            fallback = fallback_codes.get(column, CATEGORICAL_DEFAULTS[column])
+            fallback_code = codes.get(fallback) if not isinstance(fallback, int) else fallback
+            if fallback_code is None or not 0 <= fallback_code < len(classes):
+                fallback_code = 0
+
+            # Same arithmetic as StandardScaler.transform so values match exactly
+            self.codes[column] = codes
+            self.scaled[column] = {
+                label: (np.float64(code) - self.mean[i]) / self.scale[i]
+                for label, code in codes.items()
+            }
+            self.fallback[column] = (np.float64(fallback_code) - self.mean[i]) / self.scale[i]
+
+        self._column_cache = {}
+
+    def scaled_value(self, column, value):
+        """Scaled value of one categorical label (fallback for unknown labels)"""
+        return self.scaled[column].get(value, self.fallback[column])
+
+    def scaled_column(self, column, values):
+        """Scaled column for a sequence of labels, memoized per sequence"""
+        key = (column, tuple(values))
+        cached = self._column_cache.get(key)
+        if cached is None:
+            cached = np.array([self.scaled_value(column, v) for v in values], dtype=np.float64)
+            if len(self._column_cache) < 256:
+                self._column_cache[key] = cached
+        return cached
+
+    def room_features(self, user_data, room_types):
+        """Scaled feature matrix with one row per room type"""
+        features = np.empty((len(room_types), N_FEATURES), dtype=np.float64)
+
+        features[:, 0] = self.scaled_value('user_type', user_data.get('user_type', CATEGORICAL_DEFAULTS['user_type']))
+        features[:, 1] = self.scaled_column('room_type', room_types)
+        features[:, 2] = self.scaled_value('season', user_data.get('season', CATEGORICAL_DEFAULTS['season']))
+        features[:, 3] = self.scaled_value('day_type', user_data.get('day_type', CATEGORICAL_DEFAULTS['day_type']))
+
+        numeric = np.array([user_data.get(c, NUMERIC_DEFAULTS[c]) for c in NUMERIC_COLUMNS], dtype=np.float64)
+        features[:, 4:] = (numeric - self.mean[4:]) / self.scale[4:]
+
+        return features
+
+    def batch_features(self, users, room_types):
+        """Scaled feature matrix for many users, rows ordered user-major
+        
+        Row u * len(room_types) + r holds user u paired with room type r.
+        """
+        n_users, n_rooms = len(users), len(room_types)
+        features = np.empty((n_users, n_rooms, N_FEATURES), dtype=np.float64)
+
+        for i, column in ((0, 'user_type'), (2, 'season'), (3, 'day_type')):
+            values = [self.scaled_value(column, u.get(column, CATEGORICAL_DEFAULTS[column])) for u in users]
+            features[:, :, i] = np.array(values, dtype=np.float64)[:, None]
+        features[:, :, 1] = self.scaled_column('room_type', room_types)[None, :]
+
+        numeric = np.array([[u.get(c, NUMERIC_DEFAULTS[c]) for c in NUMERIC_COLUMNS] for u in users],
+                           dtype=np.float64).reshape(n_users, len(NUMERIC_COLUMNS))
+        features[:, :, 4:] = ((numeric - self.mean[4:]) / self.scale[4:])[:, None, :]
+
+        return features.reshape(n_users * n_rooms, N_FEATURES)
+
+    def row_features(self, user_data):
+        """Scaled feature matrix for a single row"""
+        room_type = user_data.get('room_type', CATEGORICAL_DEFAULTS['room_type'])
+        return self.room_features(user_data, [room_type])
@@ -0,0 +1,204 @@
+"""
+Memory-mappable model artifacts for the recommendation API
+Tree ensembles are flattened (tree_engine.flatten_ensemble) into contiguous .npy
+arrays that every worker maps read-only and evaluates with the compiled tree
+engine, so N processes share one page-cache copy instead of N unpickled ones.
+(sklearn copies tree nodes into private buffers when unpickling, so joblib's
+mmap_mode alone does not share them.)
+
+Layout:
+    <model_dir>/artifacts/CURRENT            name of the active version directory
+    <model_dir>/artifacts/<version>/manifest.json
+    <model_dir>/artifacts/<version>/<model>.<array>.npy
+
+The manifest records a digest of the pickles the version was exported from,
+so a retrain that only rewrites the pickles is not shadowed by stale artifacts.
+
+Usage: python ai-model/model_artifacts.py [model_dir]   # convert existing pickles
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+from tree_engine import CompiledTreeEnsemble, check_parity, flatten_ensemble
+
+MODEL_FILES = ['compatibility_model', 'booking_model', 'scaler', 'label_encoders']
+ARRAY_NAMES = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+def pickle_digest(model_dir):
+    """sha256 over the model pickles (hex), or None if any of them is missing"""
+    digest = hashlib.sha256()
+    for name in MODEL_FILES:
+        try:
+            with open(os.path.join(model_dir, f'{name}.pkl'), 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            return None
+    return digest.hexdigest()
+
+def _encoders_to_json(label_encoders):
+    return {column: [c.item() if hasattr(c, 'item') else c for c in encoder.classes_]
+            for column, encoder in label_encoders.items()}
+
+def _scaler_to_json(scaler):
+    return {
+        'mean': None if getattr(scaler, 'mean_', None) is None else [float(v) for v in scaler.mean_],
+        'scale': None if getattr(scaler, 'scale_', None) is None else [float(v) for v in scaler.scale_]
+    }
+
+def features_digest(scaler, label_encoders):
+    """sha256 (hex) of the encoder classes and scaler constants, equal for pickled and artifact copies"""
+    features = {'scaler': _scaler_to_json(scaler), 'label_encoders': _encoders_to_json(label_encoders)}
+    return hashlib.sha256(json.dumps(features, sort_keys=True).encode()).hexdigest()
+
+def save_model_artifacts(model_dir, compatibility_model, booking_model, scaler, label_encoders, keep=2):
+    """Write a new artifact version next to the pickles and make it current
+
+    Tree ensembles are flattened to .npy arrays, after checking that the
+    compiled engine reproduces them exactly. Any other model (e.g. a linear
+    fallback chosen by the training script, or gradient boosting with an init
+    estimator the compiled engine does not support) is stored pickled.
+    Call it after writing the pickles: their digest goes into the manifest.
+    Returns the version name.
+    """
+    artifacts_dir = os.path.join(model_dir, 'artifacts')
+    os.makedirs(artifacts_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    staged = {}
+    manifest = {'models': {}}
+    for name, model in (('compatibility_model', compatibility_model), ('booking_model', booking_model)):
+        try:
+            arrays, metadata = flatten_ensemble(model)
+        except ValueError:
+            arrays = None  # not a tree ensemble, or one the compiled engine cannot serve
+        if arrays is not None:
+            # Served as-is by the compiled engine, so it must reproduce the model exactly
+            check_parity(model, CompiledTreeEnsemble(arrays, metadata), metadata['n_features'])
+            for array_name in ARRAY_NAMES:
+                digest.update(np.ascontiguousarray(arrays[array_name]).tobytes())
+            staged[name] = arrays
+            manifest['models'][name] = {'format': 'flat_trees', **metadata}
+        else:
+            data = pickle.dumps(model)
+            digest.update(data)
+            staged[name] = data
+            manifest['models'][name] = {'format': 'pickle', 'kind': type(model).__name__}
+
+    manifest['scaler'] = _scaler_to_json(scaler)
+    manifest['label_encoders'] = _encoders_to_json(label_encoders)
+    manifest['pickles'] = pickle_digest(model_dir)
+    digest.update(json.dumps(manifest, sort_keys=True).encode())
+    version = digest.hexdigest()[:12]
+    manifest['version'] = version
+
+    version_dir = os.path.join(artifacts_dir, version)
+    tmp_dir = version_dir + f'.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    for name, payload in staged.items():
+        if isinstance(payload, dict):
+            for array_name, array in payload.items():
+                np.save(os.path.join(tmp_dir, f'{name}.{array_name}.npy'), np.ascontiguousarray(array))
+        else:
+            with open(os.path.join(tmp_dir, f'{name}.pkl'), 'wb') as f:
+                f.write(payload)
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(version_dir):
+        shutil.rmtree(tmp_dir)  # identical content already exported
+    else:
+        os.replace(tmp_dir, version_dir)
+
+    # Point CURRENT at the new version atomically
+    current_tmp = os.path.join(artifacts_dir, 'CURRENT.tmp')
+    with open(current_tmp, 'w') as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(artifacts_dir, 'CURRENT'))
+
+    # Drop old versions (running workers keep their mappings on POSIX)
+    versions = sorted(
+        (d for d in os.listdir(artifacts_dir)
+         if os.path.isdir(os.path.join(artifacts_dir, d)) and '.tmp-' not in d and d != version),
+        key=lambda d: os.path.getmtime(os.path.join(artifacts_dir, d)),
+        reverse=True
+    )
+    for old in versions[max(keep - 1, 0):]:
+        shutil.rmtree(os.path.join(artifacts_dir, old), ignore_errors=True)
+
+    return version
+
+def current_artifacts_dir(model_dir):
+    """Directory of the active artifact version, or None if there is none"""
+    current_path = os.path.join(model_dir, 'artifacts', 'CURRENT')
+    if not os.path.exists(current_path):
+        return None
+    with open(current_path, 'r') as f:
+        version = f.read().strip()
+    version_dir = os.path.join(model_dir, 'artifacts', version)
+    return version_dir if os.path.exists(os.path.join(version_dir, 'manifest.json')) else None
+
+def read_manifest(version_dir):
+    with open(os.path.join(version_dir, 'manifest.json'), 'r') as f:
+        return json.load(f)
+
+def load_model_artifacts(version_dir, mmap_mode='r'):
+    """Load an artifact version; large arrays are memory-mapped read-only
+
+    Returns a dict with compatibility_model, booking_model, scaler,
+    label_encoders, version and metadata. Tree ensembles come back as
+    tree_engine.CompiledTreeEnsemble over the mapped arrays. The scaler and encoders are light
+    objects carrying only the attributes FeatureTables reads.
+    """
+    manifest = read_manifest(version_dir)
+
+    loaded = {}
+    for name, entry in manifest['models'].items():
+        if entry['format'] == 'flat_trees':
+            arrays = {
+                array_name: np.load(os.path.join(version_dir, f'{name}.{array_name}.npy'), mmap_mode=mmap_mode)
+                for array_name in ARRAY_NAMES
+            }
+            loaded[name] = CompiledTreeEnsemble(arrays, entry)
+        else:
+            with open(os.path.join(version_dir, f'{name}.pkl'), 'rb') as f:
+                loaded[name] = pickle.load(f)
+
+    scaler = SimpleNamespace(
+        mean_=None if manifest['scaler']['mean'] is None else np.array(manifest['scaler']['mean']),
+        scale_=None if manifest['scaler']['scale'] is None else np.array(manifest['scaler']['scale'])
+    )
+    label_encoders = {
+        column: SimpleNamespace(classes_=np.array(classes))
+        for column, classes in manifest['label_encoders'].items()
+    }
+
+    return {
+        'compatibility_model': loaded['compatibility_model'],
+        'booking_model': loaded['booking_model'],
+        'scaler': scaler,
+        'label_encoders': label_encoders,
+        'version': manifest['version'],
+        'manifest': manifest
+    }
+
+if __name__ == '__main__':
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+    print(f"📦 Exporting memory-mappable artifacts from {model_dir}...")
+    objects = {}
+    for name in MODEL_FILES:
+        with open(os.path.join(model_dir, f'{name}.pkl'), 'rb') as f:
+            objects[name] = pickle.load(f)
+
+    version = save_model_artifacts(model_dir, **objects)
+    print(f"✅ Artifacts version {version} written to {os.path.join(model_dir, 'artifacts', version)}")
@@ -0,0 +1,286 @@
+"""
+Versioned model registry with hot reload for the recommendation API
+Loads the compatibility model, booking model, scaler and encoders as one
+immutable bundle, validates it with a smoke prediction and swaps it in atomically.
+Memory-mapped artifacts (model_artifacts.py) are preferred over the pickles when
+present and exported from the same pickles.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+from feature_tables import FeatureTables
+from model_artifacts import (MODEL_FILES, current_artifacts_dir, features_digest, load_model_artifacts,
+                             pickle_digest, read_manifest)
+from onnx_models import load_onnx_models, onnx_dir
+from tree_engine import ENGINES as TREE_ENGINES, check_parity, compile_model
+
+# 'onnx' serves the exported ONNX models (onnx_models.py) through onnxruntime
+ENGINES = TREE_ENGINES + ('onnx',)
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Everything needed to score a request; never mutated after loading"""
+    version: str
+    compatibility_model: Any
+    booking_model: Any
+    scaler: Any
+    label_encoders: Dict[str, Any]
+    feature_tables: FeatureTables
+    model_dir: str
+    loaded_at: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    source: str = 'pickle'
+    engine: str = 'sklearn'
+    nbytes: int = 0  # size of the model files, used as the bundle's memory estimate
+
+    def info(self):
+        """Version details for /health and /stats"""
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'trained_at': self.metadata.get('trained_at') or self.metadata.get('training_date'),
+            'model_dir': self.model_dir,
+            'source': self.source,
+            'engine': self.engine,
+            'size_mb': round(self.nbytes / (1024 * 1024), 2),
+            'compatibility_model': getattr(self.compatibility_model, 'estimator_name',
+                                           type(self.compatibility_model).__name__),
+            'booking_model': getattr(self.booking_model, 'estimator_name',
+                                     type(self.booking_model).__name__)
+        }
+
+class ModelRegistry:
+    """Holds the active ModelBundle and replaces it on reload
+
+    `validate(bundle)` must raise if the bundle cannot serve a prediction.
+    `on_swap(bundle)` runs after a new bundle becomes active. With a positive
+    `watch_interval` a background thread reloads once the model files have
+    changed and then stayed unchanged for one more poll (so a half-written
+    retrain is never picked up). With `use_artifacts` the current memory-mapped
+    artifact version is loaded instead of the pickles whenever one exists
+    (its tree ensembles run on tree_engine, checked bit for bit at export),
+    unless it was exported from other pickles than the ones in `model_dir`.
+    `engine='compiled'` serves tree ensembles through tree_engine; pickled
+    ones are compiled after checking that the output matches bit for bit.
+    `engine='sklearn'` always serves the unpickled sklearn estimators.
+    `engine='onnx'` serves MODEL_DIR/onnx, whose models were checked against
+    the sklearn ones at export and take unscaled rows (the scaler is folded in).
+    An ONNX export made with other encoders or scaler than the ones loaded
+    next to it is stale; the bundle then falls back to the compiled engine.
+    """
+
+    def __init__(self, model_dir, validate=None, on_swap=None, fallback_codes=None,
+                 watch_interval=0, history_size=10, use_artifacts=True, engine='compiled'):
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown engine {engine!r}, expected one of {ENGINES}')
+        self.model_dir = model_dir
+        self.engine = engine
+        self.use_artifacts = use_artifacts
+        self.validate = validate
+        self.on_swap = on_swap
+        self.fallback_codes = fallback_codes
+        self.watch_interval = watch_interval
+        self.history = deque(maxlen=history_size)
+
+        self._active = None
+        self._reload_lock = threading.Lock()
+        self._signature = None
+        self._watch_thread = None
+        self._stop = threading.Event()
+
+    @property
+    def active(self) -> Optional[ModelBundle]:
+        return self._active
+
+    @property
+    def _uses_artifacts(self):
+        # Artifacts hold flattened trees, not sklearn estimators
+        return self.use_artifacts and self.engine != 'sklearn'
+
+    @staticmethod
+    def _pickle_names(engine):
+        # The ONNX engine only needs the encoders and scaler from the pickles
+        return MODEL_FILES if engine != 'onnx' else ['scaler', 'label_encoders']
+
+    def _file_signature(self):
+        """stat() of every file a load reads; None marks a required file that is missing"""
+        def stat(path, required=True):
+            try:
+                st = os.stat(path)
+                return (st.st_mtime_ns, st.st_size)
+            except OSError:
+                return None if required else 'missing'
+
+        signature = []
+        if self.engine == 'onnx':
+            signature.append(stat(os.path.join(onnx_dir(self.model_dir), 'manifest.json')))
+        current = None
+        if self._uses_artifacts:
+            current = stat(os.path.join(self.model_dir, 'artifacts', 'CURRENT'), required=False)
+            signature.append(current)
+        # Next to artifacts the pickles are optional, but a retrain rewriting them must be noticed
+        required = self._pickle_names(self.engine) if current in (None, 'missing') else []
+        for name in MODEL_FILES:
+            signature.append(stat(os.path.join(self.model_dir, f'{name}.pkl'), name in required))
+        return tuple(signature)
+
+    def _artifacts_dir(self):
+        """Artifact version to load, or None to read the pickles
+
+        A version exported from other pickles than the ones on disk (say, a
+        retrain that only wrote pickles) is stale and skipped.
+        """
+        version_dir = current_artifacts_dir(self.model_dir) if self._uses_artifacts else None
+        if version_dir is None:
+            return None
+        pickles = pickle_digest(self.model_dir)
+        if pickles is not None and pickles != read_manifest(version_dir).get('pickles'):
+            print(f"⚠️  {version_dir} was exported from other pickles than {self.model_dir}, loading the pickles")
+            return None
+        return version_dir
+
+    def _load_metadata(self):
+        metadata_path = os.path.join(self.model_dir, 'model_metadata.json')
+        if os.path.exists(metadata_path):
+            try:
+                with open(metadata_path, 'r') as f:
+                    return json.load(f)
+            except Exception:
+                pass
+        return {}
+
+    @staticmethod
+    def _compile(model):
+        """Swap in the compiled tree engine, refusing it if outputs differ from the model"""
+        compiled = compile_model(model)
+        check_parity(model, compiled, compiled.n_features_in_)
+        return compiled
+
+    def load_bundle(self):
+        """Read the model files into a new bundle (does not activate it)"""
+        return self._load_bundle(self.engine)
+
+    def _load_bundle(self, engine):
+        version_dir = self._artifacts_dir()
+        if version_dir:
+            objects = load_model_artifacts(version_dir)
+            version, source = objects['version'], 'artifacts'
+            nbytes = sum(entry.stat().st_size for entry in os.scandir(version_dir) if entry.is_file())
+        else:
+            digest = hashlib.sha256()
+            objects = {}
+            nbytes = 0
+            for name in self._pickle_names(engine):
+                with open(os.path.join(self.model_dir, f'{name}.pkl'), 'rb') as f:
+                    data = f.read()
+                digest.update(data)
+                nbytes += len(data)
+                objects[name] = pickle.loads(data)
+            version, source = digest.hexdigest()[:12], 'pickle'
+
+        feature_scaler = objects['scaler']
+        if engine == 'onnx':
+            onnx_models = load_onnx_models(self.model_dir)
+            directory = onnx_dir(self.model_dir)
+            if onnx_models['manifest'].get('features') != features_digest(objects['scaler'], objects['label_encoders']):
+                print(f"⚠️  {directory} was exported with other encoders or scaler than the {source} "
+                      f"in {self.model_dir}, serving the compiled engine")
+                return self._load_bundle('compiled')
+            objects['compatibility_model'] = onnx_models['compatibility_model']
+            objects['booking_model'] = onnx_models['booking_model']
+            version, source = onnx_models['version'], 'onnx'
+            nbytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+            # The exported models scale their input themselves
+            feature_scaler = SimpleNamespace(mean_=None, scale_=None)
+        elif engine == 'compiled':
+            objects['compatibility_model'] = self._compile(objects['compatibility_model'])
+            objects['booking_model'] = self._compile(objects['booking_model'])
+
+        return ModelBundle(
+            version=version,
+            compatibility_model=objects['compatibility_model'],
+            booking_model=objects['booking_model'],
+            scaler=objects['scaler'],
+            label_encoders=objects['label_encoders'],
+            feature_tables=FeatureTables(objects['label_encoders'], feature_scaler, self.fallback_codes),
+            model_dir=self.model_dir,
+            loaded_at=datetime.now().isoformat(),
+            metadata=self._load_metadata(),
+            source=source,
+            engine=engine,
+            nbytes=nbytes
+        )
+
+    def reload(self):
+        """Load, validate and activate the current model files
+
+        Returns (True, bundle) on success or (False, error message); on
+        failure the previously active bundle keeps serving.
+        """
+        with self._reload_lock:
+            signature = self._file_signature()
+            try:
+                bundle = self.load_bundle()
+                if self.validate:
+                    self.validate(bundle)
+            except Exception as e:
+                self._signature = signature
+                self.history.append({'version': None, 'status': 'failed', 'error': str(e),
+                                     'at': datetime.now().isoformat()})
+                return False, str(e)
+
+            self._signature = signature
+            if self._active is not None and bundle.version == self._active.version:
+                return True, self._active
+
+            # Single reference assignment - requests see the old or the new bundle, never a mix
+            self._active = bundle
+            self.history.append({'version': bundle.version, 'status': 'active',
+                                 'at': bundle.loaded_at})
+            if self.on_swap:
+                self.on_swap(bundle)
+            return True, bundle
+
+    def start_watching(self):
+        """Poll the model files and hot-reload when they change"""
+        if self.watch_interval <= 0 or self._watch_thread is not None:
+            return
+        self._watch_thread = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+        self._watch_thread.start()
+
+    def _watch(self):
+        pending = None
+        while not self._stop.wait(self.watch_interval):
+            signature = self._file_signature()
+            if signature == self._signature or None in signature:
+                pending = None
+                continue
+            if signature != pending:
+                # Changed since the last poll - wait until the files settle
+                pending = signature
+                continue
+            ok, result = self.reload()
+            if ok:
+                print(f"🔄 Models hot-reloaded: version {result.version}")
+            else:
+                print(f"❌ Model reload failed, keeping current models: {result}")
+            pending = None
+
+    def stop(self):
+        self._stop.set()
+
+    def info(self):
+        """Active version and recent reload history"""
+        return {
+            'active': self._active.info() if self._active else None,
+            'history': list(self.history)
+        }
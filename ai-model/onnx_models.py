@@ -0,0 +1,260 @@
+"""
+ONNX Runtime backend for the recommendation models
+The training scripts can export the compatibility classifier and booking
+regressor to ONNX with the StandardScaler folded in, so each model takes the
+encoded but unscaled feature row. With RECOMMENDER_ENGINE=onnx the API serves
+them through onnxruntime on CPU, without importing sklearn (the encoders come
+from the memory-mapped artifacts). The manifest records a digest of the encoders
+and scaler used at export, so the registry can tell when they have changed since.
+
+For tree ensembles the scaler is folded into the split thresholds: each
+threshold becomes the largest float32 raw value that sklearn would send left,
+so splits match the pickled model exactly. Other models get an ONNX Scaler
+node, which computes in float32.
+
+Usage: python ai-model/onnx_models.py [model_dir]    # export from the pickles and check parity
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from model_artifacts import features_digest
+
+ONNX_DIR = 'onnx'
+MODEL_NAMES = ('compatibility_model', 'booking_model')
+# onnxruntime intra-op threads per session; 0 lets onnxruntime use every core
+ONNX_THREADS = int(os.environ.get('ONNX_THREADS', 0))
+# Largest allowed |onnx - sklearn| score difference (outputs are float32)
+PARITY_TOLERANCE = 1e-5
+
+class OnnxModel:
+    """predict / predict_proba over an onnxruntime session, shaped like the sklearn estimator"""
+
+    def __init__(self, path, spec, threads=ONNX_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = spec['output']
+        self.estimator_name = spec['estimator']
+        self.n_features_in_ = spec['n_features']
+        self.classes_ = np.asarray(spec['classes']) if spec.get('classes') is not None else None
+
+    def _run(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.session.run([self.output_name], {self.input_name: X})[0]
+
+    def predict_proba(self, X):
+        return self._run(X).astype(np.float64)
+
+    def predict(self, X):
+        if self.classes_ is not None:
+            return self.classes_[np.argmax(self._run(X), axis=1)]
+        return self._run(X).ravel().astype(np.float64)
+
+def onnx_dir(model_dir):
+    return os.path.join(model_dir, ONNX_DIR)
+
+def load_onnx_models(model_dir, threads=ONNX_THREADS):
+    """{'version', 'compatibility_model', 'booking_model', 'manifest'} from MODEL_DIR/onnx"""
+    directory = onnx_dir(model_dir)
+    with open(os.path.join(directory, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    models = {
+        name: OnnxModel(os.path.join(directory, f'{name}.onnx'), manifest['models'][name], threads)
+        for name in MODEL_NAMES
+    }
+    return {'version': manifest['version'], 'manifest': manifest, **models}
+
+# ---------------------------------------------------------------------------
+# Export (needs sklearn and skl2onnx; only the training side imports these)
+# ---------------------------------------------------------------------------
+
+def _sortable(values):
+    """float32 -> int64 keys with the same ordering"""
+    bits = np.asarray(values, dtype=np.float32).view(np.int32).astype(np.int64)
+    return np.where(bits < 0, -(bits & 0x7fffffff), bits)
+
+def _from_sortable(keys):
+    bits = np.where(keys < 0, (-keys) | 0x80000000, keys).astype(np.int64)
+    return bits.astype(np.uint32).view(np.float32)
+
+def raw_thresholds(thresholds, mean, scale):
+    """Largest float32 raw value r with float32((r - mean) / scale) <= threshold
+
+    Vectorized bisection over the ordered float32 values, so the raw-space
+    split sends exactly the same values left as sklearn's scaled split.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    mean = np.asarray(mean, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+
+    def goes_left(keys):
+        raw = _from_sortable(keys).astype(np.float64)
+        # Values near the float32 limits scale past them; inf still compares correctly
+        with np.errstate(over='ignore'):
+            return ((raw - mean) / scale).astype(np.float32) <= thresholds
+
+    finfo = np.finfo(np.float32)
+    lo = np.full(thresholds.shape, _sortable(finfo.min))
+    hi = np.full(thresholds.shape, _sortable(finfo.max))
+    all_left = goes_left(hi)
+    none_left = ~goes_left(lo)
+
+    # Invariant: lo goes left, hi does not
+    while True:
+        open_ = hi - lo > 1
+        if not open_.any():
+            break
+        mid = (lo + hi) // 2
+        left = goes_left(mid)
+        lo = np.where(open_ & left, mid, lo)
+        hi = np.where(open_ & ~left, mid, hi)
+
+    result = _from_sortable(lo).astype(np.float32)
+    result[all_left] = np.inf
+    result[none_left] = -np.inf
+    return result
+
+def fold_scaler_into_trees(onnx_model, mean, scale):
+    """Rewrite TreeEnsemble split thresholds from scaled to raw feature space (in place)"""
+    from onnx import helper
+
+    folded = False
+    for node in onnx_model.graph.node:
+        if not node.op_type.startswith('TreeEnsemble'):
+            continue
+        attributes = {a.name: a for a in node.attribute}
+        modes = list(attributes['nodes_modes'].strings)
+        if set(modes) - {b'BRANCH_LEQ', b'LEAF'}:
+            raise ValueError(f'Unsupported split modes {set(modes)}')
+        features = np.array(attributes['nodes_featureids'].ints, dtype=np.int64)
+        values = np.array(attributes['nodes_values'].floats, dtype=np.float32)
+        branch = np.array([m == b'BRANCH_LEQ' for m in modes])
+
+        values[branch] = raw_thresholds(values[branch], mean[features[branch]], scale[features[branch]])
+        node.attribute.remove(attributes['nodes_values'])
+        node.attribute.append(helper.make_attribute('nodes_values', values.tolist()))
+        folded = True
+    return folded
+
+def convert_model(model, scaler, n_features):
+    """ONNX model taking unscaled rows: folded thresholds for trees, a Scaler node otherwise"""
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+    from sklearn.pipeline import Pipeline
+
+    initial_types = [('features', FloatTensorType([None, n_features]))]
+    is_classifier = hasattr(model, 'predict_proba')
+    options = {id(model): {'zipmap': False}} if is_classifier else None
+
+    if hasattr(model, 'estimators_') or hasattr(model, 'tree_'):
+        onnx_model = convert_sklearn(model, initial_types=initial_types, options=options)
+        fold_scaler_into_trees(onnx_model, np.asarray(scaler.mean_), np.asarray(scaler.scale_))
+    else:
+        onnx_model = convert_sklearn(Pipeline([('scaler', scaler), ('model', model)]),
+                                     initial_types=initial_types, options=options)
+
+    outputs = [o.name for o in onnx_model.graph.output]
+    spec = {
+        'estimator': type(model).__name__,
+        'n_features': n_features,
+        'output': outputs[1] if is_classifier else outputs[0],
+        'classes': [c.item() if hasattr(c, 'item') else c for c in model.classes_] if is_classifier else None
+    }
+    return onnx_model, spec
+
+def sample_rows(scaler, rows=5000, seed=0):
+    """Integer-valued raw feature rows spread like the training data"""
+    rng = np.random.default_rng(seed)
+    mean, scale = np.asarray(scaler.mean_), np.asarray(scaler.scale_)
+    return np.maximum(np.round(mean + scale * rng.normal(scale=1.5, size=(rows, len(mean)))), 0)
+
+def check_parity(models, onnx_models, scaler, rows=5000):
+    """Max score difference between ONNX (raw rows) and sklearn (scaled rows); raises past PARITY_TOLERANCE"""
+    raw = sample_rows(scaler, rows)
+    scaled = scaler.transform(raw)
+    compatibility_model, booking_model = models
+    onnx_compatibility, onnx_booking = onnx_models
+
+    report = {
+        'rows': rows,
+        'compatibility_max_abs_diff': float(np.abs(
+            onnx_compatibility.predict_proba(raw) - compatibility_model.predict_proba(scaled)).max()),
+        'compatibility_label_agreement': float(np.mean(
+            onnx_compatibility.predict(raw) == compatibility_model.predict(scaled))),
+        'booking_max_abs_diff': float(np.abs(onnx_booking.predict(raw) - booking_model.predict(scaled)).max())
+    }
+    worst = max(report['compatibility_max_abs_diff'], report['booking_max_abs_diff'])
+    if worst > PARITY_TOLERANCE:
+        raise ValueError(f'ONNX export differs from the sklearn models by {worst:.3g}: {report}')
+    return report
+
+def export_onnx(model_dir, compatibility_model, booking_model, scaler, label_encoders):
+    """Write MODEL_DIR/onnx/{compatibility_model,booking_model}.onnx and manifest.json
+
+    The exported models are checked against the sklearn ones before the
+    manifest (which the API loads) is written. `label_encoders` are only
+    digested, so the API can tell the export belongs to its encoders.
+    Returns the manifest.
+    """
+    directory = onnx_dir(model_dir)
+    os.makedirs(directory, exist_ok=True)
+    n_features = int(scaler.n_features_in_)
+
+    features = features_digest(scaler, label_encoders)
+    digest = hashlib.sha256(features.encode())
+    specs = {}
+    for name, model in zip(MODEL_NAMES, (compatibility_model, booking_model)):
+        onnx_model, specs[name] = convert_model(model, scaler, n_features)
+        data = onnx_model.SerializeToString()
+        digest.update(data)
+        with open(os.path.join(directory, f'{name}.onnx.tmp'), 'wb') as f:
+            f.write(data)
+
+    # Only replace the served files once the new ones are known to match
+    onnx_models = [OnnxModel(os.path.join(directory, f'{name}.onnx.tmp'), specs[name]) for name in MODEL_NAMES]
+    parity = check_parity((compatibility_model, booking_model), onnx_models, scaler)
+    for name in MODEL_NAMES:
+        path = os.path.join(directory, f'{name}.onnx')
+        os.replace(path + '.tmp', path)
+
+    manifest = {
+        'version': 'onnx-' + digest.hexdigest()[:12],
+        'exported_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scaler_folded': True,
+        'features': features,
+        'models': specs,
+        'parity': parity
+    }
+    manifest_path = os.path.join(directory, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+if __name__ == '__main__':
+    import pickle
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('MODEL_DIR', os.path.join(script_dir, 'models'))
+
+    objects = {}
+    for name in ('compatibility_model', 'booking_model', 'scaler', 'label_encoders'):
+        with open(os.path.join(model_dir, f'{name}.pkl'), 'rb') as f:
+            objects[name] = pickle.load(f)
+
+    print(f"📦 Exporting {model_dir} to ONNX and checking parity with the pickled models...")
+    try:
+        manifest = export_onnx(model_dir, **objects)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    print(f"✅ ONNX models saved (version {manifest['version']})")
+    print(json.dumps(manifest['parity'], indent=2))
@@ -3,129 +3,487 @@ Flask API for AI Room Recommendations
 Serves compatibility scores and booking likelihood predictions
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import pickle
 import numpy as np
 import os
 import json
+import math
+import time
+import atexit
+import queue
+import sys
+import threading
 from datetime import datetime
+from feature_tables import CATEGORICAL_COLUMNS
+from result_cache import ResultCache
+from stats_store import EventBuffer, StatsStore, StatsShards
+from event_dedup import RotatingBloomFilter
+from sketches import HyperLogLog, SpaceSaving, StreamingSummary
+from time_series import DistinctSeries, RollupSeries, WINDOWS
+from room_catalog import RoomCatalog
+from model_registry import ModelRegistry
+from city_models import CityModels
+from shadow_models import ShadowEvaluator
+from stats_stream import StatsBroadcaster, Subscription
+from score_lattice import ScoreLattice
 
 app = Flask(__name__)
 CORS(app)
 
-# Stats file path
+# Stats files - each worker process owns one shard (shard 0 is stats_data.json)
 script_dir = os.path.dirname(os.path.abspath(__file__))
-STATS_FILE = os.path.join(script_dir, 'stats_data.json')
+STATS_DIR = os.environ.get('STATS_DIR', script_dir)
+# `python recommendation_api.py` runs under the Werkzeug reloader: this file is executed once in
+# a watcher process that never serves and again in the serving child (WERKZEUG_RUN_MAIN=true).
+# The watcher claims no shard and writes no stats, so the dev server keeps stats_data.json
+RELOADER_WATCHER = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+stats_shards = StatsShards(STATS_DIR, claim=not RELOADER_WATCHER)
+STATS_FILE, STATS_LOG_FILE = stats_shards.paths(stats_shards.shard or 0)
 
-# Global model variables
-compatibility_model = None
-booking_model = None
-scaler = None
-label_encoders = None
+sys.path.insert(0, os.path.join(script_dir, '..', 'shared'))
+from service_metrics import ServiceMetrics
+from request_profiler import RequestProfiler
 
-def load_stats():
-    """Load stats from file if exists"""
-    if os.path.exists(STATS_FILE):
-        try:
-            with open(STATS_FILE, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"⚠️ Could not load stats: {e}")
-    
-    # Return default stats
+metrics = ServiceMetrics('recommendation_api')
+metrics.instrument(app)
+RequestProfiler(metrics, os.path.join(script_dir, 'slow_requests')).instrument(app)
+
+# Trained models live here; retraining writes new files that are hot-reloaded
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(script_dir, 'models'))
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 10))  # seconds, 0 disables
+# Serve memory-mapped artifacts (models/artifacts/) instead of the pickles when they exist
+MODEL_USE_ARTIFACTS = os.environ.get('MODEL_USE_ARTIFACTS', 'true').lower() != 'false'
+# Tree inference engine: 'compiled' (vectorized, bit-identical), 'sklearn' (the pickled estimators) or 'onnx'
+RECOMMENDER_ENGINE = os.environ.get('RECOMMENDER_ENGINE', 'compiled').lower()
+# 'lattice' answers in-grid profiles from the precomputed score lattice (python ai-model/score_lattice.py)
+RECOMMENDER_SCORE_MODE = os.environ.get('RECOMMENDER_SCORE_MODE', 'model').lower()
+# Per-city models (CITY_MODEL_DIR/<city>/), loaded on first use and evicted LRU beyond the budget
+CITY_MODEL_DIR = os.environ.get('CITY_MODEL_DIR', os.path.join(MODEL_DIR, 'cities'))
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 512))
+# Candidate models scored in shadow against live /recommend traffic (unset disables), reported on /stats
+SHADOW_MODEL_DIR = os.environ.get('SHADOW_MODEL_DIR')
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 1.0))
+SHADOW_WORKERS = int(os.environ.get('SHADOW_WORKERS', 1))
+SHADOW_MAX_PENDING = int(os.environ.get('SHADOW_MAX_PENDING', 64))
+
+def load_fallback_codes():
+    """Fallback codes for unseen categorical values, e.g. FEATURE_FALLBACK_DAY_TYPE=weekday"""
+    fallback_codes = {}
+    for column in CATEGORICAL_COLUMNS:
+        value = os.environ.get(f'FEATURE_FALLBACK_{column.upper()}')
+        if value:
+            fallback_codes[column] = int(value) if value.isdigit() else value
+    return fallback_codes
+
+# Ranked-result cache for repeated /recommend profiles
+CACHE_BUDGET_STEP = float(os.environ.get('RECOMMENDATION_CACHE_BUDGET_STEP', 500))  # PKR
+CACHE_VIEW_TIME_STEP = int(os.environ.get('RECOMMENDATION_CACHE_VIEW_TIME_STEP', 10))  # seconds
+recommendation_cache = ResultCache(
+    max_entries=int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 1024)),
+    ttl_seconds=float(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))
+)
+
+# Room inventory exported from the Prisma Room table (JSON array or CSV)
+ROOM_CATALOG_FILE = os.environ.get('ROOM_CATALOG_FILE', os.path.join(script_dir, 'rooms_catalog.json'))
+room_catalog = None
+
+# Optional shared secret for admin endpoints (sent as X-Admin-Token)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Users scored per model call by /recommend/batch
+BATCH_CHUNK_SIZE = int(os.environ.get('RECOMMEND_BATCH_CHUNK_SIZE', 256))
+
+# Room types to evaluate (Pakistan - 10 types)
+ROOM_TYPES = ['Budget Room', 'Economy Room', 'Standard Room', 'Deluxe Room',
+              'Business Room', 'Junior Suite', 'Executive Suite', 'Family Suite',
+              'Presidential Suite', 'Royal Suite']
+
+# Client-supplied labels are counted in a fixed number of Space-Saving slots per counter
+STATS_LABEL_SLOTS = int(os.environ.get('STATS_LABEL_SLOTS', 64))
+LABEL_KEYS = ("room_type_counts", "user_type_counts", "season_counts", "day_type_counts", "room_bookings")
+
+def default_stats():
+    """Empty stats state"""
     return {
         "total_predictions": 0,
-        "room_type_counts": {},
-        "user_type_counts": {},
-        "season_counts": {},
-        "day_type_counts": {},
-        "avg_compatibility": [],
-        "avg_booking_likelihood": [],
+        "room_type_counts": SpaceSaving(STATS_LABEL_SLOTS),
+        "user_type_counts": SpaceSaving(STATS_LABEL_SLOTS),
+        "season_counts": SpaceSaving(STATS_LABEL_SLOTS),
+        "day_type_counts": SpaceSaving(STATS_LABEL_SLOTS),
+        "compatibility": StreamingSummary(),
+        "booking_likelihood": StreamingSummary(),
         "start_time": datetime.now().isoformat(),
         "clicks": 0,
         "views": 0,
         "bookings": 0,
         "device_breakdown": {"desktop": 0, "mobile": 0, "tablet": 0},
         "time_of_day": {},
-        "session_times": [],
+        "session_time": StreamingSummary(),
         "bounce_count": 0,
         "total_sessions": 0,
         "total_revenue": 0,
         "ai_driven_revenue": 0,
-        "booking_revenues": [],
-        "room_bookings": {}
+        "order_value": StreamingSummary(),
+        "room_bookings": SpaceSaving(STATS_LABEL_SLOTS),
+        "series": RollupSeries(),
+        "distinct_users": DistinctSeries(),
+        "distinct_visitors": DistinctSeries()
     }
 
-def save_stats():
-    """Save stats to file"""
-    try:
-        with open(STATS_FILE, 'w') as f:
-            json.dump(stats, f, indent=2)
-    except Exception as e:
-        print(f"⚠️ Could not save stats: {e}")
-
-# Global stats tracking - load from file
-stats = load_stats()
-print(f"📊 Loaded stats: {stats['total_predictions']} predictions, {stats['bookings']} bookings")
+def count_label(counts, label, amount=1):
+    """Increment a label counter dict"""
+    counts[label] = counts.get(label, 0) + amount
 
-def load_models():
-    """Load trained ML models"""
-    global compatibility_model, booking_model, scaler, label_encoders
+def apply_event(state, event):
+    """Apply one analytics event to the stats state
     
-    # Get the directory of this script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    model_dir = os.path.join(script_dir, 'models')
+    Events are compact dicts: 'k' is the kind ('rec' for a served
+    recommendation, 'track' for a /track call), 't' the unix timestamp.
+    'uh' / 'vh' are hashes of the optional user and session ids.
+    """
+    # Track time of day (string keys so snapshot and live counters agree)
+    hour = str(datetime.fromtimestamp(event['t']).hour)
+    count_label(state["time_of_day"], hour)
     
-    print("📂 Loading AI models...")
+    device = event.get('dev')
+    if device in state["device_breakdown"]:
+        state["device_breakdown"][device] += 1
     
-    try:
-        with open(f'{model_dir}/compatibility_model.pkl', 'rb') as f:
-            compatibility_model = pickle.load(f)
-        
-        with open(f'{model_dir}/booking_model.pkl', 'rb') as f:
-            booking_model = pickle.load(f)
-        
-        with open(f'{model_dir}/scaler.pkl', 'rb') as f:
-            scaler = pickle.load(f)
+    if event.get('uh'):
+        state["distinct_users"].add(event['t'], event['uh'])
+    if event.get('vh'):
+        state["distinct_visitors"].add(event['t'], event['vh'])
+    
+    if event['k'] == 'rec':
+        state["total_predictions"] += 1
+        state["views"] += 1  # Auto-track view
+        state["total_sessions"] += 1
+        state["series"].add(event['t'], predictions=1, views=1, sessions=1)
+        state["user_type_counts"].add(event['u'])
+        state["season_counts"].add(event['s'])
+        state["day_type_counts"].add(event['d'])
         
-        with open(f'{model_dir}/label_encoders.pkl', 'rb') as f:
-            label_encoders = pickle.load(f)
+        for room_type, compatibility, booking_likelihood in event['r']:
+            state["room_type_counts"].add(room_type)
+            state["compatibility"].add(compatibility)
+            state["booking_likelihood"].add(booking_likelihood)
+    
+    elif event['k'] == 'track':
+        interaction_type = event.get('type')
         
-        print("✅ Models loaded successfully!")
+        if interaction_type == 'view':
+            state["views"] += 1
+            state["total_sessions"] += 1
+            state["series"].add(event['t'], views=1, sessions=1)
+            
+        elif interaction_type == 'click':
+            state["clicks"] += 1
+            state["series"].add(event['t'], clicks=1)
+            
+        elif interaction_type == 'booking':
+            state["bookings"] += 1
+            
+            # Track revenue
+            revenue = event.get('rev', 0)
+            state["series"].add(event['t'], bookings=1, revenue=revenue)
+            state["total_revenue"] += revenue
+            state["ai_driven_revenue"] += revenue  # Assume all bookings are AI-driven
+            state["order_value"].add(revenue)
+            
+            # Track bookings by room type
+            state["room_bookings"].add(event.get('room', 'Unknown'))
+        elif interaction_type == 'bounce':
+            state["bounce_count"] += 1
+            state["series"].add(event['t'], bounces=1)
+            
+        elif interaction_type == 'session':
+            state["session_time"].add(event.get('dur', 0))
+
+# Distinct users (by user id) and visitors (by session id), as HyperLogLogs per hour and day
+DISTINCT_KEYS = ("distinct_users", "distinct_visitors")
+
+# Streaming summaries and the raw-value lists older snapshots kept instead
+SUMMARY_KEYS = {
+    "compatibility": "avg_compatibility",
+    "booking_likelihood": "avg_booking_likelihood",
+    "session_time": "session_times",
+    "order_value": "booking_revenues"
+}
+
+def upgrade_stats(state):
+    """Turn a loaded snapshot (current or older format) into the live stats state"""
+    state["time_of_day"] = {str(hour): count for hour, count in state.get("time_of_day", {}).items()}
+    for key, legacy_key in SUMMARY_KEYS.items():
+        if legacy_key in state:
+            state[key] = StreamingSummary.from_values(state.pop(legacy_key))
+        elif isinstance(state.get(key), dict):
+            state[key] = StreamingSummary.from_dict(state[key])
+    if isinstance(state.get("series"), dict):
+        state["series"] = RollupSeries.from_dict(state["series"])
+    for key in DISTINCT_KEYS:
+        if isinstance(state.get(key), dict):
+            state[key] = DistinctSeries.from_dict(state[key])
+    for key in LABEL_KEYS:
+        if isinstance(state.get(key), dict):
+            state[key] = SpaceSaving.from_dict(state[key], STATS_LABEL_SLOTS)
+    for key, value in default_stats().items():
+        state.setdefault(key, value)
+    return state
+
+def dump_stats(state):
+    """JSON-serializable copy of the live stats state"""
+    data = dict(state)
+    for key in SUMMARY_KEYS:
+        data[key] = state[key].to_dict()
+    data["series"] = state["series"].to_dict()
+    for key in LABEL_KEYS + DISTINCT_KEYS:
+        data[key] = state[key].to_dict()
+    return data
+
+def merge_stats(target, source):
+    """Add one stats state into another (counters sum, summaries merge)"""
+    for key, value in source.items():
+        if key == "event_seq":
+            continue
+        if key == "start_time":
+            target[key] = min(target.get(key, value), value)
+        elif isinstance(value, (StreamingSummary, RollupSeries, SpaceSaving, DistinctSeries)):
+            target[key].merge(value)
+        elif isinstance(value, dict):
+            bucket = target.setdefault(key, {})
+            for label, count in value.items():
+                bucket[label] = bucket.get(label, 0) + count
+        elif isinstance(value, (int, float)):
+            target[key] = target.get(key, 0) + value
+    return target
+
+def merged_stats():
+    """Stats of this worker merged with every other worker's shard"""
+    merged = default_stats()
+    with stats_store.lock:
+        merge_stats(merged, stats)
+    for shard in stats_shards.peer_shards():
+        merge_stats(merged, stats_shards.read_peer(shard, default_stats, apply_event, upgrade_stats))
+    return merged
+
+# Global stats tracking - snapshot plus replayed event log
+stats_store = StatsStore(
+    STATS_FILE, STATS_LOG_FILE, default_stats, apply_event,
+    snapshot_interval=float(os.environ.get('STATS_SNAPSHOT_INTERVAL', 30)),
+    upgrade_state=upgrade_stats,
+    dump_state=dump_stats,
+    observe=metrics.observe_stage
+)
+stats = stats_store.load()
+if not RELOADER_WATCHER:
+    stats_store.start()
+    atexit.register(stats_store.close)
+
+# /track events are queued and recorded in bulk (atexit runs last-registered first, so this flushes before the close above)
+TRACK_MAX_BATCH = int(os.environ.get('TRACK_MAX_BATCH', 500))
+TRACK_MAX_EVENT_AGE = float(os.environ.get('TRACK_MAX_EVENT_AGE', 3600))  # seconds a client may hold an event
+event_buffer = EventBuffer(
+    stats_store,
+    flush_interval=float(os.environ.get('TRACK_FLUSH_INTERVAL', 1.0)),
+    flush_size=int(os.environ.get('TRACK_FLUSH_SIZE', 500)),
+    capacity=int(os.environ.get('TRACK_BUFFER_CAPACITY', 50000))
+)
+if not RELOADER_WATCHER:
+    event_buffer.start()
+    atexit.register(event_buffer.close)
+
+# /track events carrying an "event_id" are dropped when the id was already seen in this
+# worker within the window (retries, double-fired browser events); memory is fixed by the capacity.
+# Not shared between workers - a retry routed to another worker is counted again
+track_dedup = RotatingBloomFilter(
+    window=float(os.environ.get('TRACK_DEDUP_WINDOW', 3600)),
+    capacity=int(os.environ.get('TRACK_DEDUP_CAPACITY', 1000000)),
+    error_rate=float(os.environ.get('TRACK_DEDUP_ERROR_RATE', 0.001))
+)
+if not RELOADER_WATCHER:
+    print(f"📊 Loaded stats shard {stats_shards.shard}: {stats['total_predictions']} predictions, {stats['bookings']} bookings")
+
+def device_from_user_agent(user_agent):
+    """Classify a User-Agent header as mobile, tablet or desktop"""
+    user_agent = user_agent.lower()
+    if 'mobile' in user_agent:
+        return 'mobile'
+    elif 'tablet' in user_agent or 'ipad' in user_agent:
+        return 'tablet'
+    return 'desktop'
+
+def load_room_catalog(path=ROOM_CATALOG_FILE):
+    """Load the room catalog export if present"""
+    global room_catalog
+    
+    if not os.path.exists(path):
+        print(f"ℹ️ No room catalog at {path} - /recommend/rooms disabled until refreshed")
+        return False
+    
+    try:
+        room_catalog = RoomCatalog.load(path)
+        print(f"🏨 Loaded room catalog: {len(room_catalog)} rooms")
         return True
     except Exception as e:
-        print(f"❌ Error loading models: {e}")
+        print(f"❌ Error loading room catalog: {e}")
         return False
 
-def prepare_features(user_data):
-    """Prepare features for prediction - Pakistan Model (10 features)"""
+def require_admin():
+    """Error response if ADMIN_TOKEN is set and the request does not carry it"""
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Admin token required'}), 403
+    return None
+
+def smoke_test(bundle):
+    """Raise if a freshly loaded bundle cannot score a default profile"""
+    features = prepare_room_features(bundle, {}, ROOM_TYPES)
+    compatibility_scores, _, booking_probabilities = score_features(bundle, features)
+    if len(compatibility_scores) != len(ROOM_TYPES) or len(booking_probabilities) != len(ROOM_TYPES):
+        raise ValueError('Smoke prediction returned the wrong number of rows')
+    if not (np.all(np.isfinite(compatibility_scores)) and np.all(np.isfinite(booking_probabilities))):
+        raise ValueError('Smoke prediction returned non-finite scores')
+
+score_lattice = None
+
+def load_score_lattice(bundle):
+    """Load the score lattice built for this model version, if lattice mode is on"""
+    global score_lattice
+    if RECOMMENDER_SCORE_MODE != 'lattice':
+        return
+    lattice = ScoreLattice.load(bundle.model_dir)
+    if lattice is not None and lattice.version == bundle.version:
+        score_lattice = lattice
+        print(f"🧮 Score lattice loaded ({lattice.info()['cells']:,} cells)")
+    else:
+        score_lattice = None
+        print(f"⚠️  No score lattice for model version {bundle.version}, scoring with the live models")
+
+def on_models_swapped(bundle):
+    """Drop state computed with the previous models"""
+    recommendation_cache.clear()
+    load_score_lattice(bundle)
+
+fallback_codes = load_fallback_codes()
+
+model_registry = ModelRegistry(
+    MODEL_DIR,
+    validate=smoke_test,
+    on_swap=on_models_swapped,
+    fallback_codes=fallback_codes,
+    watch_interval=MODEL_WATCH_INTERVAL,
+    use_artifacts=MODEL_USE_ARTIFACTS,
+    engine=RECOMMENDER_ENGINE
+)
+
+def make_city_registry(model_dir):
+    """Registry for one city's models, configured like the default one"""
+    return ModelRegistry(
+        model_dir,
+        validate=smoke_test,
+        fallback_codes=fallback_codes,
+        watch_interval=MODEL_WATCH_INTERVAL,
+        use_artifacts=MODEL_USE_ARTIFACTS,
+        engine=RECOMMENDER_ENGINE
+    )
+
+city_models = CityModels(model_registry, CITY_MODEL_DIR, make_city_registry, MODEL_MEMORY_BUDGET_MB)
+
+def shadow_rank(bundle, user_data):
+    """Ranking from a bundle's models, scored off the request path (no cache, lattice or stage timings)"""
+    features = prepare_room_features(bundle, user_data, ROOM_TYPES)
+    return build_recommendations(*predict_scores(bundle, features))
+
+# The candidate is loaded, validated and hot-reloaded like a city's models
+shadow = ShadowEvaluator(
+    make_city_registry(SHADOW_MODEL_DIR),
+    shadow_rank,
+    workers=SHADOW_WORKERS,
+    sample_rate=SHADOW_SAMPLE_RATE,
+    max_pending=SHADOW_MAX_PENDING
+) if SHADOW_MODEL_DIR else None
+
+def shadow_recommendation(bundle, user_data):
+    """Queue a served profile for comparison with the shadow models (never blocks)"""
+    # The candidate replaces the default models, so city-model traffic is not compared
+    if shadow is not None and bundle is model_registry.active:
+        shadow.submit(bundle, user_data)
+
+def registry_info():
+    """Default model registry plus the per-city and shadow models"""
+    return {
+        **model_registry.info(),
+        'cities': city_models.info(),
+        'shadow': shadow.registry.info() if shadow is not None else None
+    }
+
+def load_models():
+    """Load trained ML models"""
+    print("📂 Loading AI models...")
     
-    # Encode categorical features
-    user_type_enc = label_encoders['user_type'].transform([user_data.get('user_type', 'solo')])[0]
-    room_type_enc = label_encoders['room_type'].transform([user_data.get('room_type', 'Standard Room')])[0]
-    season_enc = label_encoders['season'].transform([user_data.get('season', 'summer')])[0]
-    day_type_enc = label_encoders['day_type'].transform([user_data.get('day_type', 'weekday')])[0]
+    ok, result = model_registry.reload()
+    if ok:
+        print(f"✅ Models loaded successfully! (version {result.version})")
+        if city_models.available:
+            print(f"🏙️  City models (loaded on first request): {', '.join(sorted(city_models.available))}")
+        if shadow is not None:
+            shadow_ok, shadow_result = shadow.registry.reload()
+            if shadow_ok:
+                print(f"👥 Shadow models loaded from {SHADOW_MODEL_DIR} (version {shadow_result.version})")
+            else:
+                print(f"⚠️  Shadow models not loaded, live traffic is not compared: {shadow_result}")
+        return True
+    print(f"❌ Error loading models: {result}")
+    return False
+
+def prepare_features(bundle, user_data):
+    """Prepare features for prediction - Pakistan Model (10 features)"""
+    return bundle.feature_tables.row_features(user_data)
+
+def prepare_room_features(bundle, user_data, room_types):
+    """Prepare one feature matrix holding a row per candidate room type"""
+    return bundle.feature_tables.room_features(user_data, room_types)
+
+def lattice_scores(bundle, user_data, room_types):
+    """Scores from the score lattice, or None when it is off or does not cover the profile"""
+    lattice = score_lattice
+    if lattice is not None and lattice.version == bundle.version:
+        return lattice.lookup(user_data, room_types)
+    return None
+
+def score_room_types(bundle, user_data, room_types):
+    """Scores for one profile, from the score lattice when it covers the profile"""
+    if score_lattice is not None:
+        with metrics.stage('lattice'):
+            scores = lattice_scores(bundle, user_data, room_types)
+        if scores is not None:
+            return scores
+    with metrics.stage('features'):
+        features = prepare_room_features(bundle, user_data, room_types)
+    return score_features(bundle, features)
+
+def score_features(bundle, features):
+    """Score a feature matrix with one call per model
     
-    # Numerical features
-    booking_advance = user_data.get('booking_advance', 7)
-    stay_duration = user_data.get('stay_duration', 2)
-    group_size = user_data.get('group_size', 2)
-    view_time = user_data.get('view_time', 120)
-    previous_bookings = user_data.get('previous_bookings', 0)
-    budget = user_data.get('budget', 15000)  # PKR default
+    Returns (compatibility_scores, compatibility_classes, booking_probabilities)
+    as arrays with one entry per row.
+    """
+    start = time.perf_counter()
+    scores = predict_scores(bundle, features)
+    metrics.observe_stage('inference', time.perf_counter() - start)
     
-    # Create feature vector (10 features - no feature engineering)
-    features = np.array([[
-        user_type_enc, room_type_enc, season_enc, day_type_enc,
-        booking_advance, stay_duration, group_size, view_time,
-        previous_bookings, budget
-    ]])
+    return scores
+
+def predict_scores(bundle, features):
+    """score_features without the stage timing"""
+    compatibility_proba = bundle.compatibility_model.predict_proba(features)
+    # Derive the class label from the probabilities instead of a second predict call
+    compatibility_classes = bundle.compatibility_model.classes_[np.argmax(compatibility_proba, axis=1)]
+    compatibility_scores = compatibility_proba[:, 1]  # Probability of high compatibility
     
-    # Scale features
-    features_scaled = scaler.transform(features)
+    booking_probabilities = np.clip(bundle.booking_model.predict(features), 0, 1)
     
-    return features_scaled
+    return compatibility_scores, compatibility_classes, booking_probabilities
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -133,235 +491,621 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'AI Recommendation API',
-        'models_loaded': compatibility_model is not None,
+        'models_loaded': model_registry.active is not None,
+        'model_version': model_registry.active.version if model_registry.active else None,
+        'room_catalog': room_catalog.summary() if room_catalog is not None else None,
         'timestamp': datetime.now().isoformat()
     })
 
+def window_stats(stats, window):
+    """Counters, rates and distinct users/visitors over one of the time_series WINDOWS"""
+    result = stats["series"].window(window)
+    totals = result['totals']
+    totals['distinct_users'] = stats["distinct_users"].window(window)
+    totals['distinct_visitors'] = stats["distinct_visitors"].window(window)
+    totals['click_through_rate'] = round(totals['clicks'] / totals['views'] * 100, 2) if totals['views'] > 0 else 0
+    totals['conversion_rate'] = round(totals['bookings'] / totals['views'] * 100, 2) if totals['views'] > 0 else 0
+    totals['bounce_rate'] = round(totals['bounces'] / totals['sessions'] * 100, 2) if totals['sessions'] > 0 else 0
+    totals['average_order_value'] = round(totals['revenue'] / totals['bookings'], 2) if totals['bookings'] > 0 else 0
+    return result
+
 @app.route('/stats', methods=['GET'])
 def get_stats():
-    """Get model statistics and analytics"""
+    """Get model statistics and analytics
+    
+    ?window=1h|24h|7d|30d|90d|1y adds views, clicks, bookings and revenue over
+    that window (totals plus one point per bucket) under 'window'.
+    """
+    window = request.args.get('window')
+    if window is not None and window not in WINDOWS:
+        return jsonify({'error': f"Unknown window '{window}'", 'windows': list(WINDOWS)}), 400
+    
     try:
-        avg_compat = np.mean(stats["avg_compatibility"]) if stats["avg_compatibility"] else 0
-        avg_booking = np.mean(stats["avg_booking_likelihood"]) if stats["avg_booking_likelihood"] else 0
-        avg_session_time = np.mean(stats["session_times"]) if stats["session_times"] else 0
-        
-        # Calculate click-through rate
-        ctr = (stats["clicks"] / stats["views"] * 100) if stats["views"] > 0 else 0
-        
-        # Calculate conversion rate
-        conversion_rate = (stats["bookings"] / stats["views"] * 100) if stats["views"] > 0 else 0
-        
-        # Calculate bounce rate
-        bounce_rate = (stats["bounce_count"] / stats["total_sessions"] * 100) if stats["total_sessions"] > 0 else 0
-        
-        # Calculate revenue metrics
-        avg_order_value = (stats["total_revenue"] / stats["bookings"]) if stats["bookings"] > 0 else 0
-        ai_contribution = (stats["ai_driven_revenue"] / stats["total_revenue"] * 100) if stats["total_revenue"] > 0 else 0
-        
-        # Calculate device percentages
-        total_devices = sum(stats["device_breakdown"].values())
-        device_percentages = {
-            device: round((count / total_devices * 100), 1) if total_devices > 0 else 0
-            for device, count in stats["device_breakdown"].items()
-        }
+        return jsonify(stats_payload(window))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# /stats/stream: one broadcaster per window, each computing the payload once per tick for all subscribers
+STATS_STREAM_INTERVAL = float(os.environ.get('STATS_STREAM_INTERVAL', 2.0))
+STATS_STREAM_KEEPALIVE = 15  # seconds between SSE comments on a quiet stream (detects closed connections)
+# Each Flask subscriber holds a worker thread for as long as it is connected; async_server.py has no such cap
+STATS_STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STATS_STREAM_MAX_SUBSCRIBERS', 8))
+stats_stream_slots = threading.BoundedSemaphore(STATS_STREAM_MAX_SUBSCRIBERS)
+stats_broadcasters = {}
+stats_broadcasters_lock = threading.Lock()
+
+def stats_broadcaster(window=None):
+    """Shared broadcaster for /stats/stream?window="""
+    with stats_broadcasters_lock:
+        broadcaster = stats_broadcasters.get(window)
+        if broadcaster is None:
+            broadcaster = StatsBroadcaster(lambda: stats_payload(window), STATS_STREAM_INTERVAL)
+            stats_broadcasters[window] = broadcaster
+        return broadcaster
+
+@app.route('/stats/stream', methods=['GET'])
+def stream_stats():
+    """Push /stats to a dashboard as Server-Sent Events
+    
+    Sends a 'snapshot' event with the full /stats payload, then a 'delta'
+    event every STATS_STREAM_INTERVAL seconds with only the changed keys.
+    Accepts the same ?window= as /stats. Every open stream blocks a worker,
+    so past STATS_STREAM_MAX_SUBSCRIBERS the response is 503; serve many
+    dashboards from async_server.py instead.
+    """
+    window = request.args.get('window')
+    if window is not None and window not in WINDOWS:
+        return jsonify({'error': f"Unknown window '{window}'", 'windows': list(WINDOWS)}), 400
+    
+    if not stats_stream_slots.acquire(blocking=False):
+        return jsonify({'error': f'At most {STATS_STREAM_MAX_SUBSCRIBERS} stats streams per worker, '
+                                 'retry later or use the async server'}), 503
+    
+    broadcaster = stats_broadcaster(window)
+    subscription = broadcaster.subscribe(Subscription())
+    
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    yield subscription.get(timeout=STATS_STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            broadcaster.unsubscribe(subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the connection closes, even if the stream never started
+    response.call_on_close(stats_stream_slots.release)
+    return response
+
+def stats_stream_info():
+    """Subscribers and compute cost per stats stream"""
+    with stats_broadcasters_lock:
+        return {window or 'all': broadcaster.info() for window, broadcaster in stats_broadcasters.items()}
+
+def stats_payload(window=None):
+    """The /stats response body (also what /stats/stream pushes)"""
+    # Merged view of all workers' shards
+    stats = merged_stats()
+    
+    avg_compat = stats["compatibility"].mean
+    avg_booking = stats["booking_likelihood"].mean
+    avg_session_time = stats["session_time"].mean
+    
+    # Calculate click-through rate
+    ctr = (stats["clicks"] / stats["views"] * 100) if stats["views"] > 0 else 0
+    
+    # Calculate conversion rate
+    conversion_rate = (stats["bookings"] / stats["views"] * 100) if stats["views"] > 0 else 0
+    
+    # Calculate bounce rate
+    bounce_rate = (stats["bounce_count"] / stats["total_sessions"] * 100) if stats["total_sessions"] > 0 else 0
+    
+    # Calculate revenue metrics
+    avg_order_value = (stats["total_revenue"] / stats["bookings"]) if stats["bookings"] > 0 else 0
+    ai_contribution = (stats["ai_driven_revenue"] / stats["total_revenue"] * 100) if stats["total_revenue"] > 0 else 0
+    
+    # Calculate device percentages
+    total_devices = sum(stats["device_breakdown"].values())
+    device_percentages = {
+        device: round((count / total_devices * 100), 1) if total_devices > 0 else 0
+        for device, count in stats["device_breakdown"].items()
+    }
+    
+    # Format time of day data
+    time_of_day_data = [
+        {"hour": int(hour), "interactions": count}
+        for hour, count in sorted(stats["time_of_day"].items(), key=lambda x: int(x[0]))
+    ]
+    
+    bundle = model_registry.active
+    model_version = bundle.info() if bundle else {}
+    
+    return {
+        'success': True,
+        'model_info': {
+            'version': model_version.get('version', 'not loaded'),
+            'loaded_at': model_version.get('loaded_at'),
+            'last_trained': model_version.get('trained_at') or stats["start_time"],
+            'total_predictions': stats["total_predictions"],
+            'features_used': 13,
+            'algorithms': [model_version['compatibility_model'], model_version['booking_model']] if bundle else [],
+            'registry': registry_info()
+        },
+        'cache': recommendation_cache.stats(),
+        'score_lattice': score_lattice.info() if score_lattice is not None else None,
+        'shadow': shadow.summary() if shadow is not None else None,
+        'tracking': {**event_buffer.info(), 'dedup': track_dedup.info()},
+        'stats_stream': stats_stream_info(),
+        'performance': {
+            'avg_compatibility_score': round(avg_compat, 2),
+            'avg_booking_likelihood': round(avg_booking, 2),
+            'total_recommendations': stats["compatibility"].count,
+            'compatibility_distribution': stats["compatibility"].summary(),
+            'booking_likelihood_distribution': stats["booking_likelihood"].summary()
+        },
+        'usage_stats': {
+            'total_requests': stats["total_predictions"],
+            'room_type_distribution': stats["room_type_counts"].top(),
+            'user_type_distribution': stats["user_type_counts"].top(),
+            'season_distribution': stats["season_counts"].top(),
+            'day_type_distribution': stats["day_type_counts"].top(),
+            # Per-label over-count bounds of the distributions above (Space-Saving errors)
+            'label_counters': {key: stats[key].summary() for key in LABEL_KEYS}
+        },
+        'user_behavior': {
+            'total_interactions': stats["views"],
+            'clicks': stats["clicks"],
+            'bookings': stats["bookings"],
+            'click_through_rate': round(ctr, 2),
+            'conversion_rate': round(conversion_rate, 2),
+            'average_session_time': round(avg_session_time, 0),
+            'bounce_rate': round(bounce_rate, 2),
+            'device_breakdown': device_percentages,
+            'time_of_day': time_of_day_data,
+            'session_time_distribution': stats["session_time"].summary(0)
+        },
+        'revenue': {
+            'total_revenue': round(stats["total_revenue"], 2),
+            'ai_driven_revenue': round(stats["ai_driven_revenue"], 2),
+            'ai_contribution': round(ai_contribution, 2),
+            'average_order_value': round(avg_order_value, 2),
+            'total_bookings': stats["bookings"],
+            'room_bookings': stats["room_bookings"].top(),
+            'order_value_distribution': stats["order_value"].summary()
+        },
+        'audience': {
+            'distinct_users': stats["distinct_users"].summary(),
+            'distinct_visitors': stats["distinct_visitors"].summary(),
+            'relative_error': round(HyperLogLog().relative_error, 4)
+        },
+        'window': window_stats(stats, window) if window else None,
+        'timestamp': datetime.now().isoformat()
+    }
+
+# Map frontend user types to model user types
+USER_TYPE_MAP = {
+    'business_traveler': 'business',
+    'family_vacation': 'family',
+    'couple_romantic': 'couple',
+    'solo_traveler': 'solo',
+    'group_friends': 'group',
+    'luxury_seeker': 'luxury',
+    'budget_conscious': 'budget'
+}
+
+def bucket(value, step):
+    """Round a numeric value to the nearest multiple of step"""
+    if step <= 0:
+        return value
+    return round(value / step) * step
+
+def request_number(data, key, default):
+    """Numeric field of a request payload; numeric strings are accepted, NaN and infinities are not"""
+    value = data.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f'"{key}" must be a number')
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f'"{key}" must be a number')
+    if not math.isfinite(number):
+        raise ValueError(f'"{key}" must be a finite number')
+    return number
+
+def parse_recommendation_request(data):
+    """Normalize a /recommend payload into (user_type_raw, model inputs)
+    
+    Numeric inputs are bucketed so repeated slider values share one cache key;
+    the bucketed values are also what gets scored, so cached and fresh results agree.
+    Raises ValueError for a payload that is not an object or has a non-numeric number field.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    user_type_raw = data.get('userType', 'solo_traveler')
+    
+    user_data = {
+        'user_type': USER_TYPE_MAP.get(user_type_raw, 'solo'),
+        'season': str(data.get('season', 'summer')).strip().lower(),
+        'day_type': str(data.get('dayType', 'weekday')).strip().lower(),
+        'booking_advance': int(request_number(data, 'bookingAdvance', 7)),
+        'stay_duration': int(request_number(data, 'stayDuration', 2)),
+        'group_size': int(request_number(data, 'groupSize', 2)),
+        'view_time': int(bucket(int(request_number(data, 'viewTime', 120)), CACHE_VIEW_TIME_STEP)),
+        'previous_bookings': int(request_number(data, 'previousBookings', 0)),
+        'budget': float(bucket(request_number(data, 'budget', 150), CACHE_BUDGET_STEP))
+    }
+    
+    return user_type_raw, user_data
+
+def profile_key(bundle, user_data):
+    """Cache key for a normalized profile scored by a given model version"""
+    return (
+        bundle.version,
+        user_data['user_type'], user_data['season'], user_data['day_type'],
+        user_data['booking_advance'], user_data['stay_duration'], user_data['group_size'],
+        user_data['view_time'], user_data['previous_bookings'], user_data['budget']
+    )
+
+def build_recommendations(compatibility_scores, compatibility_classes, booking_probabilities, offset=0):
+    """Ranked recommendation dicts for the ROOM_TYPES rows starting at offset"""
+    
+    recommendations = []
+    
+    for i, room_type in enumerate(ROOM_TYPES):
+        compatibility_score = float(compatibility_scores[offset + i])
+        compatibility_class = compatibility_classes[offset + i]
+        booking_probability = float(booking_probabilities[offset + i])
         
-        # Format time of day data
-        time_of_day_data = [
-            {"hour": int(hour), "interactions": count}
-            for hour, count in sorted(stats["time_of_day"].items(), key=lambda x: int(x[0]))
-        ]
+        # Calculate overall score
+        overall_score = (compatibility_score * 0.6) + (booking_probability * 0.4)
         
-        return jsonify({
-            'success': True,
-            'model_info': {
-                'version': '1.0.0',
-                'last_trained': stats["start_time"],
-                'total_predictions': stats["total_predictions"],
-                'features_used': 13,
-                'algorithms': ['Logistic Regression', 'Linear Regression']
-            },
-            'performance': {
-                'avg_compatibility_score': round(avg_compat, 2),
-                'avg_booking_likelihood': round(avg_booking, 2),
-                'total_recommendations': len(stats["avg_compatibility"])
-            },
-            'usage_stats': {
-                'total_requests': stats["total_predictions"],
-                'room_type_distribution': stats["room_type_counts"],
-                'user_type_distribution': stats["user_type_counts"],
-                'season_distribution': stats["season_counts"],
-                'day_type_distribution': stats["day_type_counts"]
-            },
-            'user_behavior': {
-                'total_interactions': stats["views"],
-                'clicks': stats["clicks"],
-                'bookings': stats["bookings"],
-                'click_through_rate': round(ctr, 2),
-                'conversion_rate': round(conversion_rate, 2),
-                'average_session_time': round(avg_session_time, 0),
-                'bounce_rate': round(bounce_rate, 2),
-                'device_breakdown': device_percentages,
-                'time_of_day': time_of_day_data
-            },
-            'revenue': {
-                'total_revenue': round(stats["total_revenue"], 2),
-                'ai_driven_revenue': round(stats["ai_driven_revenue"], 2),
-                'ai_contribution': round(ai_contribution, 2),
-                'average_order_value': round(avg_order_value, 2),
-                'total_bookings': stats["bookings"],
-                'room_bookings': stats["room_bookings"]
-            },
-            'timestamp': datetime.now().isoformat()
+        recommendations.append({
+            'roomType': room_type,
+            'compatibilityScore': round(compatibility_score * 100, 2),
+            'bookingLikelihood': round(booking_probability * 100, 2),
+            'overallScore': round(overall_score * 100, 2),
+            'isHighMatch': bool(compatibility_class == 1),
+            'recommendation': get_recommendation_text(compatibility_score, booking_probability)
         })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    
+    # Sort by overall score
+    recommendations.sort(key=lambda x: x['overallScore'], reverse=True)
+    
+    return recommendations
+
+def rank_rooms(bundle, user_data):
+    """Score every room type for one profile and return them best first"""
+    
+    # Score every room type in one batch (one call per model, or one lattice lookup)
+    return build_recommendations(*score_room_types(bundle, user_data, ROOM_TYPES))
+
+def rank_rooms_batch(bundle, users):
+    """Rank room types for many profiles with one call per model"""
+    
+    with metrics.stage('features'):
+        features = bundle.feature_tables.batch_features(users, ROOM_TYPES)
+    scores = score_features(bundle, features)
+    
+    n_rooms = len(ROOM_TYPES)
+    return [build_recommendations(*scores, offset=u * n_rooms) for u in range(len(users))]
+
+def audience_hashes(user_id, session_id):
+    """Hashed user / session ids for the distinct counts (raw ids are never logged)"""
+    hashes = {}
+    if user_id not in (None, ''):
+        hashes['uh'] = HyperLogLog.hash_value(user_id)
+    if session_id not in (None, ''):
+        hashes['vh'] = HyperLogLog.hash_value(session_id)
+    return hashes
+
+def record_recommendation(user_type_raw, user_data, recommendations, user_agent, data=None):
+    """Track a served /recommend response (appended to the event log, snapshotted in the background)
+    
+    `data` is the request body; its optional "userId" / "sessionId" feed the distinct counts.
+    """
+    data = data or {}
+    stats_store.record({
+        'k': 'rec',
+        't': time.time(),
+        'u': user_type_raw,
+        's': user_data['season'],
+        'd': user_data['day_type'],
+        'dev': device_from_user_agent(user_agent),
+        'r': [[rec["roomType"], rec["compatibilityScore"], rec["bookingLikelihood"]] for rec in recommendations],
+        **audience_hashes(data.get('userId'), data.get('sessionId'))
+    })
+
+def recommendation_payload(recommendations):
+    """JSON body of a /recommend response"""
+    return {
+        'success': True,
+        'recommendations': recommendations,
+        'topRecommendation': recommendations[0] if recommendations else None,
+        'timestamp': datetime.now().isoformat()
+    }
 
 @app.route('/recommend', methods=['POST'])
 def get_recommendations():
-    """Get room recommendations based on user preferences"""
+    """Get room recommendations based on user preferences
     
-    if not compatibility_model or not booking_model:
-        return jsonify({'error': 'Models not loaded'}), 500
+    An optional "city" selects that market's models when it has its own;
+    optional "userId" / "sessionId" are counted for the distinct users and visitors.
+    """
     
     try:
-        data = request.json
-        
-        # Map frontend user types to model user types
-        user_type_map = {
-            'business_traveler': 'business',
-            'family_vacation': 'family',
-            'couple_romantic': 'couple',
-            'solo_traveler': 'solo',
-            'group_friends': 'group',
-            'luxury_seeker': 'luxury',
-            'budget_conscious': 'budget'
-        }
+        with metrics.stage('parse'):
+            data = request.json
+            try:
+                user_type_raw, user_data = parse_recommendation_request(data)
+            except ValueError as e:
+                return jsonify({'error': f'Invalid request: {e}'}), 400
         
-        # Get user preferences and map them
-        user_type_raw = data.get('userType', 'solo_traveler')
-        user_type = user_type_map.get(user_type_raw, 'solo')
-        season = data.get('season', 'summer')
-        day_type = data.get('dayType', 'weekday')
+        # One bundle for the whole request, even if a reload swaps models meanwhile
+        bundle = city_models.bundle(data.get('city'))
+        if bundle is None:
+            return jsonify({'error': 'Models not loaded'}), 500
         
-        # Convert all numeric values to proper types
-        booking_advance = int(data.get('bookingAdvance', 7))
-        stay_duration = int(data.get('stayDuration', 2))
-        group_size = int(data.get('groupSize', 2))
-        budget = float(data.get('budget', 150))
-        view_time = int(data.get('viewTime', 120))
-        previous_bookings = int(data.get('previousBookings', 0))
+        # Serve repeated profiles from the result cache
+        with metrics.stage('cache'):
+            key = profile_key(bundle, user_data)
+            recommendations = recommendation_cache.get(key)
+        if recommendations is None:
+            generation = recommendation_cache.generation
+            recommendations = rank_rooms(bundle, user_data)
+            recommendation_cache.put(key, recommendations, generation)
         
-        # Room types to evaluate (Pakistan - 10 types)
-        room_types = ['Budget Room', 'Economy Room', 'Standard Room', 'Deluxe Room',
-                     'Business Room', 'Junior Suite', 'Executive Suite', 'Family Suite',
-                     'Presidential Suite', 'Royal Suite']
+        record_recommendation(user_type_raw, user_data, recommendations, request.headers.get('User-Agent', ''), data)
+        shadow_recommendation(bundle, user_data)
         
-        recommendations = []
+        with metrics.stage('serialize'):
+            return jsonify(recommendation_payload(recommendations))
         
-        for room_type in room_types:
-            # Prepare features
-            user_data = {
-                'user_type': user_type,
-                'room_type': room_type,
-                'season': season,
-                'day_type': day_type,
-                'booking_advance': booking_advance,
-                'stay_duration': stay_duration,
-                'group_size': group_size,
-                'view_time': view_time,
-                'previous_bookings': previous_bookings,
-                'budget': budget
-            }
-            
-            features = prepare_features(user_data)
-            
-            # Get predictions
-            compatibility_class = compatibility_model.predict(features)[0]
-            compatibility_proba = compatibility_model.predict_proba(features)[0]
-            compatibility_score = float(compatibility_proba[1])  # Probability of high compatibility
+    except Exception as e:
+        print(f"❌ Error in recommendation: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/recommend/batch', methods=['POST'])
+def get_batch_recommendations():
+    """Rank rooms for many user profiles, streamed back as NDJSON
+    
+    Body: a JSON array of /recommend payloads (or {"users": [...], "city": ...}).
+    Each may carry an "id" that is echoed back and a "city" that overrides the
+    batch one. Profiles are scored in chunks of BATCH_CHUNK_SIZE users (one
+    model call per chunk and city model), and one line is written per user as
+    soon as its chunk is done. Batch scoring is for offline jobs such as
+    mailing lists, so it does not count towards the view analytics.
+    """
+    
+    if model_registry.active is None:
+        return jsonify({'error': 'Models not loaded'}), 500
+    
+    data = request.json
+    users = data.get('users') if isinstance(data, dict) else data
+    if not isinstance(users, list):
+        return jsonify({'error': 'Expected a JSON array of user profiles'}), 400
+    batch_city = data.get('city') if isinstance(data, dict) else None
+    
+    def generate():
+        for start in range(0, len(users), BATCH_CHUNK_SIZE):
+            chunk = users[start:start + BATCH_CHUNK_SIZE]
             
-            booking_probability = float(booking_model.predict(features)[0])
-            booking_probability = max(0, min(1, booking_probability))  # Clip to 0-1
+            # Profiles grouped by the bundle that scores them (usually just one)
+            groups, lines = {}, {}
+            for i, profile in enumerate(chunk, start):
+                try:
+                    user_data = parse_recommendation_request(profile)[1]
+                    bundle = city_models.bundle(profile.get('city', batch_city))
+                    groups.setdefault(id(bundle), (bundle, []))[1].append((i, user_data))
+                except Exception as e:
+                    lines[i] = {'index': i, 'error': str(e)}
             
-            # Calculate overall score
-            overall_score = (compatibility_score * 0.6) + (booking_probability * 0.4)
+            for bundle, parsed in groups.values():
+                ranked = rank_rooms_batch(bundle, [user_data for _, user_data in parsed])
+                for (i, _), recommendations in zip(parsed, ranked):
+                    lines[i] = {
+                        'index': i,
+                        'recommendations': recommendations,
+                        'topRecommendation': recommendations[0] if recommendations else None
+                    }
             
-            recommendations.append({
-                'roomType': room_type,
-                'compatibilityScore': round(compatibility_score * 100, 2),
-                'bookingLikelihood': round(booking_probability * 100, 2),
-                'overallScore': round(overall_score * 100, 2),
-                'isHighMatch': bool(compatibility_class == 1),
-                'recommendation': get_recommendation_text(compatibility_score, booking_probability)
-            })
+            for i in range(start, start + len(chunk)):
+                line = lines[i]
+                if isinstance(users[i], dict) and 'id' in users[i]:
+                    line['id'] = users[i]['id']
+                yield json.dumps(line) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def rank_catalog_rooms(bundle, catalog, user_data, rows, limit):
+    """Score the candidate catalog rows and return the best `limit` rooms
+    
+    The model only sees the room type, so each distinct type among the
+    candidates is scored once and its scores are broadcast to its rooms.
+    Ties are broken by the cheaper room.
+    """
+    
+    unique_codes, inverse = np.unique(catalog.type_codes[rows], return_inverse=True)
+    room_types = [catalog.room_types[code] for code in unique_codes]
+    
+    compatibility_scores, compatibility_classes, booking_probabilities = score_room_types(bundle, user_data, room_types)
+    overall_scores = (compatibility_scores * 0.6) + (booking_probabilities * 0.4)
+    
+    order = np.lexsort((catalog.prices[rows], -overall_scores[inverse]))[:limit]
+    
+    recommendations = []
+    for j in order:
+        t = inverse[j]
+        compatibility_score = float(compatibility_scores[t])
+        booking_probability = float(booking_probabilities[t])
+        recommendations.append({
+            **catalog.details[rows[j]],
+            'roomType': room_types[t],
+            'compatibilityScore': round(compatibility_score * 100, 2),
+            'bookingLikelihood': round(booking_probability * 100, 2),
+            'overallScore': round(float(overall_scores[t]) * 100, 2),
+            'isHighMatch': bool(compatibility_classes[t] == 1),
+            'recommendation': get_recommendation_text(compatibility_score, booking_probability)
+        })
+    
+    # Every scored type, in the shape record_recommendation() counts
+    scored_types = [
+        {
+            'roomType': room_types[t],
+            'compatibilityScore': round(float(compatibility_scores[t]) * 100, 2),
+            'bookingLikelihood': round(float(booking_probabilities[t]) * 100, 2)
+        }
+        for t in range(len(room_types))
+    ]
+    return recommendations, scored_types
+
+@app.route('/recommend/rooms', methods=['POST'])
+def get_room_recommendations():
+    """Rank actual rooms from the catalog
+    
+    Accepts the /recommend payload (including the optional "userId" /
+    "sessionId") plus optional city, minPrice, maxPrice (defaults to
+    budget when given) and limit. The city also selects that
+    market's models when it has its own.
+    """
+    
+    if model_registry.active is None:
+        return jsonify({'error': 'Models not loaded'}), 500
+    
+    catalog = room_catalog
+    if catalog is None:
+        return jsonify({'error': 'Room catalog not loaded'}), 503
+    
+    try:
+        data = request.json
+        try:
+            user_type_raw, user_data = parse_recommendation_request(data)
+            min_price = request_number(data, 'minPrice', None)
+            max_price = request_number(data, 'maxPrice', request_number(data, 'budget', None))
+            limit = max(1, min(int(request_number(data, 'limit', 20)), 200))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid request: {e}'}), 400
         
-        # Sort by overall score
-        recommendations.sort(key=lambda x: x['overallScore'], reverse=True)
+        # One bundle for the whole request, even if a reload swaps models meanwhile
+        bundle = city_models.bundle(data.get('city'))
         
-        # Track stats
-        stats["total_predictions"] += 1
-        stats["views"] += 1  # Auto-track view
-        stats["total_sessions"] += 1
-        stats["user_type_counts"][user_type_raw] = stats["user_type_counts"].get(user_type_raw, 0) + 1
-        stats["season_counts"][season] = stats["season_counts"].get(season, 0) + 1
-        stats["day_type_counts"][day_type] = stats["day_type_counts"].get(day_type, 0) + 1
+        rows = catalog.candidates(city=data.get('city'), min_price=min_price, max_price=max_price)
         
-        # Track device (from request headers)
-        user_agent = request.headers.get('User-Agent', '').lower()
-        if 'mobile' in user_agent:
-            stats["device_breakdown"]["mobile"] += 1
-        elif 'tablet' in user_agent or 'ipad' in user_agent:
-            stats["device_breakdown"]["tablet"] += 1
+        if len(rows) == 0:
+            recommendations, scored_types = [], []
         else:
-            stats["device_breakdown"]["desktop"] += 1
+            recommendations, scored_types = rank_catalog_rooms(bundle, catalog, user_data, rows, limit)
         
-        # Track time of day
-        current_hour = datetime.now().hour
-        stats["time_of_day"][current_hour] = stats["time_of_day"].get(current_hour, 0) + 1
+        if scored_types:
+            record_recommendation(user_type_raw, user_data, scored_types, request.headers.get('User-Agent', ''), data=data)
         
-        for rec in recommendations:
-            room_type = rec["roomType"]
-            stats["room_type_counts"][room_type] = stats["room_type_counts"].get(room_type, 0) + 1
-            stats["avg_compatibility"].append(rec["compatibilityScore"])
-            stats["avg_booking_likelihood"].append(rec["bookingLikelihood"])
+        return jsonify({
+            'success': True,
+            'recommendations': recommendations,
+            'topRecommendation': recommendations[0] if recommendations else None,
+            'totalCandidates': int(len(rows)),
+            'timestamp': datetime.now().isoformat()
+        })
         
-        # Keep only last 10000 scores to prevent memory issues
-        if len(stats["avg_compatibility"]) > 10000:
-            stats["avg_compatibility"] = stats["avg_compatibility"][-10000:]
-            stats["avg_booking_likelihood"] = stats["avg_booking_likelihood"][-10000:]
+    except Exception as e:
+        print(f"❌ Error in room recommendation: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/catalog/refresh', methods=['POST'])
+def refresh_room_catalog():
+    """Reload the room catalog from ROOM_CATALOG_FILE, or replace it with posted rooms"""
+    global room_catalog
+    
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    try:
+        data = request.get_json(silent=True)
+        rooms = data.get('rooms') if isinstance(data, dict) else data
         
-        # Save stats to file
-        save_stats()
+        if isinstance(rooms, list):
+            room_catalog = RoomCatalog(rooms)
+            
+            # Keep the pushed export so a restart serves the same inventory
+            tmp_path = ROOM_CATALOG_FILE + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(rooms, f)
+            os.replace(tmp_path, ROOM_CATALOG_FILE)
+        elif not load_room_catalog():
+            return jsonify({'error': f'Could not load room catalog from {ROOM_CATALOG_FILE}'}), 404
         
         return jsonify({
             'success': True,
-            'recommendations': recommendations,
-            'topRecommendation': recommendations[0] if recommendations else None,
+            'catalog': room_catalog.summary(),
             'timestamp': datetime.now().isoformat()
         })
         
     except Exception as e:
-        print(f"❌ Error in recommendation: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/models/reload', methods=['POST'])
+def reload_models():
+    """Load, validate and swap in the current model files without a restart
+    
+    With {"city": ...} only that city's models are (re)loaded, and with
+    {"shadow": true} only the shadow models; otherwise the default models
+    are, and CITY_MODEL_DIR is rescanned for new cities.
+    """
+    
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    data = request.get_json(silent=True)
+    city = data.get('city') if isinstance(data, dict) else None
+    if isinstance(data, dict) and data.get('shadow'):
+        if shadow is None:
+            return jsonify({'success': False, 'error': 'SHADOW_MODEL_DIR is not set'}), 400
+        ok, result = shadow.registry.reload()
+    elif city:
+        ok, result = city_models.reload(city)
+    else:
+        ok, result = model_registry.reload()
+        city_models.refresh()
+    if not ok:
+        return jsonify({'success': False, 'error': result, 'registry': registry_info()}), 500
+    
+    return jsonify({
+        'success': True,
+        'model': result.info(),
+        'registry': registry_info(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/models', methods=['GET'])
+def get_models():
+    """Active model version, reload history and per-city models"""
+    return jsonify(registry_info())
+
 @app.route('/predict-single', methods=['POST'])
 def predict_single():
     """Predict compatibility and booking likelihood for a single room"""
     
-    if not compatibility_model or not booking_model:
+    if model_registry.active is None:
         return jsonify({'error': 'Models not loaded'}), 500
     
     try:
         data = request.json
-        features = prepare_features(data)
+        # One bundle for the whole request, even if a reload swaps models meanwhile
+        bundle = city_models.bundle(data.get('city'))
+        features = prepare_features(bundle, data)
         
         # Get predictions
-        compatibility_class = compatibility_model.predict(features)[0]
-        compatibility_proba = compatibility_model.predict_proba(features)[0]
-        compatibility_score = float(compatibility_proba[1])
-        
-        booking_probability = float(booking_model.predict(features)[0])
-        booking_probability = max(0, min(1, booking_probability))
+        compatibility_scores, compatibility_classes, booking_probabilities = score_features(bundle, features)
+        compatibility_score = float(compatibility_scores[0])
+        compatibility_class = compatibility_classes[0]
+        booking_probability = float(booking_probabilities[0])
         
         return jsonify({
             'success': True,
@@ -387,66 +1131,84 @@ def get_recommendation_text(compatibility, booking_prob):
     else:
         return "Consider other options for better match."
 
+def event_label(data, key, default):
+    """String field of a /track payload; numbers are accepted, objects and arrays are not"""
+    value = data.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f'"{key}" must be a string')
+    return str(value)
+
+def track_event(data, now):
+    """Compact stats event for one /track payload
+    
+    "timestamp" (ms since the epoch, as Date.now() gives) is when the client
+    saw the interaction; it is kept within the last TRACK_MAX_EVENT_AGE seconds.
+    Optional "user_id" / "session_id" feed the distinct user and visitor counts.
+    Raises ValueError / TypeError for a payload that could not be applied.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Each event must be a JSON object')
+    
+    timestamp = now
+    if data.get('timestamp') is not None:
+        timestamp = min(max(float(data['timestamp']) / 1000, now - TRACK_MAX_EVENT_AGE), now)
+    
+    return {
+        'k': 'track',
+        't': timestamp,
+        'type': event_label(data, 'type', 'view'),  # view, click, booking, bounce, session
+        'dev': event_label(data, 'device', 'desktop'),  # desktop, mobile, tablet
+        'rev': float(data.get('revenue') or 0),
+        'room': event_label(data, 'room_type', 'Unknown'),
+        'dur': float(data.get('duration') or 0),
+        **audience_hashes(data.get('user_id'), data.get('session_id'))
+    }
+
 @app.route('/track', methods=['POST'])
 def track_interaction():
-    """Track user interactions for analytics"""
+    """Track user interactions for analytics
+    
+    Body: one event, a JSON array of events, or {"events": [...]} (up to
+    TRACK_MAX_BATCH). Events are queued and applied to the stats by a
+    background flusher, so the response is 202 Accepted; 503 means the queue
+    is full and the batch should be retried later. An event with an
+    "event_id" seen within TRACK_DEDUP_WINDOW is acknowledged but not counted
+    again, so retrying a batch is safe. Ids are remembered per worker process:
+    with several workers a retry that reaches another worker is counted twice.
+    """
     try:
-        data = request.json
-        interaction_type = data.get('type', 'view')  # view, click, booking, session
-        device = data.get('device', 'desktop')  # desktop, mobile, tablet
-        
-        current_hour = datetime.now().hour
-        
-        if interaction_type == 'view':
-            stats["views"] += 1
-            stats["total_sessions"] += 1
-            
-        elif interaction_type == 'click':
-            stats["clicks"] += 1
-            
-        elif interaction_type == 'booking':
-            stats["bookings"] += 1
-            
-            # Track revenue
-            revenue = data.get('revenue', 0)
-            room_type = data.get('room_type', 'Unknown')
-            
-            stats["total_revenue"] += revenue
-            stats["ai_driven_revenue"] += revenue  # Assume all bookings are AI-driven
-            stats["booking_revenues"].append(revenue)
-            
-            # Track bookings by room type
-            stats["room_bookings"][room_type] = stats["room_bookings"].get(room_type, 0) + 1
-            
-            # Keep only last 1000 revenues
-            if len(stats["booking_revenues"]) > 1000:
-                stats["booking_revenues"] = stats["booking_revenues"][-1000:]
-            
-        elif interaction_type == 'bounce':
-            stats["bounce_count"] += 1
-            
-        elif interaction_type == 'session':
-            session_time = data.get('duration', 0)
-            stats["session_times"].append(session_time)
-            # Keep only last 1000 session times
-            if len(stats["session_times"]) > 1000:
-                stats["session_times"] = stats["session_times"][-1000:]
-        
-        # Track device
-        if device in stats["device_breakdown"]:
-            stats["device_breakdown"][device] += 1
+        # force: navigator.sendBeacon posts the batch as text/plain
+        data = request.get_json(force=True, silent=True)
+        if isinstance(data, dict) and isinstance(data.get('events'), list):
+            data = data['events']
+        if data is None:
+            return jsonify({'error': 'Expected a JSON event or array of events'}), 400
+        payloads = data if isinstance(data, list) else [data]
+        if len(payloads) > TRACK_MAX_BATCH:
+            return jsonify({'error': f'At most {TRACK_MAX_BATCH} events per request'}), 413
         
-        # Track time of day
-        stats["time_of_day"][current_hour] = stats["time_of_day"].get(current_hour, 0) + 1
+        now = time.time()
+        try:
+            events = [track_event(payload, now) for payload in payloads]
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid event: {e}'}), 400
         
-        # Save stats to file
-        save_stats()
+        # Ids are only marked as seen once their events are queued, so a rejected batch can be resent as is
+        event_ids = [str(payload['event_id']) if payload.get('event_id') else None for payload in payloads]
+        queued, unique = track_dedup.store_new(
+            event_ids, lambda indexes: event_buffer.add([events[i] for i in indexes]), now)
+        if not queued:
+            return jsonify({'error': 'Tracking queue is full, retry later'}), 503
         
         return jsonify({
             'success': True,
-            'message': 'Interaction tracked',
+            'message': 'Interactions queued',
+            'accepted': len(unique),
+            'duplicates': len(events) - len(unique),
             'timestamp': datetime.now().isoformat()
-        })
+        }), 202
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -458,11 +1220,23 @@ if __name__ == '__main__':
     
     # Load models
     if load_models():
+        load_room_catalog()
+        model_registry.start_watching()
+        if shadow is not None:
+            shadow.registry.start_watching()
+        
         print("\n🚀 Starting API server...")
         print("📡 Endpoints:")
         print("   - POST /recommend - Get room recommendations")
+        print("   - POST /recommend/batch - Batch recommendations (NDJSON stream)")
+        print("   - POST /recommend/rooms - Rank real rooms from the catalog")
+        print("   - POST /catalog/refresh - Reload the room catalog")
+        print("   - POST /models/reload - Hot-reload retrained models")
         print("   - POST /predict-single - Predict for single room")
+        print("   - POST /track - Queue analytics events (one or a batch)")
         print("   - GET /stats - Get model statistics")
+        print("   - GET /stats/stream - Live statistics (Server-Sent Events)")
+        print("   - GET /metrics - Prometheus latency histograms")
         print("   - GET /health - Health check")
         print("\n🌐 Server running on http://localhost:5002")
         print("="*70)
@@ -0,0 +1,92 @@
+"""
+In-memory room catalog for ranking real rooms
+Columnar numpy table built from a JSON or CSV export of the Prisma Room table,
+with rows pre-sorted by price overall and per city for fast range filters
+"""
+
+import csv
+import json
+import numpy as np
+
+def city_of(location):
+    """City key of a Room.location such as "Okara, Punjab" -> "okara" """
+    return str(location or '').split(',')[0].strip().lower()
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes')
+    return bool(value)
+
+class RoomCatalog:
+    """Immutable columnar room table; build a new one to refresh"""
+
+    def __init__(self, rooms):
+        rooms = [r for r in rooms if r.get('type') and r.get('pricePerNight') not in (None, '')]
+
+        self.room_types = sorted({r['type'] for r in rooms})
+        type_codes = {t: i for i, t in enumerate(self.room_types)}
+
+        self.ids = np.array([int(r['id']) for r in rooms], dtype=np.int64)
+        self.type_codes = np.array([type_codes[r['type']] for r in rooms], dtype=np.int32)
+        self.prices = np.array([float(r['pricePerNight']) for r in rooms], dtype=np.float64)
+        self.available = np.array([_as_bool(r.get('isAvailable', True)) for r in rooms], dtype=bool)
+        self.cities = [city_of(r.get('location')) for r in rooms]
+        self.details = [{
+            'id': int(r['id']),
+            'roomNumber': r.get('roomNumber'),
+            'type': r['type'],
+            'title': r.get('title'),
+            'location': r.get('location'),
+            'capacity': int(r['capacity']) if r.get('capacity') not in (None, '') else None,
+            'pricePerNight': float(r['pricePerNight'])
+        } for r in rooms]
+
+        # Row indices sorted by price, overall and per city
+        self.price_order = np.argsort(self.prices, kind='stable')
+        self.sorted_prices = self.prices[self.price_order]
+
+        self.city_rows = {}
+        self.city_prices = {}
+        for city in sorted(set(self.cities)):
+            rows = self.price_order[[self.cities[i] == city for i in self.price_order]]
+            self.city_rows[city] = rows
+            self.city_prices[city] = self.prices[rows]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, path):
+        """Load a JSON array (e.g. prisma.room.findMany() output) or a CSV with the same columns"""
+        if path.lower().endswith('.csv'):
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                return cls(list(csv.DictReader(f)))
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def candidates(self, city=None, min_price=None, max_price=None, available_only=True):
+        """Row indices passing the filters, cheapest first"""
+        if city:
+            city = city_of(city)
+            rows = self.city_rows.get(city)
+            if rows is None:
+                return np.empty(0, dtype=np.int64)
+            prices = self.city_prices[city]
+        else:
+            rows, prices = self.price_order, self.sorted_prices
+
+        lo = np.searchsorted(prices, min_price, side='left') if min_price is not None else 0
+        hi = np.searchsorted(prices, max_price, side='right') if max_price is not None else len(prices)
+        rows = rows[lo:hi]
+
+        if available_only:
+            rows = rows[self.available[rows]]
+        return rows
+
+    def summary(self):
+        """Size of the catalog per city for /health and /stats"""
+        return {
+            'rooms': len(self),
+            'room_types': len(self.room_types),
+            'cities': {city: len(rows) for city, rows in self.city_rows.items()}
+        }
@@ -0,0 +1,237 @@
+"""
+Precomputed score lattice for the recommendation API
+Scores every user type x room type x season x day type combination over binned
+numeric axes offline, then answers lookups by multilinear interpolation.
+Inputs outside the grid return None so the caller falls back to the live model.
+
+Usage: python ai-model/score_lattice.py [model_dir] [--samples 2000]
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from feature_tables import NUMERIC_COLUMNS, N_FEATURES
+
+# Knots per numeric input; single-knot axes only match that exact value.
+# view_time and previous_bookings are constants in the client (120 s, 0).
+DEFAULT_KNOTS = {
+    'booking_advance': [1, 3, 7, 14, 30, 60],
+    'stay_duration': [1, 2, 3, 5, 7, 14],
+    'group_size': [1, 2, 3, 4, 6, 8],
+    'view_time': [120],
+    'previous_bookings': [0],
+    'budget': [2000, 5000, 8000, 10000, 15000, 20000, 30000, 50000, 100000]
+}
+
+LATTICE_NAME = 'score_lattice'
+
+class ScoreLattice:
+    """Dense (user, room, season, day, *numeric, 2) array of compatibility and booking scores"""
+
+    def __init__(self, values, metadata):
+        self.values = values
+        self._values = np.asarray(values)  # plain view of the mapped array, no memmap per-op overhead
+        self.metadata = metadata
+        self.version = metadata['version']
+        self.classes = np.asarray(metadata['classes'])
+        self.knots = {c: [float(k) for k in metadata['knots'][c]] for c in NUMERIC_COLUMNS}
+        self.index = {
+            column: {label: i for i, label in enumerate(metadata['labels'][column])}
+            for column in ('user_type', 'room_type', 'season', 'day_type')
+        }
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, model_dir):
+        """Lattice saved next to the models, memory-mapped; None if there is none"""
+        metadata_path = os.path.join(model_dir, f'{LATTICE_NAME}.json')
+        values_path = os.path.join(model_dir, f'{LATTICE_NAME}.npy')
+        if not (os.path.exists(metadata_path) and os.path.exists(values_path)):
+            return None
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        return cls(np.load(values_path, mmap_mode='r'), metadata)
+
+    def save(self, model_dir):
+        """Write values then metadata, each atomically"""
+        values_path = os.path.join(model_dir, f'{LATTICE_NAME}.npy')
+        with open(values_path + '.tmp', 'wb') as f:
+            np.save(f, np.asarray(self.values))
+        os.replace(values_path + '.tmp', values_path)
+
+        metadata_path = os.path.join(model_dir, f'{LATTICE_NAME}.json')
+        with open(metadata_path + '.tmp', 'w') as f:
+            json.dump(self.metadata, f, indent=2)
+        os.replace(metadata_path + '.tmp', metadata_path)
+
+    def lookup(self, user_data, room_types):
+        """(compatibility_scores, compatibility_classes, booking_probabilities) or None if off-grid"""
+        u = self.index['user_type'].get(user_data['user_type'])
+        s = self.index['season'].get(user_data['season'])
+        d = self.index['day_type'].get(user_data['day_type'])
+        rooms = [self.index['room_type'].get(r) for r in room_types]
+        if u is None or s is None or d is None or None in rooms:
+            self.misses += 1
+            return None
+
+        selectors, weights = [], []
+        for column in NUMERIC_COLUMNS:
+            knots = self.knots[column]
+            value = float(user_data[column])
+            if len(knots) == 1:
+                if value != knots[0]:
+                    self.misses += 1
+                    return None
+                selectors.append(0)
+                continue
+            if value < knots[0] or value > knots[-1]:
+                self.misses += 1
+                return None
+            i = min(bisect.bisect_right(knots, value) - 1, len(knots) - 2)
+            selectors.append(slice(i, i + 2))
+            weights.append((value - knots[i]) / (knots[i + 1] - knots[i]))
+
+        # (rooms, 2, ..., 2, scores): the 2^k cell corners around the point
+        cell = self._values[u][(rooms, s, d) + tuple(selectors)]
+        for t in weights:
+            cell = cell[:, 0] * (1.0 - t) + cell[:, 1] * t
+
+        self.hits += 1
+        compatibility_scores = cell[:, 0]
+        compatibility_classes = self.classes[(compatibility_scores > 0.5).astype(np.intp)]
+        return compatibility_scores, compatibility_classes, cell[:, 1]
+
+    def info(self):
+        """Shape, build report and hit rate for /stats"""
+        total = self.hits + self.misses
+        return {
+            'version': self.version,
+            'cells': int(np.prod(self.values.shape[:-1])),
+            'built_at': self.metadata.get('built_at'),
+            'error_report': self.metadata.get('error_report'),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+def score_rows(bundle, features):
+    """Compatibility and booking scores from the live models (as score_features in the API)"""
+    compatibility_scores = bundle.compatibility_model.predict_proba(features)[:, 1]
+    booking_probabilities = np.clip(bundle.booking_model.predict(features), 0, 1)
+    return compatibility_scores, booking_probabilities
+
+def build_lattice(bundle, knots=None):
+    """Score the full grid with the bundle's models"""
+    knots = knots or DEFAULT_KNOTS
+    classes = [c.item() if hasattr(c, 'item') else c for c in bundle.compatibility_model.classes_]
+    if len(classes) != 2:
+        raise ValueError('The score lattice needs a binary compatibility model')
+
+    tables = bundle.feature_tables
+    labels = {column: list(tables.codes[column]) for column in ('user_type', 'room_type', 'season', 'day_type')}
+
+    # Numeric grid rows, scaled with the same arithmetic as FeatureTables
+    numeric_shape = tuple(len(knots[c]) for c in NUMERIC_COLUMNS)
+    grid = np.stack(np.meshgrid(*[np.asarray(knots[c], dtype=np.float64) for c in NUMERIC_COLUMNS],
+                                indexing='ij'), axis=-1).reshape(-1, len(NUMERIC_COLUMNS))
+    scaled_grid = (grid - tables.mean[4:]) / tables.scale[4:]
+
+    n_rooms = len(labels['room_type'])
+    room_column = np.array([tables.scaled['room_type'][r] for r in labels['room_type']])
+    values = np.empty((len(labels['user_type']), n_rooms, len(labels['season']), len(labels['day_type']))
+                      + numeric_shape + (2,), dtype=np.float64)
+
+    features = np.empty((n_rooms, len(grid), N_FEATURES), dtype=np.float64)
+    features[:, :, 1] = room_column[:, None]
+    features[:, :, 4:] = scaled_grid[None, :, :]
+    for (u, user_type), (s, season), (d, day_type) in itertools.product(
+            enumerate(labels['user_type']), enumerate(labels['season']), enumerate(labels['day_type'])):
+        features[:, :, 0] = tables.scaled['user_type'][user_type]
+        features[:, :, 2] = tables.scaled['season'][season]
+        features[:, :, 3] = tables.scaled['day_type'][day_type]
+        compatibility, booking = score_rows(bundle, features.reshape(-1, N_FEATURES))
+        values[u, :, s, d, ..., 0] = compatibility.reshape((n_rooms,) + numeric_shape)
+        values[u, :, s, d, ..., 1] = booking.reshape((n_rooms,) + numeric_shape)
+
+    metadata = {
+        'version': bundle.version,
+        'classes': classes,
+        'labels': labels,
+        'knots': {c: list(knots[c]) for c in NUMERIC_COLUMNS},
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    return ScoreLattice(values, metadata)
+
+def error_report(lattice, bundle, samples=2000, seed=0):
+    """Interpolation error against the live models on random in-grid profiles"""
+    rng = np.random.default_rng(seed)
+    room_types = list(lattice.index['room_type'])
+    errors = {'compatibility': [], 'booking': [], 'overall': []}
+    top_matches = 0
+
+    for _ in range(samples):
+        user_data = {column: rng.choice(list(lattice.index[column])).item()
+                     for column in ('user_type', 'season', 'day_type')}
+        for column in NUMERIC_COLUMNS:
+            knots = lattice.knots[column]
+            value = rng.uniform(knots[0], knots[-1])
+            user_data[column] = float(round(value / 500) * 500) if column == 'budget' else int(round(value))
+        user_data['budget'] = min(max(user_data['budget'], lattice.knots['budget'][0]), lattice.knots['budget'][-1])
+
+        approx_compatibility, _, approx_booking = lattice.lookup(user_data, room_types)
+        compatibility, booking = score_rows(bundle, bundle.feature_tables.room_features(user_data, room_types))
+        overall = compatibility * 0.6 + booking * 0.4
+        approx_overall = approx_compatibility * 0.6 + approx_booking * 0.4
+
+        errors['compatibility'].append(np.abs(approx_compatibility - compatibility))
+        errors['booking'].append(np.abs(approx_booking - booking))
+        errors['overall'].append(np.abs(approx_overall - overall))
+        top_matches += int(np.argmax(approx_overall) == np.argmax(overall))
+
+    report = {'samples': samples, 'top_room_agreement': round(top_matches / samples, 4)}
+    for name, values in errors.items():
+        values = np.concatenate(values)
+        report[name] = {
+            'max_abs_error': round(float(values.max()), 6),
+            'mean_abs_error': round(float(values.mean()), 6),
+            'p99_abs_error': round(float(np.quantile(values, 0.99)), 6)
+        }
+    lattice.hits = lattice.misses = 0
+    return report
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model_dir', nargs='?', default=os.environ.get('MODEL_DIR', os.path.join(script_dir, 'models')))
+    parser.add_argument('--samples', type=int, default=2000, help='random profiles for the error report')
+    args = parser.parse_args()
+
+    from model_registry import ModelRegistry
+
+    # Same model source and engine as the API so the lattice version matches what it serves
+    use_artifacts = os.environ.get('MODEL_USE_ARTIFACTS', 'true').lower() != 'false'
+    engine = os.environ.get('RECOMMENDER_ENGINE', 'compiled').lower()
+    registry = ModelRegistry(args.model_dir, use_artifacts=use_artifacts, engine=engine)
+    ok, bundle = registry.reload()
+    if not ok:
+        sys.exit(f"❌ Could not load models from {args.model_dir}: {bundle}")
+
+    print(f"🧮 Building score lattice for model version {bundle.version}...")
+    start = time.perf_counter()
+    lattice = build_lattice(bundle)
+    print(f"✅ {lattice.info()['cells']:,} cells scored in {time.perf_counter() - start:.1f}s")
+
+    print(f"📏 Measuring interpolation error on {args.samples} random profiles...")
+    lattice.metadata['error_report'] = error_report(lattice, bundle, samples=args.samples)
+    print(json.dumps(lattice.metadata['error_report'], indent=2))
+
+    lattice.save(args.model_dir)
+    print(f"💾 Saved {LATTICE_NAME}.npy / {LATTICE_NAME}.json to {args.model_dir}")
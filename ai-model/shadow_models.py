@@ -0,0 +1,167 @@
+"""
+Shadow evaluation of a candidate model bundle against live /recommend traffic
+A sample of live profiles is re-scored with the candidate models on a small
+thread pool once the live response has been computed. The live models score
+the profile again there too, so an approximate serving path (the score
+lattice, the result cache) does not count as model drift. Score deltas, rank
+agreement (Kendall tau of the room ordering, top-1 match) and shadow latency
+are kept in a bounded summary for /stats; the live request never waits for
+the shadow models, and profiles are dropped when the pool falls behind.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sketches import RunningStats, StreamingSummary
+
+def kendall_tau(live_order, shadow_order):
+    """Kendall tau between two orderings of the same items (1 identical, -1 reversed)"""
+    position = {item: i for i, item in enumerate(shadow_order)}
+    ranks = [position[item] for item in live_order if item in position]
+    n = len(ranks)
+    if n < 2:
+        return 1.0
+    concordant = discordant = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            if ranks[i] < ranks[j]:
+                concordant += 1
+            else:
+                discordant += 1
+    return (concordant - discordant) / (n * (n - 1) / 2)
+
+class ShadowEvaluator:
+    """Compares a candidate ModelRegistry's rankings with the live ones
+
+    `score(bundle, user_data)` returns the ranked recommendation dicts for a
+    bundle from its models, as /recommend builds them; both the live and the
+    candidate bundle are scored with it. `submit` only enqueues work; at most
+    `max_pending` profiles wait for the pool and the rest are counted as dropped.
+    """
+
+    def __init__(self, registry, score, workers=1, sample_rate=1.0, max_pending=64, recent_size=20):
+        self.registry = registry
+        self.score = score
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.recent_size = recent_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shadow')
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.reset()
+
+    def reset(self):
+        """Start a new comparison (also done when either model version changes)"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.started_at = datetime.now().isoformat()
+        self.compared = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.top1_matches = 0
+        self.score_delta = StreamingSummary()         # |shadow - live| overall score per room, points
+        self.score_bias = RunningStats()              # shadow - live overall score per room, points
+        self.compatibility_delta = StreamingSummary()
+        self.booking_delta = StreamingSummary()
+        self.kendall_tau = RunningStats()
+        self.latency_ms = StreamingSummary()
+        self.recent = deque(maxlen=self.recent_size)
+        self.versions = None
+
+    def submit(self, live_bundle, user_data):
+        """Queue one served profile for shadow scoring; False if it was skipped"""
+        candidate = self.registry.active
+        if candidate is None or random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending += 1
+        self.executor.submit(self._compare, candidate, live_bundle, dict(user_data))
+        return True
+
+    def _compare(self, candidate, live_bundle, user_data):
+        try:
+            live = self.score(live_bundle, user_data)
+            start = time.perf_counter()
+            shadow = self.score(candidate, user_data)
+        except Exception as e:
+            with self._lock:
+                self._pending -= 1
+                self.errors += 1
+                self.last_error = str(e)
+            return
+        latency = (time.perf_counter() - start) * 1000
+
+        shadow_by_room = {rec['roomType']: rec for rec in shadow}
+        tau = kendall_tau([rec['roomType'] for rec in live], [rec['roomType'] for rec in shadow])
+        with self._lock:
+            self._pending -= 1
+            versions = (live_bundle.version, candidate.version)
+            if self.versions != versions:
+                # Deltas between different model pairs are not comparable
+                if self.versions is not None:
+                    self._reset()
+                self.versions = versions
+
+            self.compared += 1
+            self.latency_ms.add(latency)
+            self.kendall_tau.add(tau)
+            if shadow and live and shadow[0]['roomType'] == live[0]['roomType']:
+                self.top1_matches += 1
+            for rec in live:
+                other = shadow_by_room.get(rec['roomType'])
+                if other is None:
+                    continue
+                self.score_delta.add(abs(other['overallScore'] - rec['overallScore']))
+                self.score_bias.add(other['overallScore'] - rec['overallScore'])
+                self.compatibility_delta.add(abs(other['compatibilityScore'] - rec['compatibilityScore']))
+                self.booking_delta.add(abs(other['bookingLikelihood'] - rec['bookingLikelihood']))
+            self.recent.append({
+                'at': datetime.now().isoformat(),
+                'user_type': user_data.get('user_type'),
+                'kendall_tau': round(tau, 3),
+                'live_top': live[0]['roomType'] if live else None,
+                'shadow_top': shadow[0]['roomType'] if shadow else None,
+                'latency_ms': round(latency, 2)
+            })
+
+    def summary(self):
+        """Comparison totals for /stats"""
+        with self._lock:
+            compared = self.compared
+            live_version, shadow_version = self.versions or (None, None)
+            return {
+                'live_version': live_version,
+                'shadow_version': shadow_version or (self.registry.active.version if self.registry.active else None),
+                'since': self.started_at,
+                'sample_rate': self.sample_rate,
+                'compared': compared,
+                'pending': self._pending,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'last_error': self.last_error,
+                'top1_agreement': round(self.top1_matches / compared, 4) if compared else None,
+                'kendall_tau': {
+                    'mean': round(self.kendall_tau.mean, 4),
+                    'min': round(self.kendall_tau.min, 4) if self.kendall_tau.min is not None else None
+                },
+                'score_delta': {**self.score_delta.summary(), 'mean_signed': round(self.score_bias.mean, 2)},
+                'compatibility_delta': self.compatibility_delta.summary(),
+                'booking_delta': self.booking_delta.summary(),
+                'latency_ms': self.latency_ms.summary(),
+                'recent': list(self.recent)
+            }
+
+    def stop(self):
+        self.registry.stop()
+        self.executor.shutdown(wait=False)
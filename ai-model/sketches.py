@@ -0,0 +1,469 @@
+"""
+Constant-memory streaming aggregates for the recommendation analytics
+RunningStats keeps count/mean/variance (Welford), DDSketch keeps mergeable
+relative-error quantiles, SpaceSaving keeps the top labels of a counter
+in a fixed number of slots, HyperLogLog estimates distinct counts and
+SlidingHyperLogLog estimates them since any point in time. All serialize
+to small JSON dicts.
+"""
+
+import base64
+import hashlib
+import math
+import zlib
+
+import numpy as np
+
+class RunningStats:
+    """Count, mean, variance, min and max of a stream in O(1) memory"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Combine with another RunningStats (Chan et al. parallel update)"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {'n': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data.get('n', 0)
+        stats.mean = data.get('mean', 0.0)
+        stats.m2 = data.get('m2', 0.0)
+        stats.min = data.get('min')
+        stats.max = data.get('max')
+        return stats
+
+class DDSketch:
+    """Quantile sketch with relative accuracy `alpha` for non-negative values
+
+    Values fall into logarithmic buckets; a quantile estimate is within
+    alpha * value of the true quantile. Sketches with the same alpha merge by
+    adding bucket counts. When more than `max_buckets` are in use the lowest
+    buckets are collapsed, which only affects the accuracy of the smallest values.
+    """
+
+    MIN_VALUE = 1e-9
+
+    def __init__(self, alpha=0.01, max_buckets=1024):
+        self.alpha = alpha
+        self.max_buckets = max_buckets
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _index(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def _value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        self.count += count
+        if value <= self.MIN_VALUE:
+            self.zero_count += count
+            return
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the lowest buckets into the lowest one that is kept"""
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        for key in keys[:excess]:
+            self.buckets[target] += self.buckets.pop(key)
+
+    def merge(self, other):
+        """Add another sketch's counts (alphas must match)"""
+        if other.alpha != self.alpha:
+            raise ValueError('Cannot merge DDSketches with different alpha')
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q):
+        """Estimated q-quantile (0 <= q <= 1), or 0 when empty"""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.buckets))
+
+    def to_dict(self):
+        """Contiguous bucket counts starting at index `o`"""
+        if self.buckets:
+            offset = min(self.buckets)
+            counts = [0] * (max(self.buckets) - offset + 1)
+            for index, count in self.buckets.items():
+                counts[index - offset] = count
+        else:
+            offset, counts = 0, []
+        return {'a': self.alpha, 'z': self.zero_count, 'o': offset, 'c': counts}
+
+    @classmethod
+    def from_dict(cls, data, max_buckets=1024):
+        sketch = cls(alpha=data.get('a', 0.01), max_buckets=max_buckets)
+        sketch.zero_count = data.get('z', 0)
+        offset = data.get('o', 0)
+        sketch.buckets = {offset + i: c for i, c in enumerate(data.get('c', [])) if c}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+class StreamingSummary:
+    """RunningStats plus a DDSketch for one metric"""
+
+    def __init__(self, alpha=0.01):
+        self.stats = RunningStats()
+        self.sketch = DDSketch(alpha)
+
+    def add(self, value):
+        self.stats.add(value)
+        self.sketch.add(value)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    @property
+    def mean(self):
+        return self.stats.mean
+
+    def summary(self, digits=2):
+        """Mean, spread and p50/p90/p99 for the /stats payload"""
+        return {
+            'count': self.stats.count,
+            'mean': round(self.stats.mean, digits),
+            'std': round(math.sqrt(self.stats.variance), digits),
+            'min': round(self.stats.min, digits) if self.stats.min is not None else 0,
+            'max': round(self.stats.max, digits) if self.stats.max is not None else 0,
+            'p50': round(self.sketch.quantile(0.50), digits),
+            'p90': round(self.sketch.quantile(0.90), digits),
+            'p99': round(self.sketch.quantile(0.99), digits)
+        }
+
+    def to_dict(self):
+        return {'stats': self.stats.to_dict(), 'sketch': self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        summary.stats = RunningStats.from_dict(data.get('stats', {}))
+        summary.sketch = DDSketch.from_dict(data.get('sketch', {}))
+        return summary
+
+    @classmethod
+    def from_values(cls, values):
+        """Build from a legacy list of raw values"""
+        summary = cls()
+        for value in values:
+            summary.add(value)
+        return summary
+
+class SpaceSaving:
+    """Counts of the most frequent labels in `capacity` slots (Space-Saving)
+
+    A new label arriving when every slot is taken replaces the label with the
+    smallest count and starts from that count, which is recorded as its
+    error. Each reported count is therefore at most `error` above the true
+    one, and every label whose true count exceeds total / capacity is kept.
+    """
+
+    MAX_LABEL_LENGTH = 64
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+
+    def add(self, label, amount=1):
+        label = str(label)[:self.MAX_LABEL_LENGTH]
+        self.total += amount
+        if label in self.counts:
+            self.counts[label] += amount
+        elif len(self.counts) < self.capacity:
+            self.counts[label] = amount
+            self.errors[label] = 0
+        else:
+            smallest = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(smallest)
+            del self.errors[smallest]
+            self.counts[label] = floor + amount
+            self.errors[label] = floor
+
+    def _floor(self):
+        """Upper bound on the count of any label that is not tracked"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other):
+        """Combine with another sketch; untracked labels count as the other side's floor"""
+        mine, theirs = self._floor(), other._floor()
+        labels = set(self.counts) | set(other.counts)
+        counts = {label: self.counts.get(label, mine) + other.counts.get(label, theirs) for label in labels}
+        errors = {label: self.errors.get(label, mine) + other.errors.get(label, theirs) for label in labels}
+        kept = sorted(labels, key=lambda label: (-counts[label], label))[:self.capacity]
+        self.counts = {label: counts[label] for label in kept}
+        self.errors = {label: errors[label] for label in kept}
+        self.total += other.total
+
+    def top(self, n=None):
+        """{label: count} for the tracked labels, most frequent first"""
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return dict(ranked[:n] if n else ranked)
+
+    def summary(self):
+        """Tracked labels with their error bounds for the /stats payload"""
+        return {
+            'total': self.total,
+            'slots': self.capacity,
+            'tracked': len(self.counts),
+            'max_error': max(self.errors.values(), default=0),
+            'top': [
+                {'label': label, 'count': count, 'error': self.errors[label]}
+                for label, count in self.top().items()
+            ]
+        }
+
+    def to_dict(self):
+        return {'k': self.capacity, 'n': self.total,
+                'c': {label: [count, self.errors[label]] for label, count in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, data, capacity=64):
+        """Load a saved sketch, or a plain {label: count} dict from older snapshots"""
+        sketch = cls(capacity)
+        if 'c' in data and 'n' in data:
+            entries = {label: (count, error) for label, (count, error) in data['c'].items()}
+            sketch.total = data['n']
+        else:
+            entries = {label: (count, 0) for label, count in data.items()}
+            sketch.total = sum(count for count, _ in entries.values())
+        ranked = sorted(entries.items(), key=lambda item: (-item[1][0], item[0]))
+        for label, (count, error) in ranked[:capacity]:
+            label = str(label)[:cls.MAX_LABEL_LENGTH]
+            sketch.counts[label] = count
+            sketch.errors[label] = error
+        return sketch
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**p one-byte registers
+
+    With the default p=13 (8 KB) the standard error is 1.04 / sqrt(2**p),
+    about 1.15%. Items are added as 64-bit hashes (`hash_value`), so callers
+    can store the hash instead of the raw id. Sketches with the same p merge
+    by taking the register-wise maximum.
+    """
+
+    def __init__(self, p=13):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    @staticmethod
+    def hash_value(value):
+        """64-bit hash of an id, as a hex string (stable across processes)"""
+        return hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).hexdigest()
+
+    @staticmethod
+    def position(hashed, p):
+        """(register, rank) of a hash from hash_value (hex string or int)"""
+        h = int(hashed, 16) if isinstance(hashed, str) else hashed
+        return h >> (64 - p), (64 - p) - (h & ((1 << (64 - p)) - 1)).bit_length() + 1
+
+    def add_hash(self, hashed):
+        """Add a hash from hash_value (hex string or int)"""
+        index, rank = self.position(hashed, self.p)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, value):
+        self.add_hash(self.hash_value(value))
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError('Cannot merge HyperLogLogs with different p')
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def copy(self):
+        sketch = HyperLogLog(self.p)
+        sketch.registers[:] = self.registers
+        return sketch
+
+    def count(self):
+        """Estimated number of distinct items (linear counting while mostly empty)"""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def to_dict(self):
+        """Registers as zlib-compressed base64 (a few bytes while sparse)"""
+        return {'p': self.p, 'r': base64.b64encode(zlib.compress(self.registers.tobytes())).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get('p', 13))
+        if data.get('r'):
+            sketch.registers[:] = np.frombuffer(zlib.decompress(base64.b64decode(data['r'])), dtype=np.uint8)
+        return sketch
+
+def _pack(array):
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(array).tobytes())).decode('ascii')
+
+def _unpack(data, dtype):
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=dtype).copy()
+
+class SlidingHyperLogLog:
+    """HyperLogLog that counts the distinct items added since any given time
+
+    Each register keeps (time, rank) entries instead of one rank; an entry is
+    dropped once a newer one in the same register has at least its rank, so a
+    register holds a few entries (logarithmic in the items it saw) and the
+    count since `start` uses, per register, the largest rank at or after it.
+    Times are integers (e.g. minutes). `coarsen(times, latest)`, if given,
+    may round old times down or return -1 to expire them; it runs whenever
+    the added entries are compacted. Same error as a HyperLogLog with this p.
+    """
+
+    COMPACT_EVERY = 2048
+
+    def __init__(self, p=13, coarsen=None):
+        self.p = p
+        self.coarsen = coarsen
+        self.index = np.zeros(0, dtype=np.uint16)
+        self.times = np.zeros(0, dtype=np.int32)
+        self.ranks = np.zeros(0, dtype=np.uint8)
+        self.latest = None
+        self._pending = []
+
+    def add_hash(self, time, hashed):
+        index, rank = HyperLogLog.position(hashed, self.p)
+        self._pending.append((index, time, rank))
+        if self.latest is None or time > self.latest:
+            self.latest = time
+        if len(self._pending) >= self.COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        """Fold added entries in and drop the ones a newer entry outranks"""
+        if not self._pending:
+            return
+        pending = np.array(self._pending, dtype=np.int64)
+        self._pending = []
+        self.index = np.concatenate([self.index, pending[:, 0].astype(np.uint16)])
+        self.times = np.concatenate([self.times, pending[:, 1].astype(np.int32)])
+        self.ranks = np.concatenate([self.ranks, pending[:, 2].astype(np.uint8)])
+        self._prune()
+
+    def _prune(self):
+        index, times, ranks = self.index, self.times, self.ranks
+        if self.coarsen is not None and self.latest is not None:
+            times = self.coarsen(times, self.latest).astype(np.int32)
+            alive = times >= 0
+            index, times, ranks = index[alive], times[alive], ranks[alive]
+
+        # Per register newest first; keep an entry only if it beats every newer one
+        order = np.lexsort((-ranks.astype(np.int64), -times.astype(np.int64), index))
+        index, times, ranks = index[order], times[order], ranks[order]
+        key = index.astype(np.int64) * 64 + ranks
+        best_newer = np.concatenate([[-1], np.maximum.accumulate(key)[:-1]])
+        keep = ~((best_newer // 64 == index) & (best_newer % 64 >= ranks))
+        self.index, self.times, self.ranks = index[keep], times[keep], ranks[keep]
+
+    def since(self, start):
+        """HyperLogLog of the items added at or after `start`"""
+        self.compact()
+        sketch = HyperLogLog(self.p)
+        recent = self.times >= start
+        np.maximum.at(sketch.registers, self.index[recent], self.ranks[recent])
+        return sketch
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError('Cannot merge HyperLogLogs with different p')
+        other.compact()
+        if other.latest is not None and (self.latest is None or other.latest > self.latest):
+            self.latest = other.latest
+        if len(self) == 0:
+            # Already compact - copying is enough
+            self.index, self.times, self.ranks = other.index.copy(), other.times.copy(), other.ranks.copy()
+            return
+        self.compact()
+        self.index = np.concatenate([self.index, other.index])
+        self.times = np.concatenate([self.times, other.times])
+        self.ranks = np.concatenate([self.ranks, other.ranks])
+        self._prune()
+
+    def __len__(self):
+        return len(self.index) + len(self._pending)
+
+    def to_dict(self):
+        """Entries as zlib-compressed base64 arrays"""
+        self.compact()
+        return {'p': self.p, 'latest': self.latest, 'i': _pack(self.index),
+                't': _pack(self.times), 'r': _pack(self.ranks)}
+
+    @classmethod
+    def from_dict(cls, data, coarsen=None):
+        sketch = cls(data.get('p', 13), coarsen)
+        sketch.latest = data.get('latest')
+        if data.get('i'):
+            sketch.index = _unpack(data['i'], np.uint16)
+            sketch.times = _unpack(data['t'], np.int32)
+            sketch.ranks = _unpack(data['r'], np.uint8)
+        return sketch
@@ -0,0 +1,390 @@
+"""
+Append-only persistence for the recommendation analytics
+Every mutation is a compact event appended to a write-ahead log; a background
+thread periodically compacts the in-memory state into a snapshot written
+atomically via rename. On startup the snapshot is loaded and the log tail replayed.
+EventBuffer queues high-volume events and records them in bulk from a flusher thread.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class StatsStore:
+    """Event-sourced stats state backed by a snapshot file and an event log
+
+    `default_state()` builds an empty state and `apply_event(state, event)`
+    mutates it for one event. The state dict carries the sequence number of the
+    last applied event under 'event_seq' so replay skips events already in the snapshot.
+    `upgrade_state(state)` turns a loaded snapshot into the live state and
+    `dump_state(state)` turns the live state back into JSON-serializable data.
+    `observe(stage, seconds)`, if given, receives the time spent applying
+    events ('stats_update'), appending them ('persistence') and writing
+    snapshots ('snapshot').
+    """
+
+    def __init__(self, snapshot_path, log_path, default_state, apply_event,
+                 snapshot_interval=30, upgrade_state=None, dump_state=None, observe=None):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.rotated_log_path = log_path + '.old'
+        self.default_state = default_state
+        self.apply_event = apply_event
+        self.upgrade_state = upgrade_state
+        self.dump_state = dump_state
+        self.snapshot_interval = snapshot_interval
+        self.observe = observe
+
+        self.lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self.state = None
+        self.seq = 0
+        self.dirty = False
+        self.failed = 0
+        self.last_error = None
+        self._log = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def load(self, quiet=False):
+        """Load the snapshot and replay any logged events newer than it"""
+        state = None
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r') as f:
+                    state = json.load(f)
+            except Exception as e:
+                if not quiet:
+                    print(f"⚠️ Could not load stats snapshot: {e}")
+
+        if state is None:
+            state = self.default_state()
+        if self.upgrade_state:
+            state = self.upgrade_state(state)
+
+        self.seq = state.get('event_seq', 0)
+
+        replayed = 0
+        for path in (self.rotated_log_path, self.log_path):
+            for event in self._read_log(path):
+                if event.get('seq', 0) <= self.seq:
+                    continue
+                try:
+                    self.apply_event(state, event)
+                except Exception:
+                    self.failed += 1
+                    continue
+                self.seq = event['seq']
+                state['event_seq'] = self.seq
+                replayed += 1
+
+        if replayed and not quiet:
+            print(f"📜 Replayed {replayed} logged stats events")
+            self.dirty = True
+
+        self.state = state
+        return state
+
+    def _read_log(self, path):
+        """Yield events from a log file, skipping a torn or corrupt line"""
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def record(self, event):
+        """Apply an event to the in-memory state and append it to the log"""
+        self.record_many([event])
+
+    def record_many(self, events):
+        """Apply events in order and append them with one log write
+
+        An event that `apply_event` rejects is skipped (and counted in
+        `failed`) without affecting the others; only applied events get a
+        sequence number and are logged. Returns the number applied.
+        """
+        if not events:
+            return 0
+        with self.lock:
+            start = time.perf_counter()
+            applied_events = []
+            for event in events:
+                event['seq'] = self.seq + 1
+                try:
+                    self.apply_event(self.state, event)
+                except Exception as e:
+                    self.failed += 1
+                    self.last_error = f'{type(e).__name__}: {e}'
+                    continue
+                self.seq += 1
+                applied_events.append(event)
+            if not applied_events:
+                return 0
+            self.state['event_seq'] = self.seq
+            self.dirty = True
+            applied = time.perf_counter()
+
+            try:
+                if self._log is None:
+                    self._log = open(self.log_path, 'a')
+                self._log.write(''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in applied_events))
+                self._log.flush()
+            except Exception as e:
+                print(f"⚠️ Could not append stats events: {e}")
+
+        if self.observe:
+            self.observe('stats_update', applied - start)
+            self.observe('persistence', time.perf_counter() - applied)
+        return len(applied_events)
+
+    def compact(self):
+        """Write a snapshot of the current state and truncate the event log"""
+        with self._compact_lock:
+            return self._compact()
+
+    def _compact(self):
+        start = time.perf_counter()
+        with self.lock:
+            if not self.dirty:
+                return False
+            state = self.dump_state(self.state) if self.dump_state else self.state
+            data = json.dumps(state, separators=(',', ':'))
+            self.dirty = False
+
+            # Rotate the log so events after this point go to a fresh file
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if os.path.exists(self.log_path):
+                if os.path.exists(self.rotated_log_path):
+                    # A previous compaction did not finish - keep both logs
+                    with open(self.log_path, 'r') as src, open(self.rotated_log_path, 'a') as dst:
+                        dst.write(src.read())
+                    os.remove(self.log_path)
+                else:
+                    os.replace(self.log_path, self.rotated_log_path)
+
+        try:
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            if os.path.exists(self.rotated_log_path):
+                os.remove(self.rotated_log_path)
+            if self.observe:
+                self.observe('snapshot', time.perf_counter() - start)
+            return True
+        except Exception as e:
+            print(f"⚠️ Could not write stats snapshot: {e}")
+            with self.lock:
+                self.dirty = True
+            return False
+
+    def start(self):
+        """Start the background compaction thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='stats-compactor', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            self.compact()
+
+    def close(self):
+        """Stop the background thread and write a final snapshot"""
+        self._stop.set()
+        self.compact()
+        with self.lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+class EventBuffer:
+    """In-memory queue of events that a background thread records in bulk
+
+    `add(events)` only appends to the queue; the flusher hands everything
+    queued to `store.record_many` every `flush_interval` seconds, or sooner
+    once `flush_size` events are waiting. At most `capacity` events are
+    queued - `add` refuses a batch that does not fit so the caller can ask
+    the client to retry.
+    """
+
+    def __init__(self, store, flush_interval=1.0, flush_size=500, capacity=50000):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.capacity = capacity
+
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.accepted = 0
+        self.rejected = 0
+        self.flushes = 0
+
+    def add(self, events):
+        """Queue events; False (nothing queued) if they would exceed the capacity"""
+        with self._lock:
+            if len(self._events) + len(events) > self.capacity:
+                self.rejected += len(events)
+                return False
+            self._events.extend(events)
+            self.accepted += len(events)
+            pending = len(self._events)
+        if pending >= self.flush_size:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Record everything queued so far; returns the number of events"""
+        with self._flush_lock:
+            with self._lock:
+                events = list(self._events)
+                self._events.clear()
+            self.store.record_many(events)
+            if events:
+                self.flushes += 1
+            return len(events)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='stats-event-flusher', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Could not flush buffered stats events: {e}")
+
+    def close(self):
+        """Stop the flusher and record whatever is still queued"""
+        self._stop.set()
+        self._wake.set()
+        self.flush()
+
+    def info(self):
+        with self._lock:
+            pending = len(self._events)
+        return {
+            'pending': pending,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'flushes': self.flushes,
+            'failed': self.store.failed,
+            'last_error': self.store.last_error,
+            'flush_interval': self.flush_interval,
+            'flush_size': self.flush_size,
+            'capacity': self.capacity
+        }
+
+def _try_lock(f):
+    """Take a non-blocking exclusive lock on an open file"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+class StatsShards:
+    """Per-process stats shards that are merged on read
+
+    Each worker process claims the first shard whose lock file it can lock and
+    keeps that lock for its lifetime, so its StatsStore is the only writer of
+    that shard's snapshot and log. Shard 0 uses the plain file names, so a
+    single-worker deployment keeps reading and writing stats_data.json. Shards
+    left behind by stopped workers are still read, so no analytics are lost.
+    With claim=False no shard is taken (`shard` is None) and every shard is a peer.
+    """
+
+    def __init__(self, directory, snapshot_name='stats_data', log_name='stats_events', max_shards=64, claim=True):
+        self.directory = directory
+        self.snapshot_name = snapshot_name
+        self.log_name = log_name
+        self.max_shards = max_shards
+        self._lock_file = None
+        self._peer_cache = {}
+        self.shard = self._claim() if claim else None
+
+    def _claim(self):
+        for shard in range(self.max_shards):
+            lock_path = os.path.join(self.directory, f'{self.snapshot_name}.shard{shard}.lock')
+            f = open(lock_path, 'a+')
+            if _try_lock(f):
+                self._lock_file = f
+                return shard
+            f.close()
+        raise RuntimeError(f'All {self.max_shards} stats shards are locked by other workers')
+
+    def paths(self, shard):
+        """(snapshot_path, log_path) of a shard"""
+        suffix = '' if shard == 0 else f'.shard{shard}'
+        return (os.path.join(self.directory, f'{self.snapshot_name}{suffix}.json'),
+                os.path.join(self.directory, f'{self.log_name}{suffix}.log'))
+
+    def peer_shards(self):
+        """Shards other than ours that have data on disk"""
+        peers = []
+        for shard in range(self.max_shards):
+            if shard == self.shard:
+                continue
+            snapshot_path, log_path = self.paths(shard)
+            if any(os.path.exists(p) for p in (snapshot_path, log_path, log_path + '.old')):
+                peers.append(shard)
+        return peers
+
+    def _signature(self, shard):
+        snapshot_path, log_path = self.paths(shard)
+        signature = []
+        for path in (snapshot_path, log_path + '.old', log_path):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def read_peer(self, shard, default_state, apply_event, upgrade_state=None):
+        """Current state of another worker's shard, cached until its files change"""
+        for _ in range(3):
+            signature = self._signature(shard)
+            cached = self._peer_cache.get(shard)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+            snapshot_path, log_path = self.paths(shard)
+            reader = StatsStore(snapshot_path, log_path, default_state, apply_event,
+                                upgrade_state=upgrade_state)
+            state = reader.load(quiet=True)
+
+            # The peer may have compacted while we read - retry on a moved snapshot
+            if self._signature(shard)[0] == signature[0]:
+                self._peer_cache[shard] = (signature, state)
+                return state
+        return state
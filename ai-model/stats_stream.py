@@ -0,0 +1,145 @@
+"""
+Server-sent stats stream for the analytics dashboards
+One broadcaster thread per stream computes the stats payload every
+`interval` seconds and pushes it to every subscriber: a full snapshot when a
+subscriber joins (or falls behind), then only the keys that changed. The
+payload is computed and serialized once per tick however many dashboards
+are open, and nothing is computed while nobody is subscribed.
+"""
+
+import json
+import queue
+import threading
+import time
+
+def diff(old, new):
+    """Keys of `new` that changed since `old`; nested dicts recurse, removed keys map to None"""
+    changes = {}
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = diff(old[key], value)
+            if nested:
+                changes[key] = nested
+        elif value != old[key]:
+            changes[key] = value
+    for key in old:
+        if key not in new:
+            changes[key] = None
+    return changes
+
+def sse_message(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class Subscription:
+    """Queue of messages for one stream; a subscriber that lags gets a fresh snapshot"""
+
+    def __init__(self, backlog=8):
+        self.queue = queue.Queue(maxsize=backlog)
+        self.synced = False
+
+    def offer(self, snapshot, delta):
+        """Called by the broadcaster (never blocks)"""
+        if self.synced and delta is not None:
+            try:
+                self.queue.put_nowait(delta)
+                return
+            except queue.Full:
+                # Too far behind for deltas - drop them and start over from a snapshot
+                self._drain()
+        self._drain()
+        self.queue.put_nowait(snapshot)
+        self.synced = True
+
+    def _drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def get(self, timeout):
+        """Next message, or raise queue.Empty after `timeout` seconds"""
+        return self.queue.get(timeout=timeout)
+
+class StatsBroadcaster:
+    """Computes `compute()` once per tick and fans the result out to subscriptions
+
+    Messages are SSE 'snapshot' events ({"seq", "stats"}) and 'delta' events
+    ({"seq", "changes"}) to be merged into the last state: nested objects
+    merge, null removes a key, anything else replaces.
+    """
+
+    def __init__(self, compute, interval=2.0):
+        self.compute = compute
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._thread = None
+        self._stop = threading.Event()
+        self.previous = None
+        self.snapshot = None
+        self.seq = 0
+        self.ticks = 0
+        self.compute_seconds = 0.0
+
+    def subscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.add(subscription)
+            # Start from the latest tick right away instead of computing again
+            if self.snapshot is not None:
+                subscription.offer(self.snapshot, None)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stats-stream', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                if not self._subscriptions:
+                    # Idle: the next subscriber restarts the thread with a fresh snapshot
+                    self._thread = None
+                    self.previous = self.snapshot = None
+                    return
+
+            start = time.perf_counter()
+            try:
+                payload = self.compute()
+            except Exception as e:
+                print(f"⚠️ Stats stream tick failed: {e}")
+                self._stop.wait(self.interval)
+                continue
+            self.compute_seconds += time.perf_counter() - start
+            self.ticks += 1
+
+            with self._lock:
+                self.seq += 1
+                snapshot = sse_message('snapshot', {'seq': self.seq, 'stats': payload})
+                delta = None
+                if self.previous is not None:
+                    delta = sse_message('delta', {'seq': self.seq, 'changes': diff(self.previous, payload)})
+                self.previous, self.snapshot = payload, snapshot
+                for subscription in self._subscriptions:
+                    subscription.offer(snapshot, delta)
+
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def info(self):
+        with self._lock:
+            subscribers = len(self._subscriptions)
+        return {
+            'subscribers': subscribers,
+            'interval': self.interval,
+            'ticks': self.ticks,
+            'avg_compute_ms': round(self.compute_seconds / self.ticks * 1000, 2) if self.ticks else 0
+        }
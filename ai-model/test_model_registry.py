@@ -0,0 +1,103 @@
+"""
+Which model files the registry serves, and when it notices they changed
+Run with: python -m pytest ai-model
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestClassifier
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from feature_tables import CATEGORICAL_COLUMNS, N_FEATURES
+from model_artifacts import MODEL_FILES, pickle_digest, save_model_artifacts
+from model_registry import ModelRegistry
+
+def train(seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(300, N_FEATURES))
+    y = X[:, 0] + rng.normal(scale=0.1, size=300)
+    encoders = {column: LabelEncoder().fit(['a', 'b', 'c']) for column in CATEGORICAL_COLUMNS}
+    return {
+        'compatibility_model': RandomForestClassifier(n_estimators=5, max_depth=4, random_state=seed).fit(X, y > 0),
+        'booking_model': GradientBoostingRegressor(n_estimators=10, max_depth=3, random_state=seed).fit(X, y),
+        'scaler': StandardScaler().fit(X),
+        'label_encoders': encoders
+    }
+
+def write_pickles(model_dir, objects):
+    for name in MODEL_FILES:
+        with open(os.path.join(model_dir, f'{name}.pkl'), 'wb') as f:
+            pickle.dump(objects[name], f)
+
+@pytest.fixture
+def model_dir(tmp_path):
+    objects = train(0)
+    write_pickles(str(tmp_path), objects)
+    save_model_artifacts(str(tmp_path), **objects)
+    return str(tmp_path)
+
+def test_serves_artifacts_exported_from_the_pickles(model_dir):
+    bundle = ModelRegistry(model_dir).load_bundle()
+    assert bundle.source == 'artifacts'
+
+def test_pickle_only_retrain_is_served_and_noticed(model_dir):
+    registry = ModelRegistry(model_dir)
+    ok, bundle = registry.reload()
+    assert ok and bundle.source == 'artifacts'
+    signature = registry._file_signature()
+
+    # A training script that writes only the pickles
+    write_pickles(model_dir, train(1))
+    assert registry._file_signature() != signature
+    ok, bundle = registry.reload()
+    assert ok and bundle.source == 'pickle'
+    assert bundle.version == pickle_digest(model_dir)[:12]
+
+def test_artifacts_without_pickles_are_served(model_dir):
+    for name in MODEL_FILES:
+        os.remove(os.path.join(model_dir, f'{name}.pkl'))
+    registry = ModelRegistry(model_dir)
+    assert registry.load_bundle().source == 'artifacts'
+    assert None not in registry._file_signature()
+
+def test_sklearn_engine_reads_the_pickles(model_dir):
+    bundle = ModelRegistry(model_dir, engine='sklearn').load_bundle()
+    assert bundle.source == 'pickle'
+    assert isinstance(bundle.booking_model, GradientBoostingRegressor)
+
+def test_unsupported_booking_model_is_served_by_sklearn(tmp_path):
+    objects = train(0)
+    X = np.random.default_rng(0).normal(size=(300, N_FEATURES))
+    objects['booking_model'] = GradientBoostingRegressor(
+        n_estimators=10, init=LinearRegression(), random_state=0).fit(X, X[:, 0])
+    write_pickles(str(tmp_path), objects)
+    save_model_artifacts(str(tmp_path), **objects)
+
+    ok, bundle = ModelRegistry(str(tmp_path)).reload()
+    assert ok and bundle.source == 'artifacts'
+    assert isinstance(bundle.booking_model, GradientBoostingRegressor)
+    assert type(bundle.compatibility_model).__name__ == 'CompiledTreeEnsemble'
+
+def test_onnx_export_is_served_with_its_own_encoders(model_dir):
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('skl2onnx')
+    from onnx_models import export_onnx
+
+    objects = train(0)
+    export_onnx(model_dir, **objects)
+    registry = ModelRegistry(model_dir, engine='onnx')
+    ok, bundle = registry.reload()
+    assert ok and (bundle.source, bundle.engine) == ('onnx', 'onnx')
+    signature = registry._file_signature()
+
+    # Retrained without --onnx: new encoders and scaler next to the old export
+    objects = train(1)
+    write_pickles(model_dir, objects)
+    save_model_artifacts(model_dir, **objects)
+    assert registry._file_signature() != signature
+    ok, bundle = registry.reload()
+    assert ok and (bundle.source, bundle.engine) == ('artifacts', 'compiled')
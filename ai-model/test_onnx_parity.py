@@ -0,0 +1,85 @@
+"""
+Parity of the ONNX export with the sklearn models it was exported from
+Needs skl2onnx and onnxruntime (skipped otherwise). Run with: python -m pytest ai-model
+"""
+
+import warnings
+
+import numpy as np
+import pytest
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('skl2onnx')
+
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestClassifier
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from onnx_models import PARITY_TOLERANCE, export_onnx, load_onnx_models, raw_thresholds
+
+N_FEATURES = 8
+
+def raw_rows(seed, rows):
+    # Integer-valued like the encoded features, on very different scales per column
+    rng = np.random.default_rng(seed)
+    return np.round(rng.normal(size=(rows, N_FEATURES)) * np.geomspace(1, 10000, N_FEATURES) + 50)
+
+@pytest.fixture(scope='module')
+def fitted():
+    X = raw_rows(0, 800)
+    scaler = StandardScaler().fit(X)
+    scaled = scaler.transform(X)
+    y = scaled[:, 0] - scaled[:, 3] + np.sin(scaled[:, 5])
+    compatibility = RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0).fit(scaled, y > 0)
+    booking = GradientBoostingRegressor(n_estimators=30, max_depth=3, random_state=0).fit(scaled, y)
+    return compatibility, booking, scaler
+
+def encoders():
+    return {'user_type': LabelEncoder().fit(['business', 'family'])}
+
+def test_exported_trees_match_sklearn(fitted, tmp_path):
+    compatibility, booking, scaler = fitted
+    export_onnx(str(tmp_path), compatibility, booking, scaler, encoders())
+    models = load_onnx_models(str(tmp_path), threads=1)
+
+    raw = raw_rows(1, 3000)
+    scaled = scaler.transform(raw)
+    proba = compatibility.predict_proba(scaled)
+    assert np.abs(models['compatibility_model'].predict_proba(raw) - proba).max() <= PARITY_TOLERANCE
+    # An exact 0.5 tie may round either way in float32
+    decided = np.abs(proba[:, 1] - proba[:, 0]) > 2 * PARITY_TOLERANCE
+    assert np.array_equal(models['compatibility_model'].predict(raw)[decided], compatibility.predict(scaled)[decided])
+    assert np.abs(models['booking_model'].predict(raw) - booking.predict(scaled)).max() <= PARITY_TOLERANCE
+
+def test_non_tree_model_gets_a_scaler_node(fitted, tmp_path):
+    compatibility, _, scaler = fitted
+    X = raw_rows(2, 400)
+    linear = LinearRegression().fit(scaler.transform(X), X[:, 0] / 1000)
+    export_onnx(str(tmp_path), compatibility, linear, scaler, encoders())
+    models = load_onnx_models(str(tmp_path), threads=1)
+
+    raw = raw_rows(3, 500)
+    expected = linear.predict(scaler.transform(raw))
+    assert np.allclose(models['booking_model'].predict(raw), expected, rtol=1e-4, atol=1e-4)
+
+def test_raw_thresholds_split_like_the_scaled_threshold():
+    rng = np.random.default_rng(4)
+    thresholds = rng.normal(size=200).astype(np.float32).astype(np.float64)
+    mean = rng.normal(scale=1000, size=200)
+    scale = rng.uniform(0.01, 5000, size=200)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        raw = raw_thresholds(thresholds, mean, scale)
+
+    def goes_left(values):
+        return ((values.astype(np.float64) - mean) / scale).astype(np.float32) <= thresholds
+
+    above = np.nextafter(raw, np.float32(np.inf))
+    assert goes_left(raw).all()
+    assert not goes_left(above).any()
+
+def test_raw_thresholds_past_every_float32_value():
+    # Every raw value scales below the first threshold and above the second
+    raw = raw_thresholds([1e38, -1e38], [0.0, 0.0], [1e10, 1e10])
+    assert raw[0] == np.inf and raw[1] == -np.inf
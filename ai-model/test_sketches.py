@@ -0,0 +1,208 @@
+"""
+Merge, serialization and error-bound checks for the stats sketches
+Run with: python -m pytest ai-model
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from sketches import (DDSketch, HyperLogLog, RunningStats, SlidingHyperLogLog, SpaceSaving,
+                      StreamingSummary)
+
+def round_trip(sketch):
+    return type(sketch).from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+def lognormal(seed, size=20000):
+    return np.random.default_rng(seed).lognormal(mean=3, sigma=1.5, size=size)
+
+def test_running_stats_match_numpy():
+    values = lognormal(0, 5000)
+    stats = RunningStats()
+    for value in values:
+        stats.add(float(value))
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert stats.variance == pytest.approx(values.var(ddof=1), rel=1e-9)
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+def test_running_stats_merge_equals_one_stream():
+    values = lognormal(1, 3000)
+    whole, left, right = RunningStats(), RunningStats(), RunningStats()
+    for i, value in enumerate(values):
+        whole.add(float(value))
+        (left if i % 3 else right).add(float(value))
+    left.merge(right)
+    left.merge(RunningStats())
+    assert left.count == whole.count
+    assert left.mean == pytest.approx(whole.mean, rel=1e-12)
+    assert left.variance == pytest.approx(whole.variance, rel=1e-9)
+    assert (left.min, left.max) == (whole.min, whole.max)
+
+    empty = RunningStats()
+    empty.merge(whole)
+    assert empty.to_dict() == whole.to_dict()
+
+def test_running_stats_round_trip():
+    stats = RunningStats()
+    for value in (3.5, 1.0, 7.25):
+        stats.add(value)
+    assert round_trip(stats).to_dict() == stats.to_dict()
+    assert round_trip(RunningStats()).to_dict() == RunningStats().to_dict()
+
+@pytest.mark.parametrize('alpha', [0.01, 0.05])
+def test_ddsketch_quantiles_within_relative_error(alpha):
+    values = lognormal(2)
+    sketch = DDSketch(alpha)
+    for value in values:
+        sketch.add(float(value))
+    ordered = np.sort(values)
+    for q in (0.0, 0.1, 0.5, 0.9, 0.99, 0.999, 1.0):
+        exact = ordered[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= alpha * exact * (1 + 1e-9)
+
+def test_ddsketch_zeros_and_empty():
+    sketch = DDSketch()
+    assert sketch.quantile(0.5) == 0.0
+    for value in [0.0] * 60 + [10.0] * 40:
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(0.9) == pytest.approx(10.0, rel=0.01)
+
+def test_ddsketch_merge_equals_one_stream():
+    values = lognormal(3, 4000)
+    whole, left, right = DDSketch(), DDSketch(), DDSketch()
+    for i, value in enumerate(values):
+        whole.add(float(value))
+        (left if i % 2 else right).add(float(value))
+    left.merge(right)
+    assert left.count == whole.count
+    assert left.buckets == whole.buckets
+    with pytest.raises(ValueError):
+        left.merge(DDSketch(alpha=0.05))
+
+def test_ddsketch_round_trip():
+    sketch = DDSketch()
+    for value in [0.0, 0.5, 2.0, 2.0, 1500.0]:
+        sketch.add(value)
+    loaded = round_trip(sketch)
+    assert loaded.buckets == sketch.buckets
+    assert (loaded.count, loaded.zero_count) == (sketch.count, sketch.zero_count)
+
+def test_ddsketch_collapse_keeps_high_quantiles():
+    values = np.geomspace(1e-6, 1e6, 5000)
+    sketch = DDSketch(alpha=0.01, max_buckets=200)
+    for value in values:
+        sketch.add(float(value))
+    assert len(sketch.buckets) <= 200
+    assert sketch.count == len(values)
+    exact = values[int(0.99 * (len(values) - 1))]
+    assert abs(sketch.quantile(0.99) - exact) <= 0.01 * exact * (1 + 1e-9)
+
+def test_streaming_summary_round_trip_and_legacy_values():
+    values = [12.0, 80.5, 33.3, 99.9, 50.0]
+    summary = StreamingSummary.from_values(values)
+    loaded = round_trip(summary)
+    assert loaded.summary() == summary.summary()
+    assert loaded.count == 5
+    assert loaded.mean == pytest.approx(np.mean(values))
+
+def zipf_labels(seed, size=20000, labels=500):
+    return [f'label-{i}' for i in np.random.default_rng(seed).zipf(1.3, size=size) % labels]
+
+def exact_counts(labels):
+    counts = {}
+    for label in labels:
+        counts[label] = counts.get(label, 0) + 1
+    return counts
+
+def assert_space_saving_bounds(sketch, exact):
+    assert sketch.total == sum(exact.values())
+    assert len(sketch.counts) <= sketch.capacity
+    for label, count in sketch.counts.items():
+        # Never under-counts, over-counts by at most the recorded error
+        assert exact.get(label, 0) <= count <= exact.get(label, 0) + sketch.errors[label]
+    for label, count in exact.items():
+        if count > sketch.total / sketch.capacity:
+            assert label in sketch.counts
+
+def test_space_saving_error_bounds():
+    labels = zipf_labels(5)
+    sketch = SpaceSaving(capacity=32)
+    for label in labels:
+        sketch.add(label)
+    exact = exact_counts(labels)
+    assert_space_saving_bounds(sketch, exact)
+    top_exact = sorted(exact, key=lambda label: -exact[label])[:5]
+    assert list(sketch.top(5)) == top_exact
+
+def test_space_saving_exact_below_capacity():
+    sketch = SpaceSaving(capacity=8)
+    for label in ['a', 'b', 'a', 'c', 'a', 'b']:
+        sketch.add(label)
+    assert sketch.top() == {'a': 3, 'b': 2, 'c': 1}
+    assert sketch.summary()['max_error'] == 0
+
+def test_space_saving_merge_keeps_bounds():
+    left_labels, right_labels = zipf_labels(6, 8000), zipf_labels(7, 8000)
+    left, right = SpaceSaving(capacity=32), SpaceSaving(capacity=32)
+    for label in left_labels:
+        left.add(label)
+    for label in right_labels:
+        right.add(label)
+    left.merge(right)
+    assert_space_saving_bounds(left, exact_counts(left_labels + right_labels))
+
+def test_space_saving_round_trip_and_legacy_dicts():
+    sketch = SpaceSaving(capacity=4)
+    for label in ['x'] * 5 + ['y'] * 3 + ['z', 'w', 'v']:
+        sketch.add(label)
+    loaded = SpaceSaving.from_dict(json.loads(json.dumps(sketch.to_dict())), capacity=4)
+    assert (loaded.counts, loaded.errors, loaded.total) == (sketch.counts, sketch.errors, sketch.total)
+
+    legacy = SpaceSaving.from_dict({'Deluxe Room': 10, 'Suite': 4, 'Standard': 1}, capacity=2)
+    assert legacy.top() == {'Deluxe Room': 10, 'Suite': 4}
+    assert legacy.total == 15
+
+def test_space_saving_truncates_long_labels():
+    sketch = SpaceSaving(capacity=4)
+    sketch.add('x' * 1000)
+    assert list(sketch.counts) == ['x' * SpaceSaving.MAX_LABEL_LENGTH]
+
+def timed_hashes(seed, size=6000, span=500):
+    rng = np.random.default_rng(seed)
+    times = np.sort(rng.integers(0, span, size=size))
+    return [(int(t), HyperLogLog.hash_value(int(i))) for t, i in zip(times, rng.integers(0, 3000, size=size))]
+
+def plain_hll(items, p=13):
+    sketch = HyperLogLog(p)
+    for _, hashed in items:
+        sketch.add_hash(hashed)
+    return sketch
+
+def test_sliding_hll_since_matches_a_plain_hll():
+    items = timed_hashes(8)
+    sketch = SlidingHyperLogLog(p=8)
+    for t, hashed in items:
+        sketch.add_hash(t, hashed)
+    # Pruning only drops entries a newer one outranks, so every suffix is exact
+    sketch.compact()
+    assert len(sketch) < len(items) / 4
+    for start in (0, 1, 250, 499, 500):
+        expected = plain_hll([item for item in items if item[0] >= start], p=8)
+        assert np.array_equal(sketch.since(start).registers, expected.registers)
+
+def test_sliding_hll_merge_and_round_trip():
+    items = timed_hashes(9)
+    whole, left, right = SlidingHyperLogLog(), SlidingHyperLogLog(), SlidingHyperLogLog()
+    for i, (t, hashed) in enumerate(items):
+        whole.add_hash(t, hashed)
+        (left if i % 2 else right).add_hash(t, hashed)
+    left.merge(right)
+    loaded = SlidingHyperLogLog.from_dict(json.loads(json.dumps(left.to_dict())))
+    assert loaded.latest == whole.latest
+    for start in (0, 100, 400):
+        assert np.array_equal(loaded.since(start).registers, whole.since(start).registers)
+    with pytest.raises(ValueError):
+        left.merge(SlidingHyperLogLog(p=12))
@@ -0,0 +1,89 @@
+"""
+Windowed counters: bucket windows, merging and (sparse) serialization
+Run with: python -m pytest ai-model
+"""
+
+import json
+import time
+
+import pytest
+
+from sketches import HyperLogLog
+from time_series import RESOLUTIONS, WINDOWS, DistinctSeries, RollupSeries, _window_start, local_seconds
+
+NOW = 1_700_000_000 - 1_700_000_000 % 86400 + 12 * 3600  # noon UTC
+
+def sample_series():
+    series = RollupSeries()
+    series.add(NOW - 30, views=1, sessions=1)
+    series.add(NOW - 90 * 60, clicks=2)
+    series.add(NOW - 3 * 86400, bookings=1, revenue=12000)
+    return series
+
+def test_windows_count_their_buckets():
+    series = sample_series()
+    assert series.window('1h', NOW)['totals']['views'] == 1
+    assert series.window('1h', NOW)['totals']['clicks'] == 0
+    assert series.window('24h', NOW)['totals']['clicks'] == 2
+    assert series.window('7d', NOW)['totals']['revenue'] == 12000
+    assert len(series.window('30d', NOW)['series']) == 30
+
+def test_merge_adds_matching_buckets():
+    merged = sample_series()
+    merged.merge(sample_series())
+    totals = merged.window('7d', NOW)['totals']
+    assert (totals['views'], totals['clicks'], totals['bookings']) == (2, 4, 2)
+
+def test_snapshot_only_keeps_used_buckets():
+    data = json.loads(json.dumps(sample_series().to_dict()))
+    assert len(data['rings']['minute']['epochs']) == 2
+    assert len(data['rings']['day']['epochs']) == 2
+    assert len(json.dumps(data)) < 600
+
+    loaded = RollupSeries.from_dict(data)
+    for window in ('1h', '24h', '7d', '1y'):
+        assert loaded.window(window, NOW) == sample_series().window(window, NOW)
+
+def test_loads_snapshots_with_other_fields():
+    width, _ = RESOLUTIONS['hour']
+    epoch = int(local_seconds(NOW - 3600) // width)
+    data = {'fields': ['views', 'retired_field'], 'rings': {'hour': {'epochs': [epoch], 'values': [[5, 9]]}}}
+    loaded = RollupSeries.from_dict(data)
+    assert loaded.window('24h', NOW)['totals']['views'] == 5
+
+def test_distinct_windows_match_exact_counts():
+    series, seen = DistinctSeries(), []
+    # 40 days of ids, 120 per hour drawn from 5000 users
+    for step in range(40 * 24 * 120):
+        timestamp = NOW - step * 30
+        user = (step * 7919) % 5000
+        series.add(timestamp, HyperLogLog.hash_value(user))
+        seen.append((timestamp, user))
+    summary = json.loads(json.dumps(DistinctSeries.from_dict(series.to_dict()).summary(NOW)))
+    assert summary == series.summary(NOW)
+    for name in WINDOWS:
+        start = _window_start(name, local_seconds(NOW))
+        exact = len({user for timestamp, user in seen if local_seconds(timestamp) >= start})
+        assert abs(summary['windows'][name] - exact) <= 0.05 * exact + 2
+    assert abs(summary['all_time'] - 5000) <= 0.05 * 5000
+
+@pytest.fixture
+def karachi_time(monkeypatch):
+    monkeypatch.setenv('TZ', 'Asia/Karachi')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_days_start_at_local_midnight(karachi_time):
+    midnight = time.mktime((2023, 11, 14, 0, 0, 0, 0, 0, -1))  # 19:00 UTC the day before
+    now = midnight + 12 * 3600
+    series, distinct = RollupSeries(), DistinctSeries()
+    for timestamp, user in ((midnight - 3600, 'yesterday'), (midnight + 3600, 'early'), (now - 60, 'noon')):
+        series.add(timestamp, views=1)
+        distinct.add(timestamp, HyperLogLog.hash_value(user))
+
+    today = series.window('30d', now)['series'][-1]
+    assert (today['start'], today['views']) == ('2023-11-14T00:00:00', 2)
+    assert series.window('24h', now)['series'][-1]['start'] == '2023-11-14T12:00:00'
+    assert distinct.summary(now)['today'] == 2
@@ -0,0 +1,100 @@
+"""
+Bit-for-bit parity of the compiled tree engine with sklearn
+Run with: python -m pytest ai-model
+"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import (ExtraTreesRegressor, GradientBoostingRegressor,
+                              RandomForestClassifier, RandomForestRegressor)
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+
+from model_artifacts import current_artifacts_dir, load_model_artifacts, save_model_artifacts
+from tree_engine import CompiledTreeEnsemble, check_parity, compile_model, flatten_ensemble
+
+N_FEATURES = 10
+
+def training_data(seed=0, rows=600):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, N_FEATURES))
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + X[:, 2] * X[:, 3] + rng.normal(scale=0.1, size=rows)
+    return X, y
+
+def query_rows(seed=1, rows=2000):
+    # Wider than the training data, plus values that sit exactly on split thresholds
+    X = np.random.default_rng(seed).normal(scale=2.0, size=(rows, N_FEATURES))
+    X[:20] = np.round(X[:20], 1)
+    return X
+
+def classifier(n_classes):
+    X, y = training_data()
+    labels = np.digitize(y, np.quantile(y, np.linspace(0, 1, n_classes + 1)[1:-1]))
+    return RandomForestClassifier(n_estimators=30, max_depth=8, random_state=0).fit(X, labels)
+
+def regressors():
+    X, y = training_data()
+    return [
+        RandomForestRegressor(n_estimators=30, max_depth=10, random_state=0).fit(X, y),
+        ExtraTreesRegressor(n_estimators=20, random_state=0).fit(X, y),
+        GradientBoostingRegressor(n_estimators=50, max_depth=4, learning_rate=0.1, random_state=0).fit(X, y),
+        GradientBoostingRegressor(n_estimators=20, init='zero', random_state=0).fit(X, y)
+    ]
+
+def assert_same_output(reference, compiled, X):
+    if hasattr(reference, 'predict_proba'):
+        assert np.array_equal(reference.predict_proba(X), compiled.predict_proba(X))
+    assert np.array_equal(reference.predict(X), compiled.predict(X))
+
+@pytest.mark.parametrize('n_classes', [2, 3])
+def test_classifier_is_bit_identical(n_classes):
+    model = classifier(n_classes)
+    assert_same_output(model, compile_model(model), query_rows())
+
+@pytest.mark.parametrize('model', regressors(), ids=lambda m: type(m).__name__)
+def test_regressor_is_bit_identical(model):
+    assert_same_output(model, compile_model(model), query_rows())
+
+def test_single_row_matches_batch():
+    model = regressors()[2]
+    compiled = compile_model(model)
+    X = query_rows(rows=5)
+    for row in X:
+        assert np.array_equal(compiled.predict(row[np.newaxis]), model.predict(row[np.newaxis]))
+
+def test_artifacts_round_trip_is_bit_identical(tmp_path):
+    X, y = training_data()
+    compatibility, booking = classifier(2), regressors()[2]
+    scaler = StandardScaler().fit(X)
+    save_model_artifacts(str(tmp_path), compatibility, booking, scaler, {})
+
+    loaded = load_model_artifacts(current_artifacts_dir(str(tmp_path)))
+    assert isinstance(loaded['compatibility_model'], CompiledTreeEnsemble)
+    assert isinstance(loaded['booking_model'], CompiledTreeEnsemble)
+    assert_same_output(compatibility, loaded['compatibility_model'], query_rows())
+    assert_same_output(booking, loaded['booking_model'], query_rows())
+    assert np.array_equal(loaded['scaler'].mean_, scaler.mean_)
+
+def test_other_models_are_not_compiled():
+    X, y = training_data()
+    model = LinearRegression().fit(X, y)
+    assert compile_model(model) is model
+
+def test_gradient_boosting_with_an_estimator_init_stays_on_sklearn(tmp_path):
+    X, y = training_data()
+    model = GradientBoostingRegressor(n_estimators=10, init=LinearRegression(), random_state=0).fit(X, y)
+    with pytest.raises(ValueError, match='init=LinearRegression'):
+        flatten_ensemble(model)
+    assert compile_model(model) is model
+
+    save_model_artifacts(str(tmp_path), classifier(2), model, StandardScaler().fit(X), {})
+    loaded = load_model_artifacts(current_artifacts_dir(str(tmp_path)))
+    assert isinstance(loaded['booking_model'], GradientBoostingRegressor)
+    assert np.array_equal(loaded['booking_model'].predict(query_rows()), model.predict(query_rows()))
+
+def test_check_parity_rejects_a_mismatch():
+    model = regressors()[0]
+    compiled = compile_model(model)
+    compiled.value = compiled.value + 1e-12
+    with pytest.raises(ValueError):
+        check_parity(model, compiled, N_FEATURES)
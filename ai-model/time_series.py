@@ -0,0 +1,236 @@
+"""
+Windowed time-series counters for the recommendation analytics
+Each event is counted in its minute, hour and day bucket. Every resolution is
+a fixed-size ring of buckets, so memory stays the same however long the
+service runs, and a window query reads at most one ring. DistinctSeries
+counts distinct users and visitors over the same windows with a sliding
+HyperLogLog. Buckets follow the service's local clock, so days start at local
+midnight, like the hours in time_of_day.
+"""
+
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from sketches import HyperLogLog, SlidingHyperLogLog
+
+# Counted per bucket
+FIELDS = ('predictions', 'views', 'clicks', 'bookings', 'revenue', 'sessions', 'bounces')
+
+# resolution -> (bucket seconds, buckets kept)
+RESOLUTIONS = {
+    'minute': (60, 120),
+    'hour': (3600, 168),
+    'day': (86400, 366)
+}
+
+# window -> (resolution, buckets)
+WINDOWS = {
+    '1h': ('minute', 60),
+    '24h': ('hour', 24),
+    '7d': ('hour', 168),
+    '30d': ('day', 30),
+    '90d': ('day', 90),
+    '1y': ('day', 365)
+}
+
+def local_seconds(timestamp):
+    """Unix time shifted by the local UTC offset: seconds since 1970-01-01 on the local clock"""
+    return timestamp + time.localtime(timestamp).tm_gmtoff
+
+def _wall_clock(seconds):
+    """ISO label of a local_seconds() value, in local time like datetime.fromtimestamp()"""
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None).isoformat()
+
+class RingBuckets:
+    """Fixed number of consecutive time buckets, reused in a ring
+
+    Slot `epoch % size` holds bucket `epoch` (local_seconds // width); a slot is
+    reset when a newer bucket claims it, and events older than the bucket it
+    holds are dropped.
+    """
+
+    def __init__(self, width, size):
+        self.width = width
+        self.size = size
+        self.epochs = [-1] * size
+        self.values = [[0] * len(FIELDS) for _ in range(size)]
+
+    def add(self, timestamp, amounts):
+        epoch = int(timestamp // self.width)
+        slot = epoch % self.size
+        if self.epochs[slot] != epoch:
+            if self.epochs[slot] > epoch:
+                return
+            self.epochs[slot] = epoch
+            self.values[slot] = [0] * len(FIELDS)
+        bucket = self.values[slot]
+        for index, amount in amounts:
+            bucket[index] += amount
+
+    def window(self, now, count):
+        """(bucket start, values) for the `count` buckets ending with the current one"""
+        current = int(now // self.width)
+        buckets = []
+        for epoch in range(current - min(count, self.size) + 1, current + 1):
+            slot = epoch % self.size
+            values = self.values[slot] if self.epochs[slot] == epoch else [0] * len(FIELDS)
+            buckets.append((epoch * self.width, values))
+        return buckets
+
+    def merge(self, other):
+        for slot in range(self.size):
+            if other.epochs[slot] > self.epochs[slot]:
+                self.epochs[slot] = other.epochs[slot]
+                self.values[slot] = list(other.values[slot])
+            elif other.epochs[slot] == self.epochs[slot] >= 0:
+                self.values[slot] = [a + b for a, b in zip(self.values[slot], other.values[slot])]
+
+class RollupSeries:
+    """Minute, hour and day rings of the analytics counters"""
+
+    def __init__(self):
+        self.rings = {name: RingBuckets(width, size) for name, (width, size) in RESOLUTIONS.items()}
+
+    def add(self, timestamp, **amounts):
+        """Count an event at `timestamp`, e.g. add(t, views=1, sessions=1)"""
+        indexed = [(FIELDS.index(field), amount) for field, amount in amounts.items() if amount]
+        if not indexed:
+            return
+        local = local_seconds(timestamp)
+        for ring in self.rings.values():
+            ring.add(local, indexed)
+
+    def merge(self, other):
+        for name, ring in self.rings.items():
+            ring.merge(other.rings[name])
+
+    def window(self, name, now=None):
+        """Totals and per-bucket series for one of WINDOWS"""
+        resolution, count = WINDOWS[name]
+        ring = self.rings[resolution]
+        buckets = ring.window(local_seconds(time.time() if now is None else now), count)
+
+        totals = [0] * len(FIELDS)
+        series = []
+        for start, values in buckets:
+            totals = [a + b for a, b in zip(totals, values)]
+            point = dict(zip(FIELDS, values))
+            point['start'] = _wall_clock(start)
+            series.append(point)
+
+        return {
+            'window': name,
+            'resolution': resolution,
+            'from': _wall_clock(buckets[0][0]),
+            'to': _wall_clock(buckets[-1][0] + ring.width),
+            'totals': dict(zip(FIELDS, totals)),
+            'series': series
+        }
+
+    def to_dict(self):
+        """Only the buckets that counted something and can still be read, by epoch"""
+        rings = {}
+        for name, ring in self.rings.items():
+            # A slot not reused since the ring wrapped holds a bucket no window reaches
+            oldest = max(ring.epochs) - ring.size + 1
+            used = sorted((epoch, values) for epoch, values in zip(ring.epochs, ring.values)
+                          if epoch >= oldest and epoch >= 0 and any(values))
+            rings[name] = {'epochs': [epoch for epoch, _ in used], 'values': [values for _, values in used]}
+        return {'fields': list(FIELDS), 'rings': rings}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load a saved series (fields it does not know are dropped)"""
+        series = cls()
+        positions = [FIELDS.index(f) if f in FIELDS else None for f in data.get('fields', FIELDS)]
+        for name, saved in data.get('rings', {}).items():
+            ring = series.rings.get(name)
+            if ring is None:
+                continue
+            for epoch, saved_values in zip(saved['epochs'], saved['values']):
+                slot = epoch % ring.size
+                if epoch <= ring.epochs[slot]:
+                    continue
+                values = [0] * len(FIELDS)
+                for position, value in zip(positions, saved_values):
+                    if position is not None:
+                        values[position] = value
+                ring.epochs[slot] = epoch
+                ring.values[slot] = values
+        return series
+
+def _window_start(name, now):
+    """Start of the window's first bucket, the window ending with the current one (local_seconds)"""
+    resolution, count = WINDOWS[name]
+    width = RESOLUTIONS[resolution][0]
+    return (int(now // width) - count + 1) * width
+
+# resolution -> how many buckets back its longest window reaches
+WINDOW_REACH = {resolution: max(count for r, count in WINDOWS.values() if r == resolution)
+                for resolution in RESOLUTIONS}
+
+def _coarsen_minutes(times, latest):
+    """Round entry times (minutes) down to the next coarser bucket once no
+    window of a finer resolution can start inside them; -1 past the longest window
+
+    Windows start on bucket boundaries, so an entry older than every possible
+    start of the finer windows is classified the same by its bucket start.
+    """
+    widths = [RESOLUTIONS[resolution][0] // 60 for resolution in RESOLUTIONS]
+    times = np.asarray(times, dtype=np.int64)
+    for (resolution, reach), width, coarser in zip(WINDOW_REACH.items(), widths, widths[1:] + [None]):
+        cutoff = (latest // width - reach + 1) * width
+        old = times < cutoff
+        times = np.where(old, -1 if coarser is None else times // coarser * coarser, times)
+    return times
+
+class DistinctSeries:
+    """Distinct ids over each of WINDOWS, plus all time, from 64-bit id hashes
+
+    One SlidingHyperLogLog (local_seconds minutes) answers every window with the
+    same bucket-aligned bounds as RollupSeries. An entry older than the
+    longest minute window is rounded to its hour, and to its day once past
+    the longest hour window, which keeps the sketch to a few tens of
+    thousands of entries after a year.
+    """
+
+    def __init__(self):
+        self.recent = SlidingHyperLogLog(coarsen=_coarsen_minutes)
+        self.total = HyperLogLog()
+
+    def add(self, timestamp, hashed):
+        self.recent.add_hash(int(local_seconds(timestamp) // 60), hashed)
+        self.total.add_hash(hashed)
+
+    def merge(self, other):
+        self.recent.merge(other.recent)
+        self.total.merge(other.total)
+
+    def window(self, name, now=None):
+        """Estimated distinct ids over one of WINDOWS"""
+        start = _window_start(name, local_seconds(time.time() if now is None else now))
+        return self.recent.since(start // 60).count()
+
+    def summary(self, now=None):
+        """Today, all time and every window"""
+        now = time.time() if now is None else now
+        day = RESOLUTIONS['day'][0]
+        return {
+            'today': self.recent.since(int(local_seconds(now) // day) * day // 60).count(),
+            'all_time': self.total.count(),
+            'windows': {name: self.window(name, now) for name in WINDOWS}
+        }
+
+    def to_dict(self):
+        return {'total': self.total.to_dict(), 'recent': self.recent.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        series = cls()
+        if data.get('total'):
+            series.total = HyperLogLog.from_dict(data['total'])
+        if data.get('recent'):
+            series.recent = SlidingHyperLogLog.from_dict(data['recent'], coarsen=_coarsen_minutes)
+        return series
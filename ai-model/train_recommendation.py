@@ -13,6 +13,7 @@ import pickle
 import json
 import os
 from datetime import datetime
+from model_artifacts import save_model_artifacts
 
 class RoomRecommendationAI:
     def __init__(self):
@@ -268,6 +269,11 @@ class RoomRecommendationAI:
         with open(f'{model_dir}/label_encoders.pkl', 'wb') as f:
             pickle.dump(self.label_encoders, f)
         
+        # The API prefers artifacts over the pickles, so refresh them as well
+        version = save_model_artifacts(model_dir, self.compatibility_model, self.booking_model,
+                                       self.scaler, self.label_encoders)
+        print(f"✅ Memory-mapped artifacts saved (version {version})")
+        
         print("✅ Models saved!")
 
 if __name__ == "__main__":
@@ -12,7 +12,9 @@ from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
 import pickle
 import json
 import os
+import sys
 from datetime import datetime
+from model_artifacts import save_model_artifacts
 
 class PakistanHotelRecommendationAI:
     def __init__(self):
@@ -250,6 +252,11 @@ class PakistanHotelRecommendationAI:
         with open(f'{output_dir}/model_metadata.json', 'w') as f:
             json.dump(metadata, f, indent=2)
         
+        # Flat .npy arrays the API memory-maps instead of unpickling per worker
+        version = save_model_artifacts(output_dir, self.compatibility_model, self.booking_model,
+                                       self.scaler, self.label_encoders)
+        print(f"✅ Memory-mapped artifacts saved (version {version})")
+        
         print("✅ Models saved successfully!")
 
 if __name__ == "__main__":
@@ -262,7 +269,21 @@ if __name__ == "__main__":
     
     accuracy, r2 = ai.train(df)
     
-    ai.save_models()
+    # A market's own models go to MODEL_DIR/cities/<city>, e.g. --output-dir ai-model/models/cities/lahore
+    output_dir = sys.argv[sys.argv.index('--output-dir') + 1] if '--output-dir' in sys.argv else 'ai-model'
+    ai.save_models(output_dir)
+    
+    # Optional ONNX export for RECOMMENDER_ENGINE=onnx (needs skl2onnx and onnxruntime)
+    if '--onnx' in sys.argv:
+        try:
+            from onnx_models import export_onnx
+            manifest = export_onnx(output_dir, ai.compatibility_model, ai.booking_model, ai.scaler,
+                                   ai.label_encoders)
+            parity = manifest['parity']
+            print(f"✅ ONNX models saved (version {manifest['version']}, "
+                  f"max parity diff {max(parity['compatibility_max_abs_diff'], parity['booking_max_abs_diff']):.2g})")
+        except ImportError as e:
+            print(f"⚠️  ONNX export skipped, install skl2onnx and onnxruntime: {e}")
     
     print("\n" + "=" * 60)
     print("🎉 Training Complete!")
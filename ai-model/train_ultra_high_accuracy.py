@@ -6,12 +6,14 @@ Generates comprehensive training data for 99%+ accuracy
 import numpy as np
 import pandas as pd
 import pickle
+import sys
 from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.linear_model import LogisticRegression, Ridge
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, RandomForestRegressor
 from sklearn.metrics import accuracy_score, classification_report, mean_squared_error, r2_score
 import os
+from model_artifacts import save_model_artifacts
 
 # Create models directory
 os.makedirs('ai-model/models', exist_ok=True)
@@ -441,6 +443,22 @@ with open('ai-model/models/model_metadata.json', 'w') as f:
     json.dump(metadata, f, indent=2)
 print("✅ Saved: model_metadata.json")
 
+# Flat .npy arrays the API memory-maps instead of unpickling per worker
+artifacts_version = save_model_artifacts('ai-model/models', compatibility_model, booking_model,
+                                         scaler, label_encoders)
+print(f"✅ Saved: artifacts/{artifacts_version} (memory-mapped by the API)")
+
+# Optional ONNX export for RECOMMENDER_ENGINE=onnx (needs skl2onnx and onnxruntime)
+if '--onnx' in sys.argv:
+    try:
+        from onnx_models import export_onnx
+        manifest = export_onnx('ai-model/models', compatibility_model, booking_model, scaler, label_encoders)
+        parity = manifest['parity']
+        print(f"✅ Saved: onnx/ (version {manifest['version']}, "
+              f"max parity diff {max(parity['compatibility_max_abs_diff'], parity['booking_max_abs_diff']):.2g})")
+    except ImportError as e:
+        print(f"⚠️  ONNX export skipped, install skl2onnx and onnxruntime: {e}")
+
 print("\n" + "="*80)
 print("🎉 TRAINING COMPLETE!")
 print("="*80)
@@ -0,0 +1,200 @@
+"""
+Compiled tree-ensemble engine for low-latency inference
+Evaluates every tree of a flattened ensemble at once with a level-synchronous
+numpy traversal, avoiding sklearn's per-call validation and per-tree dispatch.
+Accumulation follows sklearn's order, so outputs are bit-identical.
+"""
+
+import numpy as np
+
+ENGINES = ('compiled', 'sklearn')
+
+def _tree_ensemble_kind(model):
+    name = type(model).__name__
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+        return 'forest_classifier'
+    if name in ('RandomForestRegressor', 'ExtraTreesRegressor'):
+        return 'forest_regressor'
+    if name == 'GradientBoostingRegressor':
+        return 'gradient_boosting_regressor'
+    return None
+
+def flatten_ensemble(model):
+    """Flatten a fitted sklearn tree ensemble into (arrays, metadata)
+
+    All trees are concatenated. Child indices are global, and leaves point to
+    themselves with threshold +inf, so a traversal can step past a leaf
+    without branching. Classifier leaf values are the probabilities sklearn's
+    predict_proba returns for that leaf.
+    """
+    kind = _tree_ensemble_kind(model)
+    if kind is None:
+        raise ValueError(f'{type(model).__name__} is not a supported tree ensemble')
+
+    if kind == 'gradient_boosting_regressor':
+        trees = [est.tree_ for est in model.estimators_[:, 0]]
+    else:
+        trees = [est.tree_ for est in model.estimators_]
+
+    roots = np.zeros(len(trees), dtype=np.int64)
+    features, thresholds, lefts, rights, values = [], [], [], [], []
+    offset = 0
+    for t, tree in enumerate(trees):
+        n = tree.node_count
+        roots[t] = offset
+        local = np.arange(n)
+        is_leaf = tree.children_left == -1
+
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+        lefts.append(np.where(is_leaf, local, tree.children_left).astype(np.int64) + offset)
+        rights.append(np.where(is_leaf, local, tree.children_right).astype(np.int64) + offset)
+
+        if kind == 'forest_classifier':
+            proba = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+            # sklearn >= 1.4 stores class fractions and returns them as they are;
+            # older versions store counts and normalize them in predict_proba
+            if not np.allclose(proba.sum(axis=1), 1.0):
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                proba = proba / normalizer
+            values.append(proba)
+        else:
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+        offset += n
+
+    arrays = {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'roots': roots
+    }
+
+    metadata = {
+        'kind': kind,
+        'estimator': type(model).__name__,
+        'n_trees': len(trees),
+        'n_features': int(model.n_features_in_),
+        'max_depth': int(max(tree.max_depth for tree in trees))
+    }
+    if kind == 'forest_classifier':
+        metadata['classes'] = [c.item() for c in model.classes_]
+    if kind == 'gradient_boosting_regressor':
+        metadata['learning_rate'] = float(model.learning_rate)
+        metadata['init'] = _constant_init(model)
+    return arrays, metadata
+
+def _constant_init(model):
+    """Starting prediction of a gradient boosting model, if it is a constant
+
+    sklearn starts from init_.predict(X); only 'zero' and constant estimators
+    (the default DummyRegressor) give a value that can be stored with the trees.
+    """
+    if isinstance(model.init_, str) and model.init_ == 'zero':
+        return 0.0
+    if not hasattr(model.init_, 'constant_'):
+        raise ValueError(f'{type(model).__name__} with init={type(model.init_).__name__} is not supported '
+                         "(only 'zero' or a constant DummyRegressor)")
+    return float(np.asarray(model.init_.constant_, dtype=np.float64).ravel()[0])
+
+class CompiledTreeEnsemble:
+    """All trees of an ensemble evaluated together on a small batch
+
+    Takes the flat arrays of flatten_ensemble (which may be memory-mapped,
+    see model_artifacts). Leaves point to themselves, so every tree is stepped
+    exactly max_depth times without per-tree branching.
+    """
+
+    def __init__(self, arrays, metadata):
+        self.metadata = metadata
+        self.kind = metadata['kind']
+        self.estimator_name = metadata.get('estimator', self.kind)
+        self.n_features_in_ = metadata['n_features']
+        self.max_depth = metadata['max_depth']
+        self.n_trees = metadata['n_trees']
+        if 'classes' in metadata:
+            self.classes_ = np.array(metadata['classes'])
+
+        # Plain ndarray views: mapped data stays shared (no copies, no memmap wrapping per operation)
+        self.feature = np.asarray(arrays['feature'])
+        self.threshold = np.asarray(arrays['threshold'])
+        self.left = np.asarray(arrays['left'])
+        self.right = np.asarray(arrays['right'])
+        self.value = np.asarray(arrays['value'])
+        self.roots = np.asarray(arrays['roots'])
+
+        if self.kind == 'gradient_boosting_regressor':
+            # sklearn adds learning_rate * value per stage; pre-scaling gives the same products
+            self.value = self.metadata['learning_rate'] * self.value
+
+    def apply(self, X):
+        """Leaf node index per (tree, row)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_x = X.ravel()
+
+        # (tree, row) pairs flattened tree-major; offsets locate each row in flat_x
+        node = np.repeat(self.roots, n_rows)
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.intp) * n_features, self.n_trees)
+
+        feature, threshold, left, right = self.feature, self.threshold, self.left, self.right
+        for _ in range(self.max_depth):
+            go_left = flat_x[row_offsets + feature[node]] <= threshold[node]
+            node = np.where(go_left, left[node], right[node])
+        return node.reshape(self.n_trees, n_rows)
+
+    def _sum_trees(self, X, initial=None):
+        """Sum of leaf values over trees, accumulated in tree order like sklearn"""
+        leaf_values = self.value[self.apply(X)]
+        if initial is not None:
+            leaf_values = np.concatenate([initial[np.newaxis], leaf_values])
+        # add.accumulate is strictly sequential (add.reduce may sum pairwise)
+        return np.add.accumulate(leaf_values, axis=0)[-1]
+
+    def predict_proba(self, X):
+        if self.kind != 'forest_classifier':
+            raise AttributeError('predict_proba is only available for classifiers')
+        proba = self._sum_trees(X)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        if self.kind == 'forest_classifier':
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        if self.kind == 'forest_regressor':
+            prediction = self._sum_trees(X)
+            prediction /= self.n_trees
+            return prediction
+        n_rows = np.shape(X)[0]
+        return self._sum_trees(X, initial=np.full(n_rows, self.metadata['init'], dtype=np.float64))
+
+def compile_model(model):
+    """CompiledTreeEnsemble for a supported sklearn ensemble
+
+    Anything else (e.g. a linear model, or gradient boosting started from a
+    non-constant init estimator) is returned unchanged and served by sklearn.
+    """
+    if isinstance(model, CompiledTreeEnsemble):
+        return model
+    if _tree_ensemble_kind(model):
+        try:
+            arrays, metadata = flatten_ensemble(model)
+        except ValueError as e:
+            print(f"⚠️  {e}, serving it with sklearn")
+            return model
+        return CompiledTreeEnsemble(arrays, metadata)
+    return model
+
+def check_parity(reference, compiled, n_features, rows=256, seed=0):
+    """Raise if the compiled engine does not reproduce the reference model exactly"""
+    if compiled is reference:
+        return
+    X = np.random.default_rng(seed).normal(scale=2.0, size=(rows, n_features))
+    if getattr(compiled, 'kind', None) == 'forest_classifier':
+        expected, actual = reference.predict_proba(X), compiled.predict_proba(X)
+    else:
+        expected, actual = reference.predict(X), compiled.predict(X)
+    if not np.array_equal(np.asarray(expected, dtype=np.float64).ravel(), np.asarray(actual).ravel()):
+        raise ValueError(f'Compiled {compiled.estimator_name} does not match the reference model')
@@ -0,0 +1,431 @@
+"""
+Load-testing and regression benchmarks for the Python services
+Drives the recommendation API, both chatbot APIs and the voice assistant NLP
+engine with request mixes drawn from the repo's own datasets, reports
+throughput and p50/p95/p99 latency per target, and compares them with a
+stored baseline. Exits with status 1 when a target regressed beyond the
+tolerance, so it can gate a deploy.
+
+Services run in-process by default (Flask test client, no network, stats
+written to a temp dir). Pass --url to benchmark a server already running on
+localhost instead. Everything works offline.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # all targets vs benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py recommendation_api --concurrency 16 --requests 5000
+    python benchmarks/run_benchmarks.py recommendation_api --url http://localhost:5002
+    python benchmarks/run_benchmarks.py --save-baseline      # record the current numbers as the baseline
+"""
+
+import argparse
+import csv
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(script_dir)
+
+BASELINE_FILE = os.path.join(script_dir, 'baseline.json')
+INTERACTIONS_CSV = os.path.join(repo_dir, 'ai-model', 'ai-model', 'dataset', 'user_interactions.csv')
+CHAT_DATASETS = [
+    os.path.join(repo_dir, 'chatbot', 'dataset-final-hotelogix.json'),
+    os.path.join(repo_dir, 'chatbot', 'dataset-pakistan.json')
+]
+
+# Budgets (PKR) the booking form offers; the interactions dataset has none
+BUDGETS = (3000, 5000, 8000, 12000, 20000, 35000)
+BATCH_PROFILES = 8
+
+# Spoken commands the voice assistant handles besides chat-style questions
+VOICE_COMMANDS = [
+    "Go to rooms page", "Find a deluxe room in Lahore", "Scroll down", "Open LHR 001",
+    "Book a table", "How much does it cost?", "Show me suites in Karachi under 20000",
+    "I need a room for 4 people next weekend", "Stop"
+]
+
+class BenchmarkSkipped(Exception):
+    """A target cannot run here (missing models, dependencies or server)"""
+
+# ---------------------------------------------------------------------------
+# Payloads
+# ---------------------------------------------------------------------------
+
+def recommendation_profiles(rng, limit=2000):
+    """/recommend payloads built from logged user interactions"""
+    with open(INTERACTIONS_CSV, 'r', newline='') as f:
+        rows = list(csv.DictReader(f))
+    profiles = []
+    for row in rng.sample(rows, min(limit, len(rows))):
+        profiles.append({
+            'userType': row['user_profile'],
+            'season': row['season'],
+            'dayType': row['day_type'],
+            'bookingAdvance': int(row['booking_advance_days']),
+            'stayDuration': int(row['stay_duration_nights']),
+            'groupSize': int(row['group_size']),
+            'viewTime': int(row['view_time_seconds']),
+            'previousBookings': 0,
+            'budget': rng.choice(BUDGETS)
+        })
+    return profiles
+
+def chat_messages():
+    """User utterances from the chatbot training datasets"""
+    messages = []
+    for path in CHAT_DATASETS:
+        with open(path, 'r', encoding='utf-8') as f:
+            for intent in json.load(f)['intents']:
+                messages.extend(p for p in intent.get('patterns', []) if p.strip())
+    return messages
+
+def build_operations(mix, count, seed=0):
+    """`count` (label, method, path, body) tuples sampled from a weighted mix
+
+    The sequence only depends on the seed, so every run (and the baseline)
+    replays the same requests in the same order.
+    """
+    rng = random.Random(seed)
+    weights = [weight for weight, *_ in mix]
+    operations = []
+    for weight, label, method, path, make_body in rng.choices(mix, weights=weights, k=count):
+        operations.append((label, method, path, make_body(rng) if make_body else None))
+    return operations
+
+def recommendation_mix(rng):
+    profiles = recommendation_profiles(rng)
+    return [
+        (0.75, 'recommend', 'POST', '/recommend', lambda r: r.choice(profiles)),
+        (0.05, 'recommend_batch', 'POST', '/recommend/batch', lambda r: r.sample(profiles, BATCH_PROFILES)),
+        (0.10, 'track', 'POST', '/track', lambda r: {
+            'type': r.choice(['view', 'view', 'view', 'click', 'booking']),
+            'device': r.choice(['desktop', 'mobile', 'tablet']),
+            'duration': r.randint(5, 300)
+        }),
+        (0.05, 'stats', 'GET', '/stats', None),
+        (0.05, 'health', 'GET', '/health', None)
+    ]
+
+def chat_mix(rng):
+    messages = chat_messages()
+    return [
+        (0.95, 'chat', 'POST', '/chat', lambda r: {'message': r.choice(messages)}),
+        (0.05, 'health', 'GET', '/health', None)
+    ]
+
+def voice_mix(rng):
+    commands = chat_messages() + VOICE_COMMANDS * 20
+    return [(1.0, 'process', 'CALL', 'process', lambda r: {'text': r.choice(commands)})]
+
+# ---------------------------------------------------------------------------
+# Clients
+# ---------------------------------------------------------------------------
+
+class FlaskClient:
+    """Calls a Flask app in-process, one test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()  # drain streamed (NDJSON) bodies
+        response.close()
+        return response.status_code
+
+class HttpClient:
+    """Keep-alive HTTP/1.1 connection per thread to a running server"""
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme != 'http' or not parsed.hostname:
+            raise ValueError(f'Expected an http://host:port URL, got {url!r}')
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip('/')
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data is not None else {}
+        for attempt in (0, 1):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                conn.request(method, self.prefix + path, body=data, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+class CallClient:
+    """Calls a Python function; for engines that have no HTTP server"""
+
+    def __init__(self, make_handler):
+        self.make_handler = make_handler
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        handler = getattr(self._local, 'handler', None)
+        if handler is None:
+            handler = self._local.handler = self.make_handler()
+        handler(body)
+        return 200
+
+# ---------------------------------------------------------------------------
+# Targets
+# ---------------------------------------------------------------------------
+
+def import_service(directory, module_name):
+    """Import a service module from its own directory (some load files relative to the cwd)"""
+    previous = os.getcwd()
+    sys.path.insert(0, directory)
+    os.chdir(directory)
+    try:
+        return __import__(module_name)
+    except ImportError as e:
+        raise BenchmarkSkipped(f'{module_name} could not be loaded: {e}')
+    except OSError as e:
+        missing = os.path.relpath(os.path.join(directory, e.filename), repo_dir) if e.filename else e
+        raise BenchmarkSkipped(f'{module_name} could not be loaded: {e.strerror or e}: {missing}')
+    finally:
+        os.chdir(previous)
+
+def load_recommendation_api():
+    # Keep benchmark traffic out of the real analytics and slow-request log
+    os.environ.setdefault('STATS_DIR', tempfile.mkdtemp(prefix='hotelogix-bench-stats-'))
+    os.environ.setdefault('MODEL_WATCH_INTERVAL', '0')
+    api = import_service(os.path.join(repo_dir, 'ai-model'), 'recommendation_api')
+    if not api.load_models():
+        raise BenchmarkSkipped(f'no trained models in {api.MODEL_DIR} (set MODEL_DIR or run a training script)')
+    return FlaskClient(api.app)
+
+def load_chatbot_sklearn_api():
+    return FlaskClient(import_service(os.path.join(repo_dir, 'chatbot'), 'chatbot_sklearn_api').app)
+
+def load_hotelogix_chatbot_api():
+    return FlaskClient(import_service(os.path.join(repo_dir, 'chatbot'), 'hotelogix_chatbot_api').app)
+
+def load_nlp_engine():
+    nlp_engine = import_service(os.path.join(repo_dir, 'voice-assistant'), 'nlp_engine')
+
+    def make_handler():
+        # One engine per thread: each keeps its own conversation context
+        engine = nlp_engine.create_nlp_engine()
+        return lambda body: engine.process(body['text'])
+
+    return CallClient(make_handler)
+
+# name -> (in-process loader, request mix, serves HTTP)
+TARGETS = {
+    'recommendation_api': (load_recommendation_api, recommendation_mix, True),
+    'chatbot_sklearn_api': (load_chatbot_sklearn_api, chat_mix, True),
+    'hotelogix_chatbot_api': (load_hotelogix_chatbot_api, chat_mix, True),
+    'nlp_engine': (load_nlp_engine, voice_mix, False)
+}
+
+# ---------------------------------------------------------------------------
+# Load generation and reporting
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(samples, wall_seconds):
+    """Throughput, error count and latency percentiles (ms) for (latency, status) samples"""
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 400)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3)
+    }
+
+def run_load(client, operations, concurrency, warmup):
+    """Replay operations with `concurrency` threads; overall and per-operation summaries"""
+    for label, method, path, body in operations[:warmup]:
+        client.request(method, path, body)
+    operations = operations[warmup:]
+
+    samples = [None] * len(operations)
+    counter = itertools.count()
+
+    def worker():
+        while True:
+            i = next(counter)
+            if i >= len(operations):
+                return
+            label, method, path, body = operations[i]
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, body)
+            except Exception:
+                status = None
+            samples[i] = (time.perf_counter() - start, status)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - start
+
+    result = summarize(samples, wall_seconds)
+    by_label = {}
+    for (label, *_), sample in zip(operations, samples):
+        by_label.setdefault(label, []).append(sample)
+    result['operations'] = {label: summarize(s, wall_seconds) for label, s in sorted(by_label.items())}
+    return result
+
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+def compare(results, baseline, tolerance):
+    """Print deltas against the baseline; names of targets that regressed"""
+    regressed = []
+    baseline_targets = baseline.get('targets', {})
+    for target, result in results.items():
+        base = baseline_targets.get(target)
+        if base is None:
+            print(f"   {target}: no baseline yet")
+            continue
+        problems = []
+        for metric in LATENCY_METRICS:
+            if base[metric] > 0 and result[metric] > base[metric] * (1 + tolerance):
+                problems.append(f"{metric} {base[metric]} -> {result[metric]}")
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            problems.append(f"throughput {base['throughput_rps']} -> {result['throughput_rps']} req/s")
+        if result['errors'] > base['errors']:
+            problems.append(f"errors {base['errors']} -> {result['errors']}")
+
+        deltas = ', '.join(
+            f"{metric} {(result[metric] / base[metric] - 1) * 100:+.0f}%"
+            for metric in ('throughput_rps',) + LATENCY_METRICS if base[metric] > 0)
+        if problems:
+            regressed.append(target)
+            print(f"❌ {target}: {'; '.join(problems)}")
+        else:
+            print(f"✅ {target}: {deltas}")
+    return regressed
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(terse=True),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+def print_result(target, result):
+    print(f"\n📊 {target}: {result['requests']} requests, {result['errors']} errors, "
+          f"{result['throughput_rps']} req/s")
+    print(f"   {'operation':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, summary in list(result['operations'].items()) + [('all', result)]:
+        print(f"   {label:<18}{summary['requests']:>8}{summary['p50_ms']:>10.3f}"
+              f"{summary['p95_ms']:>10.3f}{summary['p99_ms']:>10.3f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('targets', nargs='*', help=f"any of {', '.join(TARGETS)} (default: all)")
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app (one target)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000, help='measured requests per target')
+    parser.add_argument('--warmup', type=int, default=200, help='unmeasured requests sent first')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown before a target counts as regressed')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to the baseline file')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    targets = args.targets or list(TARGETS)
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"unknown target(s): {', '.join(unknown)}")
+    if args.url and (len(targets) != 1 or not TARGETS[targets[0]][2]):
+        parser.error('--url needs exactly one HTTP target')
+
+    settings = {
+        'mode': 'http' if args.url else 'in-process',
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'warmup': args.warmup,
+        'seed': args.seed
+    }
+    print("="*70)
+    print("⏱️  Hotelogix service benchmarks")
+    print("="*70)
+    print(f"   {settings['mode']}, concurrency {args.concurrency}, "
+          f"{args.requests} requests per target after {args.warmup} warm-up")
+
+    results, skipped = {}, {}
+    for target in targets:
+        loader, make_mix, _ = TARGETS[target]
+        print(f"\n🚀 {target}...")
+        try:
+            client = HttpClient(args.url) if args.url else loader()
+        except BenchmarkSkipped as e:
+            skipped[target] = str(e)
+            print(f"⚠️ Skipping {target}: {e}")
+            continue
+        operations = build_operations(make_mix(random.Random(args.seed)), args.warmup + args.requests, args.seed)
+        results[target] = run_load(client, operations, args.concurrency, args.warmup)
+        print_result(target, results[target])
+
+    report = {
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment_info(),
+        'settings': settings,
+        'targets': results,
+        'skipped': skipped
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ No baseline at {args.baseline}; record one with --save-baseline")
+        sys.exit(0)
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+
+    print(f"\n📏 Compared with baseline from {baseline.get('recorded_at')} (tolerance {args.tolerance:.0%}):")
+    if baseline.get('settings') != settings or baseline.get('environment') != environment_info():
+        print("⚠️ Baseline was recorded with different settings or on a different machine; "
+              "deltas are only indicative")
+    regressed = compare(results, baseline, args.tolerance)
+    sys.exit(1 if regressed else 0)
@@ -7,6 +7,8 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pickle
 import random
+import os
+import sys
 from datetime import datetime
 import nltk
 from nltk.stem import WordNetLemmatizer
@@ -14,6 +16,15 @@ from nltk.stem import WordNetLemmatizer
 app = Flask(__name__)
 CORS(app)
 
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(script_dir, '..', 'shared'))
+from service_metrics import ServiceMetrics
+from request_profiler import RequestProfiler
+
+metrics = ServiceMetrics('chatbot_sklearn_api')
+metrics.instrument(app)
+RequestProfiler(metrics, os.path.join(script_dir, 'slow_requests')).instrument(app)
+
 # Load model
 print("🤖 Loading Hotelogix Chatbot Model...")
 
@@ -37,11 +48,13 @@ def get_response(user_message):
     """Get chatbot response"""
     try:
         # Preprocess
-        processed = preprocess_text(user_message)
+        with metrics.stage('preprocess'):
+            processed = preprocess_text(user_message)
         
         # Predict intent
-        intent = model.predict([processed])[0]
-        confidence = max(model.predict_proba([processed])[0])
+        with metrics.stage('classify'):
+            intent = model.predict([processed])[0]
+            confidence = max(model.predict_proba([processed])[0])
         
         # Get response
         if confidence > 0.3:  # Confidence threshold
@@ -89,12 +102,13 @@ def chat():
         # Get response
         response, confidence = get_response(user_message)
         
-        return jsonify({
-            'response': response,
-            'confidence': float(confidence),
-            'status': 'success',
-            'timestamp': datetime.now().isoformat()
-        })
+        with metrics.stage('serialize'):
+            return jsonify({
+                'response': response,
+                'confidence': float(confidence),
+                'status': 'success',
+                'timestamp': datetime.now().isoformat()
+            })
     
     except Exception as e:
         print(f"Error: {e}")
@@ -115,6 +129,7 @@ if __name__ == '__main__':
     print(f"\n📡 API Endpoints:")
     print(f"   - POST /chat - Send messages to chatbot")
     print(f"   - GET /health - Health check")
+    print(f"   - GET /metrics - Prometheus latency histograms")
     print(f"\n🌐 Server running on http://localhost:5001")
     print("=" * 70 + "\n")
     
@@ -3,6 +3,7 @@ from flask_cors import CORS
 import pickle
 import random
 import json
+import sys
 
 app = Flask(__name__)
 CORS(app)
@@ -14,6 +15,14 @@ print("🚀 Loading Hotelogix 200K+ Chatbot Model...")
 # Get the directory of this script
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+sys.path.insert(0, os.path.join(script_dir, '..', 'shared'))
+from service_metrics import ServiceMetrics
+from request_profiler import RequestProfiler
+
+metrics = ServiceMetrics('hotelogix_chatbot_api')
+metrics.instrument(app)
+RequestProfiler(metrics, os.path.join(script_dir, 'slow_requests')).instrument(app)
+
 # Load trained model
 with open(os.path.join(script_dir, 'hotelogix_200k_model.pkl'), 'rb') as f:
     model = pickle.load(f)
@@ -55,8 +64,10 @@ print(f"📝 Loaded {len(intent_responses)} intent-response mappings")
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
-        data = request.json
-        user_message = data.get('message', '').strip()
+        with metrics.stage('preprocess'):
+            data = request.json
+            user_message = data.get('message', '').strip()
+            normalized = user_message.lower()
         
         if not user_message:
             return jsonify({
@@ -66,8 +77,9 @@ def chat():
             })
         
         # Predict intent
-        predicted_tag = model.predict([user_message.lower()])[0]
-        confidence = max(model.predict_proba([user_message.lower()])[0])
+        with metrics.stage('classify'):
+            predicted_tag = model.predict([normalized])[0]
+            confidence = max(model.predict_proba([normalized])[0])
         
         # Get response
         if predicted_tag in intent_responses and intent_responses[predicted_tag]:
@@ -75,11 +87,12 @@ def chat():
         else:
             response = "I can help you with Hotelogix bookings in Okara, Lahore, Sheikhupura, and Multan. What would you like to know?"
         
-        return jsonify({
-            'response': response,
-            'intent': predicted_tag,
-            'confidence': float(confidence)
-        })
+        with metrics.stage('serialize'):
+            return jsonify({
+                'response': response,
+                'intent': predicted_tag,
+                'confidence': float(confidence)
+            })
     
     except Exception as e:
         return jsonify({
@@ -120,6 +133,7 @@ if __name__ == '__main__':
     print("📡 Endpoint: POST /chat")
     print("❤️  Health: GET /health")
     print("📊 Stats: GET /stats")
+    print("⏱️  Metrics: GET /metrics")
     print("="*70)
     print("✅ Ready to serve Hotelogix queries!")
     print("🔒 Competitor queries will be blocked!")
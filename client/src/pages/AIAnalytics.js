@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../contexts/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import { toast } from 'react-toastify';
@@ -6,6 +6,68 @@ import axios from '../api/axios';
 import Loading from '../components/Loading';
 import './AIAnalytics.css';
 
+const AI_MODEL_URL = process.env.REACT_APP_AI_MODEL_URL || 'http://localhost:5002';
+
+const isPlainObject = (value) => value !== null && typeof value === 'object' && !Array.isArray(value);
+
+// Apply a /stats/stream delta: nested objects merge, null removes a key, anything else replaces
+const mergeDelta = (target, changes) => {
+  const merged = { ...target };
+  Object.entries(changes).forEach(([key, value]) => {
+    if (value === null) {
+      delete merged[key];
+    } else if (isPlainObject(value) && isPlainObject(merged[key])) {
+      merged[key] = mergeDelta(merged[key], value);
+    } else {
+      merged[key] = value;
+    }
+  });
+  return merged;
+};
+
+// Shown when the AI service cannot be reached - NO MOCK DATA
+const EMPTY_ANALYTICS = {
+  modelPerformance: {
+    accuracy: 0,
+    precision: 0,
+    recall: 0,
+    f1Score: 0,
+    totalPredictions: 0,
+    correctPredictions: 0,
+    modelVersion: 'N/A',
+    lastTraining: new Date().toISOString(),
+    trainingDataSize: 0,
+    features: 0,
+    algorithms: [],
+    confidenceDistribution: { high: 0, medium: 0, low: 0 }
+  },
+  userBehavior: {
+    totalInteractions: 0,
+    clickThroughRate: 0,
+    conversionRate: 0,
+    averageSessionTime: 0,
+    bounceRate: 0,
+    topUserTypes: [],
+    deviceBreakdown: { desktop: 0, mobile: 0, tablet: 0 },
+    timeOfDay: []
+  },
+  recommendations: {
+    totalRecommendations: 0,
+    averageRecommendationsPerUser: 0,
+    topRecommendedRooms: [],
+    seasonalTrends: [],
+    accuracyByUserType: []
+  },
+  revenue: {
+    aiDrivenRevenue: 0,
+    totalRevenue: 0,
+    aiContribution: 0,
+    averageOrderValue: 0,
+    revenueGrowth: 0,
+    monthlyTrends: []
+  }
+};
+
 const AIAnalytics = () => {
   const { user } = useAuth();
   const navigate = useNavigate();
@@ -19,6 +81,8 @@ const AIAnalytics = () => {
   });
   const [timeRange, setTimeRange] = useState('30d');
   const [refreshing, setRefreshing] = useState(false);
+  // Latest /stats payload, kept current by the stats stream
+  const statsRef = useRef(null);
 
   useEffect(() => {
     // Check admin access
@@ -28,14 +92,41 @@ const AIAnalytics = () => {
       return;
     }
 
-    fetchAnalyticsData();
-
-    // Auto-refresh every 30 seconds
-    const interval = setInterval(() => {
+    // Without EventSource fall back to polling every 30 seconds
+    if (typeof EventSource === 'undefined') {
       fetchAnalyticsData();
-    }, 30000);
+      const interval = setInterval(() => {
+        fetchAnalyticsData();
+      }, 30000);
+      return () => clearInterval(interval);
+    }
+
+    // Live updates pushed by the AI service: one snapshot, then only what changed
+    statsRef.current = null;
+    let reportedFailure = false;
+    const source = new EventSource(`${AI_MODEL_URL}/stats/stream?window=${timeRange}`);
+
+    source.addEventListener('snapshot', (event) => {
+      statsRef.current = JSON.parse(event.data).stats;
+      applyStats(statsRef.current);
+      setLoading(false);
+    });
+
+    source.addEventListener('delta', (event) => {
+      if (!statsRef.current) return;
+      statsRef.current = mergeDelta(statsRef.current, JSON.parse(event.data).changes);
+      applyStats(statsRef.current);
+    });
+
+    source.onerror = () => {
+      // EventSource reconnects by itself (and gets a new snapshot); report a service that never answered once
+      if (!statsRef.current && !reportedFailure) {
+        reportedFailure = true;
+        fetchAnalyticsData();
+      }
+    };
 
-    return () => clearInterval(interval);
+    return () => source.close();
   }, [user, navigate, timeRange]);
 
   const fetchAnalyticsData = async () => {
@@ -43,10 +134,9 @@ const AIAnalytics = () => {
       setLoading(true);
 
       // Fetch from AI model API - NO MOCK DATA
-      const AI_MODEL_URL = process.env.REACT_APP_AI_MODEL_URL || 'http://localhost:5002';
-      console.log('🔍 Fetching AI stats from:', `${AI_MODEL_URL}/stats`);
+      console.log('🔍 Fetching AI stats from:', `${AI_MODEL_URL}/stats?window=${timeRange}`);
 
-      const aiStatsResponse = await fetch(`${AI_MODEL_URL}/stats`);
+      const aiStatsResponse = await fetch(`${AI_MODEL_URL}/stats?window=${timeRange}`);
 
       if (!aiStatsResponse.ok) {
         throw new Error(`AI model API returned ${aiStatsResponse.status}`);
@@ -54,137 +144,105 @@ const AIAnalytics = () => {
 
       const aiStats = await aiStatsResponse.json();
       console.log('✅ AI Stats received:', aiStats);
-
-      // Process room type data from real AI stats
-      const roomBookings = aiStats.revenue?.room_bookings || {};
-      const roomTypeData = Object.entries(aiStats.usage_stats.room_type_distribution || {}).map(([type, count]) => ({
-        roomType: type,
-        count: count,
-        bookingRate: count > 0 ? ((roomBookings[type] || 0) / count * 100).toFixed(1) : 0
-      })).sort((a, b) => b.count - a.count);
-
-      // Process user type data from real AI stats
-      const totalRequests = aiStats.usage_stats.total_requests || 1;
-      const userTypeData = Object.entries(aiStats.usage_stats.user_type_distribution || {}).map(([type, count]) => ({
-        type: type,
-        count: count,
-        percentage: parseFloat(((count / totalRequests) * 100).toFixed(1))
-      })).sort((a, b) => b.count - a.count);
-
-      // Process seasonal data from real AI stats
-      const seasonData = Object.entries(aiStats.usage_stats.season_distribution || {}).map(([season, count]) => ({
-        season: season.charAt(0).toUpperCase() + season.slice(1),
-        recommendations: count,
-        bookings: 0 // Real booking data would come from backend
-      }));
-
-      // Calculate accuracy by user type
-      const accuracyByUserType = userTypeData.map(ut => ({
-        userType: ut.type,
-        accuracy: aiStats.performance.avg_compatibility_score || 0
-      }));
-
-      // Calculate confidence distribution based on actual scores
-      const avgCompat = aiStats.performance.avg_compatibility_score || 0;
-      const confidenceDistribution = {
-        high: avgCompat > 70 ? 85 : 60,
-        medium: avgCompat > 70 ? 12 : 30,
-        low: avgCompat > 70 ? 3 : 10
-      };
-
-      setAnalyticsData({
-        modelPerformance: {
-          accuracy: aiStats.performance.avg_compatibility_score || 0,
-          precision: aiStats.performance.avg_booking_likelihood || 0,
-          recall: ((aiStats.performance.avg_compatibility_score || 0) + (aiStats.performance.avg_booking_likelihood || 0)) / 2,
-          f1Score: ((aiStats.performance.avg_compatibility_score || 0) + (aiStats.performance.avg_booking_likelihood || 0)) / 2,
-          totalPredictions: totalRequests,
-          correctPredictions: Math.floor(totalRequests * ((aiStats.performance.avg_compatibility_score || 0) / 100)),
-          modelVersion: aiStats.model_info.version || '1.0.0',
-          lastTraining: aiStats.model_info.last_trained || new Date().toISOString(),
-          trainingDataSize: 50000,
-          features: aiStats.model_info.features_used || 13,
-          algorithms: aiStats.model_info.algorithms || ['Logistic Regression', 'Linear Regression'],
-          confidenceDistribution: confidenceDistribution
-        },
-        userBehavior: {
-          totalInteractions: aiStats.user_behavior?.total_interactions || totalRequests,
-          clickThroughRate: aiStats.user_behavior?.click_through_rate || 0,
-          conversionRate: aiStats.user_behavior?.conversion_rate || 0,
-          averageSessionTime: aiStats.user_behavior?.average_session_time || 0,
-          bounceRate: aiStats.user_behavior?.bounce_rate || 0,
-          topUserTypes: userTypeData,
-          deviceBreakdown: aiStats.user_behavior?.device_breakdown || { desktop: 0, mobile: 0, tablet: 0 },
-          timeOfDay: aiStats.user_behavior?.time_of_day || []
-        },
-        recommendations: {
-          totalRecommendations: aiStats.performance.total_recommendations || 0,
-          averageRecommendationsPerUser: totalRequests > 0 ? ((aiStats.performance.total_recommendations || 0) / totalRequests).toFixed(1) : 0,
-          topRecommendedRooms: roomTypeData,
-          seasonalTrends: seasonData,
-          accuracyByUserType: accuracyByUserType
-        },
-        revenue: {
-          aiDrivenRevenue: aiStats.revenue?.ai_driven_revenue || 0,
-          totalRevenue: aiStats.revenue?.total_revenue || 0,
-          aiContribution: aiStats.revenue?.ai_contribution || 0,
-          averageOrderValue: aiStats.revenue?.average_order_value || 0,
-          revenueGrowth: 0,
-          monthlyTrends: []
-        }
-      });
+      statsRef.current = aiStats;
+      applyStats(aiStats);
 
     } catch (error) {
       console.error('Error fetching analytics:', error);
       toast.error('Unable to connect to AI model. Please ensure the AI service is running on port 5002.');
 
       // Set empty state - NO MOCK DATA
-      setAnalyticsData({
-        modelPerformance: {
-          accuracy: 0,
-          precision: 0,
-          recall: 0,
-          f1Score: 0,
-          totalPredictions: 0,
-          correctPredictions: 0,
-          modelVersion: 'N/A',
-          lastTraining: new Date().toISOString(),
-          trainingDataSize: 0,
-          features: 0,
-          algorithms: [],
-          confidenceDistribution: { high: 0, medium: 0, low: 0 }
-        },
-        userBehavior: {
-          totalInteractions: 0,
-          clickThroughRate: 0,
-          conversionRate: 0,
-          averageSessionTime: 0,
-          bounceRate: 0,
-          topUserTypes: [],
-          deviceBreakdown: { desktop: 0, mobile: 0, tablet: 0 },
-          timeOfDay: []
-        },
-        recommendations: {
-          totalRecommendations: 0,
-          averageRecommendationsPerUser: 0,
-          topRecommendedRooms: [],
-          seasonalTrends: [],
-          accuracyByUserType: []
-        },
-        revenue: {
-          aiDrivenRevenue: 0,
-          totalRevenue: 0,
-          aiContribution: 0,
-          averageOrderValue: 0,
-          revenueGrowth: 0,
-          monthlyTrends: []
-        }
-      });
+      setAnalyticsData(EMPTY_ANALYTICS);
     } finally {
       setLoading(false);
     }
   };
 
+  // Turn a /stats payload (fetched or streamed) into the dashboard's data
+  const applyStats = (aiStats) => {
+    // Views, clicks, bookings and revenue for the selected time range
+    const windowTotals = aiStats.window?.totals;
+
+    // Process room type data from real AI stats
+    const roomBookings = aiStats.revenue?.room_bookings || {};
+    const roomTypeData = Object.entries(aiStats.usage_stats.room_type_distribution || {}).map(([type, count]) => ({
+      roomType: type,
+      count: count,
+      bookingRate: count > 0 ? ((roomBookings[type] || 0) / count * 100).toFixed(1) : 0
+    })).sort((a, b) => b.count - a.count);
+
+    // Process user type data from real AI stats
+    const totalRequests = aiStats.usage_stats.total_requests || 1;
+    const userTypeData = Object.entries(aiStats.usage_stats.user_type_distribution || {}).map(([type, count]) => ({
+      type: type,
+      count: count,
+      percentage: parseFloat(((count / totalRequests) * 100).toFixed(1))
+    })).sort((a, b) => b.count - a.count);
+
+    // Process seasonal data from real AI stats
+    const seasonData = Object.entries(aiStats.usage_stats.season_distribution || {}).map(([season, count]) => ({
+      season: season.charAt(0).toUpperCase() + season.slice(1),
+      recommendations: count,
+      bookings: 0 // Real booking data would come from backend
+    }));
+
+    // Calculate accuracy by user type
+    const accuracyByUserType = userTypeData.map(ut => ({
+      userType: ut.type,
+      accuracy: aiStats.performance.avg_compatibility_score || 0
+    }));
+
+    // Calculate confidence distribution based on actual scores
+    const avgCompat = aiStats.performance.avg_compatibility_score || 0;
+    const confidenceDistribution = {
+      high: avgCompat > 70 ? 85 : 60,
+      medium: avgCompat > 70 ? 12 : 30,
+      low: avgCompat > 70 ? 3 : 10
+    };
+
+    setAnalyticsData({
+      modelPerformance: {
+        accuracy: aiStats.performance.avg_compatibility_score || 0,
+        precision: aiStats.performance.avg_booking_likelihood || 0,
+        recall: ((aiStats.performance.avg_compatibility_score || 0) + (aiStats.performance.avg_booking_likelihood || 0)) / 2,
+        f1Score: ((aiStats.performance.avg_compatibility_score || 0) + (aiStats.performance.avg_booking_likelihood || 0)) / 2,
+        totalPredictions: totalRequests,
+        correctPredictions: Math.floor(totalRequests * ((aiStats.performance.avg_compatibility_score || 0) / 100)),
+        modelVersion: aiStats.model_info.version || '1.0.0',
+        lastTraining: aiStats.model_info.last_trained || new Date().toISOString(),
+        trainingDataSize: 50000,
+        features: aiStats.model_info.features_used || 13,
+        algorithms: aiStats.model_info.algorithms || ['Logistic Regression', 'Linear Regression'],
+        confidenceDistribution: confidenceDistribution
+      },
+      userBehavior: {
+        totalInteractions: windowTotals ? windowTotals.views : (aiStats.user_behavior?.total_interactions || totalRequests),
+        clickThroughRate: windowTotals ? windowTotals.click_through_rate : (aiStats.user_behavior?.click_through_rate || 0),
+        conversionRate: windowTotals ? windowTotals.conversion_rate : (aiStats.user_behavior?.conversion_rate || 0),
+        averageSessionTime: aiStats.user_behavior?.average_session_time || 0,
+        bounceRate: windowTotals ? windowTotals.bounce_rate : (aiStats.user_behavior?.bounce_rate || 0),
+        topUserTypes: userTypeData,
+        deviceBreakdown: aiStats.user_behavior?.device_breakdown || { desktop: 0, mobile: 0, tablet: 0 },
+        timeOfDay: aiStats.user_behavior?.time_of_day || []
+      },
+      recommendations: {
+        totalRecommendations: aiStats.performance.total_recommendations || 0,
+        averageRecommendationsPerUser: totalRequests > 0 ? ((aiStats.performance.total_recommendations || 0) / totalRequests).toFixed(1) : 0,
+        topRecommendedRooms: roomTypeData,
+        seasonalTrends: seasonData,
+        accuracyByUserType: accuracyByUserType
+      },
+      revenue: {
+        aiDrivenRevenue: windowTotals ? windowTotals.revenue : (aiStats.revenue?.ai_driven_revenue || 0),
+        totalRevenue: windowTotals ? windowTotals.revenue : (aiStats.revenue?.total_revenue || 0),
+        aiContribution: aiStats.revenue?.ai_contribution || 0,
+        averageOrderValue: windowTotals ? windowTotals.average_order_value : (aiStats.revenue?.average_order_value || 0),
+        revenueGrowth: 0,
+        monthlyTrends: []
+      }
+    });
+  };
+
   // Removed mock data - now using only real AI model data
 
   const handleRefresh = async () => {
@@ -243,6 +301,8 @@ const AIAnalytics = () => {
                 onChange={(e) => setTimeRange(e.target.value)}
                 className="time-range-select"
               >
+                <option value="1h">Last hour</option>
+                <option value="24h">Last 24 hours</option>
                 <option value="7d">Last 7 days</option>
                 <option value="30d">Last 30 days</option>
                 <option value="90d">Last 90 days</option>
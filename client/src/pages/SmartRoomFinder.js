@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import axios from '../api/axios';
 import Loading from '../components/Loading';
+import { audienceIds, trackEvent } from '../utils/aiTracking';
 import './SmartRoomFinder.css';
 
 const SmartRoomFinder = () => {
@@ -286,7 +287,8 @@ const SmartRoomFinder = () => {
                     groupSize: parseInt(filters.groupSize) || 2,
                     budget: parseInt(filters.maxPrice) || 10000,
                     viewTime: 120,
-                    previousBookings: 0
+                    previousBookings: 0,
+                    ...audienceIds()
                 })
             });
 
@@ -398,6 +400,12 @@ const SmartRoomFinder = () => {
         // eslint-disable-next-line react-hooks/exhaustive-deps
     }, []);
 
+    // Session length for the AI analytics (queued, sent in the next tracking batch)
+    useEffect(() => {
+        const sessionStart = Date.now();
+        return () => trackEvent('session', { duration: Math.round((Date.now() - sessionStart) / 1000) });
+    }, []);
+
     useEffect(() => {
         if (recommendations.length > 0) {
             let sorted = [...recommendations];
@@ -755,7 +763,11 @@ const SmartRoomFinder = () => {
                                                 <span className="price">PKR {room.pricePerNight?.toLocaleString()}</span>
                                                 <span className="price-label">per night</span>
                                             </div>
-                                            <Link to={`/rooms/${room.id}`} className="btn btn-gold">
+                                            <Link 
+                                                to={`/rooms/${room.id}`} 
+                                                className="btn btn-gold"
+                                                onClick={() => trackEvent('click', { room_type: room.roomType || room.type })}
+                                            >
                                                 View Details <i className="fas fa-arrow-right"></i>
                                             </Link>
                                         </div>
@@ -0,0 +1,130 @@
+/**
+ * Batched analytics tracking for the AI recommendation service
+ *
+ * Client contract for POST /track on the AI model service:
+ * - Events are queued in memory, each stamped with a unique `event_id`, the
+ *   time it happened (`timestamp`, ms since the epoch) and the device type.
+ *   The service ignores an id it has already counted, so resending is safe.
+ * - Each event carries the tab's `session_id` and, when signed in, the
+ *   `user_id`, for the distinct visitor and user counts (hashed server-side).
+ * - The queue is sent as one `{ events: [...] }` request every
+ *   FLUSH_INTERVAL_MS, or as soon as MAX_BATCH events are waiting.
+ * - When the page is hidden or closed the queue is sent with sendBeacon.
+ * - The service answers 202 once the batch is queued. On a network error or
+ *   a 503 (service queue full) the events go back in the queue and are retried
+ *   on the next flush; at most MAX_QUEUE events are kept, oldest dropped first.
+ */
+
+const AI_MODEL_URL = process.env.REACT_APP_AI_MODEL_URL || 'http://localhost:5002';
+const FLUSH_INTERVAL_MS = 5000;
+const MAX_BATCH = 50;
+const MAX_QUEUE = 500;
+
+let queue = [];
+let timer = null;
+let flushing = false;
+
+const detectDevice = () => {
+    const userAgent = navigator.userAgent.toLowerCase();
+    if (userAgent.includes('ipad') || userAgent.includes('tablet')) return 'tablet';
+    if (userAgent.includes('mobile')) return 'mobile';
+    return 'desktop';
+};
+
+const newEventId = () => (
+    window.crypto?.randomUUID
+        ? window.crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`
+);
+
+// One visitor session per browser tab
+const sessionId = () => {
+    let id = sessionStorage.getItem('aiSessionId');
+    if (!id) {
+        id = newEventId();
+        sessionStorage.setItem('aiSessionId', id);
+    }
+    return id;
+};
+
+const userId = () => {
+    try {
+        return JSON.parse(localStorage.getItem('user'))?.id ?? null;
+    } catch (error) {
+        return null;
+    }
+};
+
+/**
+ * { userId, sessionId } for /recommend requests, counted like the tracked events
+ */
+export const audienceIds = () => ({ userId: userId(), sessionId: sessionId() });
+
+const requeue = (events) => {
+    queue = events.concat(queue).slice(-MAX_QUEUE);
+};
+
+/**
+ * Send everything queued so far in one request
+ */
+export const flushEvents = async () => {
+    if (flushing || queue.length === 0) return;
+    flushing = true;
+    const events = queue.splice(0, queue.length);
+
+    try {
+        const response = await fetch(`${AI_MODEL_URL}/track`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ events }),
+            keepalive: true
+        });
+        if (response.status === 503) {
+            requeue(events);
+        } else if (!response.ok) {
+            console.warn('⚠️ AI tracking batch rejected:', response.status);
+        }
+    } catch (error) {
+        requeue(events);
+    } finally {
+        flushing = false;
+    }
+};
+
+// Last chance when the page goes away; text/plain keeps the beacon a simple CORS request
+const flushWithBeacon = () => {
+    if (queue.length === 0 || !navigator.sendBeacon) return;
+    const events = queue.splice(0, queue.length);
+    const body = new Blob([JSON.stringify({ events })], { type: 'text/plain' });
+    if (!navigator.sendBeacon(`${AI_MODEL_URL}/track`, body)) {
+        requeue(events);
+    }
+};
+
+const start = () => {
+    if (timer) return;
+    timer = setInterval(flushEvents, FLUSH_INTERVAL_MS);
+    window.addEventListener('pagehide', flushWithBeacon);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') flushWithBeacon();
+    });
+};
+
+/**
+ * Queue one interaction, e.g. trackEvent('click', { room_type: 'Deluxe Room' })
+ * type: view, click, booking, bounce or session (with duration in seconds)
+ */
+export const trackEvent = (type, details = {}) => {
+    start();
+    queue.push({
+        event_id: newEventId(),
+        type,
+        device: detectDevice(),
+        timestamp: Date.now(),
+        session_id: sessionId(),
+        user_id: userId(),
+        ...details
+    });
+    if (queue.length > MAX_QUEUE) queue.shift();
+    if (queue.length >= MAX_BATCH) flushEvents();
+};
@@ -0,0 +1,42 @@
+const { PrismaClient } = require('@prisma/client');
+const fs = require('fs');
+const path = require('path');
+const prisma = new PrismaClient();
+
+// Writes the Room table to ai-model/rooms_catalog.json for the AI recommendation API.
+// Pass the AI API URL as an argument to also push it to POST /catalog/refresh.
+async function exportRoomsCatalog() {
+  try {
+    const rooms = await prisma.room.findMany({
+      select: {
+        id: true,
+        roomNumber: true,
+        type: true,
+        title: true,
+        location: true,
+        capacity: true,
+        pricePerNight: true,
+        isAvailable: true
+      }
+    });
+
+    const outputPath = path.join(__dirname, 'ai-model', 'rooms_catalog.json');
+    fs.writeFileSync(outputPath, JSON.stringify(rooms, null, 2));
+    console.log(`✅ Exported ${rooms.length} rooms to ${outputPath}`);
+
+    const aiModelUrl = process.argv[2];
+    if (aiModelUrl) {
+      const axios = require('axios');
+      const headers = process.env.ADMIN_TOKEN ? { 'X-Admin-Token': process.env.ADMIN_TOKEN } : {};
+      const response = await axios.post(`${aiModelUrl}/catalog/refresh`, rooms, { headers });
+      console.log('🔄 AI catalog refreshed:', response.data.catalog);
+    }
+  } catch (error) {
+    console.error('❌ Export failed:', error.message);
+    process.exitCode = 1;
+  } finally {
+    await prisma.$disconnect();
+  }
+}
+
+exportRoomsCatalog();
@@ -131,6 +131,8 @@ router.post('/', authenticateToken, async (req, res) => {
       const AI_MODEL_URL = process.env.AI_MODEL_URL || 'http://localhost:5002';
       
       await axios.post(`${AI_MODEL_URL}/track`, {
+        // Stable id so a retried request does not count the booking (and its revenue) twice
+        event_id: `booking-${booking.id}`,
         type: 'booking',
         device: req.headers['user-agent']?.includes('Mobile') ? 'mobile' : 'desktop',
         revenue: totalPrice,
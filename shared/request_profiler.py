@@ -0,0 +1,301 @@
+"""
+Opt-in request profiling and slow-request capture for the Python services
+A request sent with `X-Profile: 1` (or `?profile=1`) runs under cProfile and
+gets its stage breakdown and top frames back: in a `profile` field of JSON
+responses and in a Server-Timing header. Any request slower than
+SLOW_REQUEST_MS has its payload and timings written to a bounded on-disk
+ring buffer that can be replayed against a local server. Ids and chat text
+(REDACTED_FIELDS) are blanked before a payload is written; a body that is not
+JSON is kept only as its size and hash.
+
+Usage:
+    from request_profiler import RequestProfiler
+    RequestProfiler(metrics, os.path.join(script_dir, 'slow_requests')).instrument(app)
+
+    python shared/request_profiler.py list ai-model/slow_requests
+    python shared/request_profiler.py replay ai-model/slow_requests --url http://localhost:5002
+"""
+
+import argparse
+import cProfile
+import glob
+import hashlib
+import json
+import os
+import pstats
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from service_metrics import current_trace
+
+# Requests at or above this many milliseconds are captured (0 disables capture)
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_CAPACITY = int(os.environ.get('SLOW_REQUEST_CAPACITY', 200))
+# Set to false to ignore X-Profile entirely; with ADMIN_TOKEN set the header must come with it
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', 'true').lower() != 'false'
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+MAX_CAPTURED_BODY = 64 * 1024
+CAPTURED_HEADERS = ('Content-Type', 'User-Agent', 'Accept')
+# Request fields holding user ids or free text, never written to disk
+REDACTED_FIELDS = frozenset({'userId', 'sessionId', 'user_id', 'session_id', 'message'})
+REDACTED = '[redacted]'
+
+def redact(value):
+    """Copy of a decoded JSON value with every REDACTED_FIELDS entry blanked, at any depth"""
+    if isinstance(value, dict):
+        return {key: REDACTED if key in REDACTED_FIELDS else redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+def captured_body(data):
+    """Body as stored for replay: redacted JSON, or {'bytes', 'sha256'} for anything else"""
+    if not data:
+        return ''
+    if len(data) <= MAX_CAPTURED_BODY:
+        try:
+            return json.dumps(redact(json.loads(data)))
+        except ValueError:
+            pass
+    return {'bytes': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+
+def captured_query(query_string):
+    pairs = parse_qsl(query_string.decode('latin-1'), keep_blank_values=True)
+    return urlencode([(key, REDACTED if key in REDACTED_FIELDS else value) for key, value in pairs])
+
+class SlowRequestLog:
+    """Ring buffer of request records, one JSON file per slot
+
+    Every process writes its own slots (slow-<pid>-<slot>.json), so workers
+    sharing the directory never overwrite each other's records. Slot files
+    are replaced atomically; once a process has written `capacity` records
+    its oldest slot is overwritten. trim() drops the oldest records beyond
+    `capacity`, including those left behind by stopped workers.
+    """
+
+    def __init__(self, directory, capacity=SLOW_REQUEST_CAPACITY):
+        self.directory = directory
+        self.capacity = max(1, capacity)
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        # A restarted container often gets its pid back; carry on after its last record
+        self.seq = max((entry.get('seq', 0) for entry in self.entries() if entry.get('pid') == self.pid), default=0)
+
+    def append(self, record):
+        with self._lock:
+            self.seq += 1
+            record = {'seq': self.seq, 'pid': self.pid, 't': time.time(), **record}
+            slot = self.seq % self.capacity
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'slow-{self.pid}-{slot:04d}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, indent=2)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ Could not write slow request record: {e}")
+
+    def _records(self):
+        """(path, record) for every readable slot file, oldest first"""
+        records = []
+        for path in glob.glob(os.path.join(self.directory, 'slow-*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    records.append((path, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return sorted(records, key=lambda item: (item[1].get('t', 0), item[1].get('seq', 0)))
+
+    def entries(self):
+        """All records, oldest first"""
+        return [record for _, record in self._records()]
+
+    def trim(self):
+        """Delete the oldest slot files so at most `capacity` records remain"""
+        records = self._records()
+        for path, _ in records[:max(0, len(records) - self.capacity)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def record_label(record):
+    """Short id of a captured request: pid#seq (just #seq for older records)"""
+    return f"{record.get('pid', '')}#{record.get('seq', 0)}"
+
+def stage_breakdown(trace):
+    """Total milliseconds and call count per stage, in first-seen order"""
+    stages = {}
+    for stage, seconds in trace:
+        entry = stages.setdefault(stage, {'ms': 0.0, 'calls': 0})
+        entry['ms'] += seconds * 1000
+        entry['calls'] += 1
+    for entry in stages.values():
+        entry['ms'] = round(entry['ms'], 3)
+    return stages
+
+def top_frames(profile, limit=15):
+    """Functions with the highest cumulative time in a cProfile run"""
+    stats = pstats.Stats(profile)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    frames = []
+    for (filename, line, function), (_, calls, total, cumulative, _) in rows:
+        location = function if filename == '~' else f'{os.path.basename(filename)}:{line}({function})'
+        frames.append({
+            'function': location,
+            'calls': calls,
+            'own_ms': round(total * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3)
+        })
+    return frames
+
+class RequestProfiler:
+    """Flask hooks for X-Profile requests and slow-request capture
+
+    Only one request is profiled at a time; a concurrent X-Profile request is
+    served normally with `"profiled": false` in its profile block.
+    """
+
+    def __init__(self, metrics, slow_dir, slow_ms=SLOW_REQUEST_MS, capacity=SLOW_REQUEST_CAPACITY,
+                 enabled=REQUEST_PROFILING, admin_token=ADMIN_TOKEN, top=15):
+        self.metrics = metrics
+        self.slow_ms = slow_ms
+        self.slow_log = SlowRequestLog(slow_dir, capacity) if slow_ms > 0 else None
+        if self.slow_log is not None:
+            self.slow_log.trim()
+        self.enabled = enabled
+        self.admin_token = admin_token
+        self.top = top
+        self._profile_lock = threading.Lock()
+
+    def _wants_profile(self, request):
+        if not self.enabled:
+            return False
+        flag = request.headers.get('X-Profile') or request.args.get('profile')
+        if str(flag).lower() not in ('1', 'true', 'yes'):
+            return False
+        return not self.admin_token or request.headers.get('X-Admin-Token') == self.admin_token
+
+    def instrument(self, app):
+        from flask import current_app, g, request
+
+        @app.before_request
+        def _start_trace():
+            g._profile_trace = []
+            g._profile_token = current_trace.set(g._profile_trace)
+            g._profile_requested = self._wants_profile(request)
+            g._profiler = None
+            if g._profile_requested and self._profile_lock.acquire(blocking=False):
+                g._profiler = cProfile.Profile()
+                g._profiler.enable()
+            g._profile_start = time.perf_counter()
+
+        @app.after_request
+        def _finish_trace(response):
+            start = getattr(g, '_profile_start', None)
+            if start is None:
+                return response
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            profiler = self._stop_profiler(g)
+            stages = stage_breakdown(g._profile_trace)
+
+            if g._profile_requested:
+                profile = {'profiled': profiler is not None, 'total_ms': round(elapsed_ms, 3), 'stages': stages}
+                if profiler is not None:
+                    profile['top_frames'] = top_frames(profiler, self.top)
+                timings = [f'{name};dur={entry["ms"]}' for name, entry in stages.items()]
+                response.headers['Server-Timing'] = ', '.join(timings + [f'total;dur={elapsed_ms:.3f}'])
+                if response.is_json and not response.is_streamed:
+                    body = response.get_json(silent=True)
+                    if isinstance(body, dict):
+                        body['profile'] = profile
+                        response.set_data(current_app.json.dumps(body))
+
+            if self.slow_log is not None and elapsed_ms >= self.slow_ms:
+                self.slow_log.append({
+                    'service': self.metrics.service if self.metrics else None,
+                    'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'method': request.method,
+                    'path': request.path,
+                    'query': captured_query(request.query_string),
+                    'headers': {h: request.headers[h] for h in CAPTURED_HEADERS if h in request.headers},
+                    'body': captured_body(request.get_data(cache=True)),
+                    'status': response.status_code,
+                    'duration_ms': round(elapsed_ms, 3),
+                    'stages': stages
+                })
+            return response
+
+        @app.teardown_request
+        def _end_trace(exc):
+            # after_request is skipped on unhandled errors; never leave the profiler running
+            self._stop_profiler(g)
+            token = getattr(g, '_profile_token', None)
+            if token is not None:
+                g._profile_token = None
+                try:
+                    current_trace.reset(token)
+                except ValueError:
+                    pass  # streamed responses finish in another context
+
+        return app
+
+    def _stop_profiler(self, g):
+        profiler = getattr(g, '_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            g._profiler = None
+            self._profile_lock.release()
+        return profiler
+
+def replay(directory, url, profile=False):
+    """Re-send captured requests to `url` and compare latencies"""
+    import urllib.error
+    import urllib.request
+
+    for record in SlowRequestLog(directory).entries():
+        if not isinstance(record.get('body', ''), str):
+            print(f"⏭️  {record_label(record)} {record['method']} {record['path']}: body was not captured, skipped")
+            continue
+        headers = dict(record.get('headers', {}))
+        if profile:
+            headers['X-Profile'] = '1'
+        target = url.rstrip('/') + record['path'] + (f"?{record['query']}" if record.get('query') else '')
+        data = record['body'].encode('utf-8') if record['method'] not in ('GET', 'HEAD') else None
+        req = urllib.request.Request(target, data=data, headers=headers, method=record['method'])
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as resp:
+                status, body = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        except urllib.error.URLError as e:
+            print(f"❌ {target}: {e.reason}")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"{record_label(record)} {record['method']} {record['path']}: captured {record['duration_ms']:.1f} ms, "
+              f"replayed {elapsed_ms:.1f} ms (status {status})")
+        if profile:
+            try:
+                print(json.dumps(json.loads(body).get('profile'), indent=2))
+            except ValueError:
+                pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect or replay captured slow requests')
+    parser.add_argument('command', choices=['list', 'replay'])
+    parser.add_argument('directory')
+    parser.add_argument('--url', default='http://localhost:5002')
+    parser.add_argument('--profile', action='store_true', help='replay with X-Profile and print the breakdown')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for record in SlowRequestLog(args.directory).entries():
+            slowest = max(record.get('stages', {}).items(), key=lambda item: item[1]['ms'], default=(None, None))[0]
+            print(f"{record_label(record)} {record['at']} {record['method']} {record['path']} "
+                  f"{record['duration_ms']:.1f} ms (slowest stage: {slowest})")
+    else:
+        replay(args.directory, args.url, args.profile)
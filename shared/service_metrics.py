@@ -0,0 +1,139 @@
+"""
+Request and stage latency metrics for the Python services
+Fixed-bucket histograms rendered in the Prometheus text format on /metrics.
+Each process keeps its own counters; scrape every worker (or sum per worker
+in Prometheus) when running more than one.
+
+Usage:
+    sys.path.insert(0, os.path.join(script_dir, '..', 'shared'))
+    from service_metrics import ServiceMetrics
+    metrics = ServiceMetrics('recommendation_api')
+    metrics.instrument(app)             # request latency + GET /metrics
+    with metrics.stage('inference'):    # time one stage of a request
+        ...
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; tuned for sub-millisecond stages up to multi-second requests
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stage timings of the current request, as [(stage, seconds)], when something
+# (e.g. request_profiler) wants a per-request breakdown; None otherwise
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by label values"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        # Bucket i counts values <= buckets[i]; the extra slot is +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for labelvalues, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class ServiceMetrics:
+    """Request and per-stage latency histograms for one service"""
+
+    def __init__(self, service, buckets=DEFAULT_BUCKETS):
+        self.service = service
+        self.requests = Histogram(
+            'hotelogix_http_request_duration_seconds', 'HTTP request latency by endpoint',
+            ('service', 'method', 'endpoint', 'status'), buckets)
+        self.stages = Histogram(
+            'hotelogix_request_stage_duration_seconds', 'Time spent in each stage of a request',
+            ('service', 'stage'), buckets)
+        self.histograms = [self.requests, self.stages]
+
+    def observe_stage(self, stage, seconds):
+        self.stages.observe(seconds, self.service, stage)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.append((stage, seconds))
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one request stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - start)
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+    def instrument(self, app):
+        """Time every request of a Flask app and serve GET /metrics"""
+        from flask import Response, g, request
+
+        @app.before_request
+        def _start_timer():
+            g._metrics_start = time.perf_counter()
+
+        @app.after_request
+        def _record_request(response):
+            start = getattr(g, '_metrics_start', None)
+            if start is not None:
+                # Route template, not the raw path, so label cardinality stays bounded
+                endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                self.requests.observe(time.perf_counter() - start, self.service,
+                                      request.method, endpoint, str(response.status_code))
+            return response
+
+        @app.route('/metrics', methods=['GET'])
+        def metrics_endpoint():
+            return Response(self.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+        return app